@@ -20,7 +20,8 @@ def record_tool(rec: Recorder, tool_name: str, fn):
             rec.tool(tool_name, input=inp, output={"result": out})
             return out
         except Exception as e:
-            rec.tool(tool_name, input=inp, output={}, error={"type": type(e).__name__, "msg": str(e)})
+            error = {"type": type(e).__name__, "msg": str(e)}
+            rec.tool(tool_name, input=inp, output={}, error=error)
             raise
 
     return wrapped
@@ -1,15 +1,35 @@
 from .recorder import Recorder
+from .async_recorder import AsyncRecorder
 from .store_sqlite import SQLiteStore
-from .replay import Replayer, ReplayReport
+from .store_log import LogStore
+from .store_cache import CachingStore
+from .store_remote import RemoteStore
+from .store_shard import ShardedStore
+from .replay import Replayer, ReplayReport, ReplaySession
 from .diff import diff_runs
 from .exporter import export_areplay, import_areplay
+from .retention import RetentionPolicy
+from .redact import CompiledRedactor
+from .stream import LLMStream
+from .load import LoadReport, load_replay
 
 __all__ = [
     "Recorder",
+    "AsyncRecorder",
     "SQLiteStore",
+    "LogStore",
+    "CachingStore",
+    "RemoteStore",
+    "ShardedStore",
     "Replayer",
     "ReplayReport",
+    "ReplaySession",
     "diff_runs",
     "export_areplay",
     "import_areplay",
+    "RetentionPolicy",
+    "CompiledRedactor",
+    "LLMStream",
+    "LoadReport",
+    "load_replay",
 ]
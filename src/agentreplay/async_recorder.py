@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import tempfile
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Literal, Optional, Union
+
+from .canonical import dumps, loads
+from .metrics import Metrics
+from .models import Step, step_from_dict, step_to_dict
+from .redact import Redactor
+from .recorder import Recorder, RunHandle, _BUFFERED, _RunState, _utcnow
+from .store import Store
+
+Backpressure = Literal["block", "drop_spans", "spill"]
+
+
+class _End:
+    __slots__ = ("run_id", "ended_at")
+
+    def __init__(self, run_id: str, ended_at: datetime):
+        self.run_id = run_id
+        self.ended_at = ended_at
+
+
+class _Barrier:
+    __slots__ = ("event",)
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+
+
+_STOP = object()
+
+
+class AsyncRecorder(Recorder):
+    """
+    Recorder whose llm()/tool()/span() calls only enqueue the step.
+
+    A dedicated writer thread drains a bounded queue into Store.add_steps(), so the
+    agent's event loop never waits on disk I/O. When the queue is full:
+      - "block":      wait for room (no data loss)
+      - "drop_spans": drop span steps, wait for room for llm/tool steps
+      - "spill":      append to a JSONL spill file the writer drains later
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        project: str = "default",
+        redaction: Union[bool, Redactor] = True,
+        max_queue: int = 10_000,
+        backpressure: Backpressure = "block",
+        spill_path: Optional[str] = None,
+        batch_size: int = 256,
+        metrics: Union[bool, Metrics, None] = None,
+    ):
+        if backpressure not in ("block", "drop_spans", "spill"):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        super().__init__(
+            store, project=project, redaction=redaction, batch_size=batch_size, metrics=metrics
+        )
+        self.backpressure = backpressure
+        self.dropped = 0
+        self.spilled = 0
+        self.write_errors = 0
+        self.last_error: Optional[BaseException] = None
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._spill_pending = 0
+        self._spill_file: Optional[BinaryIO] = None
+        self._late_ends: "deque[_End]" = deque()
+        if backpressure == "spill" and spill_path is None:
+            fd, spill_path = tempfile.mkstemp(prefix="agentreplay-", suffix=".spill.jsonl")
+            os.close(fd)
+        self.spill_path = spill_path
+        self._closed = False
+        if self.metrics is not None:
+            self.metrics.add_collector(self._gauges)
+        self._thread = threading.Thread(target=self._writer, name="agentreplay-writer", daemon=True)
+        self._thread.start()
+        _BUFFERED.add(self)
+
+    def _gauges(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "dropped_steps": self.dropped,
+            "spilled_steps": self.spilled,
+        }
+
+    @asynccontextmanager
+    async def arun(
+        self, name: str, meta: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[RunHandle]:
+        meta = self._run_meta(meta)
+        run_id = await asyncio.to_thread(self.store.create_run, name, _utcnow(), meta)
+        with self._activate(RunHandle(id=run_id, name=name, meta=meta)) as handle:
+            yield handle
+
+    def _end_run(self, state: _RunState) -> None:
+        end = _End(state.handle.id, _utcnow())
+        if self.backpressure == "block":
+            self._queue.put(end)
+            return
+        try:
+            self._queue.put_nowait(end)
+        except queue.Full:
+            # applied once the queue (and spill file) ahead of it has been written
+            self._late_ends.append(end)
+
+    def _write(self, step: Step, state: _RunState) -> None:
+        if self.backpressure == "block":
+            self._queue.put(step)
+            return
+        try:
+            self._queue.put_nowait(step)
+        except queue.Full:
+            if self.backpressure == "spill":
+                self._spill(step)
+            elif step.kind == "span":
+                self.dropped += 1
+            else:
+                self._queue.put(step)
+
+    def flush(self) -> None:
+        """Block until everything enqueued so far (including spilled steps) is written."""
+        if self._closed or not self._thread.is_alive():
+            return
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        barrier.event.wait()
+
+    async def aflush(self) -> None:
+        await asyncio.to_thread(self.flush)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        _BUFFERED.discard(self)
+        with self._spill_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+        if self.spill_path and os.path.exists(self.spill_path) and self._spill_pending == 0:
+            os.remove(self.spill_path)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+
+    # -- writer thread --
+
+    def _spill(self, step: Step) -> None:
+        # a buffered append to a handle kept open: no open/flush per step on the caller
+        line = dumps(step_to_dict(step)) + b"\n"
+        with self._spill_lock:
+            if self._spill_file is None:
+                self._spill_file = open(self.spill_path, "ab")  # type: ignore[arg-type]
+            self._spill_file.write(line)
+            self._spill_pending += 1
+            self.spilled += 1
+
+    def _take_spilled(self) -> List[Step]:
+        # swap the file out under the lock; reading it happens without the lock, so
+        # callers spilling meanwhile start a new file instead of waiting
+        with self._spill_lock:
+            if not self._spill_pending:
+                return []
+            self._spill_file.close()  # type: ignore[union-attr]
+            self._spill_file = None
+            self._spill_pending = 0
+            taken = f"{self.spill_path}.draining"
+            os.replace(self.spill_path, taken)  # type: ignore[arg-type]
+        with open(taken, "rb") as f:
+            lines = f.readlines()
+        os.remove(taken)
+        return [step_from_dict(loads(line)) for line in lines if line.strip()]
+
+    def _write_batch(self, batch: List[Step]) -> None:
+        if not batch:
+            return
+        try:
+            self._add_steps(batch)
+        except Exception as e:  # keep the writer alive; surface via counters
+            self.write_errors += 1
+            self.last_error = e
+
+    def _apply_end(self, end: _End) -> None:
+        try:
+            self.store.end_run(end.run_id, ended_at=end.ended_at)
+        except Exception as e:
+            self.write_errors += 1
+            self.last_error = e
+
+    def _drain_overflow(self) -> None:
+        self._write_batch(self._take_spilled())
+        while self._late_ends:
+            self._apply_end(self._late_ends.popleft())
+
+    def _drain(self, batch: List[Step]) -> None:
+        self._write_batch(batch)
+        self._drain_overflow()
+
+    def _writer(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: List[Step] = []
+            while True:
+                if isinstance(item, Step):
+                    batch.append(item)
+                else:
+                    self._drain(batch)
+                    batch = []
+                    if item is _STOP:
+                        return
+                    if isinstance(item, _End):
+                        self._apply_end(item)
+                    elif isinstance(item, _Barrier):
+                        item.event.set()
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            if self._queue.empty():
+                self._drain_overflow()
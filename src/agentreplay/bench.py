@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from . import canonical
+from .diff import diff_runs
+from .exporter import export_areplay, import_areplay
+from .fingerprint import fingerprint_canonical, step_fingerprint
+from .models import Step
+from .recorder import Recorder
+from .redact import CompiledRedactor, redact_dict, redact_text
+from .replay import Replayer
+from .store import Store, run_cursor
+from .store_log import LogStore
+from .store_sqlite import SQLiteStore
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+BENCHMARKS = ("record", "stores", "reads", "diff", "replay", "export", "redaction", "codec")
+
+_T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _payload(i: int) -> Dict[str, Any]:
+    return {
+        "prompt": f"step {i}: summarise the attached document",
+        "headers": {"Authorization": "Bearer abc.def-123", "x-request-id": str(i)},
+        "messages": [
+            {"role": "system", "content": "you are helpful"},
+            {"role": "user", "content": "use key sk-" + "a" * 32 + " please", "api_key": "k"},
+        ],
+        "params": {"temperature": 0.2, "max_tokens": 256, "stop": ["\n\n"]},
+    }
+
+
+def synthetic_payloads(i: int) -> Dict[str, Any]:
+    """(kind, name, input, output, error) of the i-th step of a synthetic agent run."""
+    if i % 5 == 0:
+        return {
+            "kind": "llm",
+            "name": "planner",
+            "input": {
+                "messages": [{"role": "user", "content": f"task {i} " + "x" * 200}],
+                "temperature": 0,
+            },
+            "output": {
+                "text": f"call search for item {i}",
+                "usage": {"prompt_tokens": 60, "completion_tokens": 8},
+            },
+            "error": None,
+        }
+    err = {"type": "TimeoutError", "message": "upstream timed out"} if i % 97 == 0 else None
+    return {
+        "kind": "tool",
+        "name": "search" if i % 2 else "fetch",
+        "input": {"q": f"item {i}", "page": i % 7},
+        "output": {} if err else {"hits": [i, i + 1, i + 2], "took_ms": i % 50},
+        "error": err,
+    }
+
+
+def synthetic_steps(run_id: str, n: int, diverge_at: Optional[int] = None) -> Iterator[Step]:
+    """n steps for run_id; from `diverge_at` on, tool outputs differ (for diff benchmarks)."""
+    for i in range(n):
+        p = synthetic_payloads(i)
+        output = p["output"]
+        if diverge_at is not None and i >= diverge_at and p["kind"] == "tool":
+            output = {**output, "took_ms": -1}
+        yield Step(
+            id=str(uuid.uuid4()),
+            run_id=run_id,
+            idx=i,
+            kind=p["kind"],
+            name=p["name"],
+            ts=_T0 + timedelta(milliseconds=i),
+            input=p["input"],
+            output=output,
+            error=p["error"],
+        )
+
+
+def make_run(store: Store, n: int, name: str = "bench", diverge_at: Optional[int] = None) -> str:
+    """Write a synthetic run of n steps straight through Store.add_steps()."""
+    run_id = store.create_run(name, _T0, {"project": "bench"})
+    store.add_steps(synthetic_steps(run_id, n, diverge_at))
+    store.end_run(run_id, _T0 + timedelta(milliseconds=n))
+    return run_id
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _latency(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = [_timed(fn) for _ in range(repeat)]
+    return {"p50_ms": statistics.median(samples) * 1e3, "max_ms": max(samples) * 1e3}
+
+
+def _rate(n: int, seconds: float) -> Dict[str, float]:
+    return {"steps": n, "seconds": seconds, "steps_per_s": n / seconds if seconds > 0 else 0.0}
+
+
+def _record(rec: Recorder, n: int) -> None:
+    with rec.run("bench-record"):
+        for i in range(n):
+            p = synthetic_payloads(i)
+            if p["kind"] == "llm":
+                rec.llm(p["name"], input=p["input"], output=p["output"])
+            else:
+                rec.tool(p["name"], input=p["input"], output=p["output"], error=p["error"])
+
+
+def bench_record(workdir: str, n: int, batch_size: int = 256) -> Dict[str, Any]:
+    """Recorder step throughput: batched, batched with metrics, and unbuffered (max 10k steps)."""
+    store = SQLiteStore(os.path.join(workdir, "record.db"))
+    store.init()
+    out = {"batched": _rate(n, _timed(lambda: _record(Recorder(store, batch_size=batch_size), n)))}
+    rec = Recorder(store, batch_size=batch_size, metrics=True)
+    out["batched_metrics"] = _rate(n, _timed(lambda: _record(rec, n)))
+    m = min(n, 10_000)
+    out["unbuffered"] = _rate(m, _timed(lambda: _record(Recorder(store), m)))
+    store.close()
+    return out
+
+
+def bench_stores(workdir: str, n: int) -> Dict[str, Any]:
+    """Sustained add_step() (capped at 20k calls), add_steps() and iter_steps() per backend."""
+    out: Dict[str, Any] = {}
+    m = min(n, 20_000)
+    backends: Dict[str, Store] = {
+        "sqlite": SQLiteStore(os.path.join(workdir, "stores.db")),
+        "log": LogStore(os.path.join(workdir, "stores.log")),
+    }
+    for label, store in backends.items():
+        store.init()
+        run_id = store.create_run("bench-add-step", _T0, {})
+        steps = list(synthetic_steps(run_id, m))
+
+        def one_by_one() -> None:
+            for s in steps:
+                store.add_step(s.run_id, s.idx, s.kind, s.name, s.ts, s.input, s.output, s.error)
+
+        res = {"add_step": _rate(m, _timed(one_by_one))}
+        bulk = store.create_run("bench-add-steps", _T0, {})
+        res["add_steps"] = _rate(n, _timed(lambda: store.add_steps(synthetic_steps(bulk, n))))
+        res["iter_steps"] = _rate(n, _timed(lambda: sum(1 for _ in store.iter_steps(bulk))))
+        out[label] = res
+        store.close()
+    return out
+
+
+def bench_reads(store: Store, run_id: str, n: int, runs: int = 1_000) -> Dict[str, Any]:
+    """list_steps()/iter_steps() on the big run; list_runs() first page, filtered and deep pages."""
+    for i in range(runs):
+        rid = store.create_run(f"r{i % 10}", _T0 + timedelta(seconds=i), {"project": f"p{i % 4}"})
+        store.end_run(rid, _T0 + timedelta(seconds=i + 1))
+    steps_s = _timed(lambda: store.list_steps(run_id))
+    lazy_s = _timed(lambda: sum(1 for _ in store.iter_steps(run_id)))
+    cursor = run_cursor(store.list_runs(limit=runs // 2)[-1])
+    return {
+        "list_steps": _rate(n, steps_s),
+        "iter_steps": _rate(n, lazy_s),
+        "list_runs": _latency(lambda: store.list_runs(limit=50), 20),
+        "list_runs_filtered": _latency(
+            lambda: store.list_runs(limit=50, project="p1", name="r5"), 20
+        ),
+        "list_runs_cursor": _latency(lambda: store.list_runs(limit=50, cursor=cursor), 20),
+    }
+
+
+def bench_diff(store: Store, run_id: str, n: int) -> Dict[str, Any]:
+    """diff_runs() against an identical run, and one diverging in its last tenth."""
+    same = make_run(store, n, "bench-same")
+    late = make_run(store, n, "bench-late", diverge_at=n - max(1, n // 10))
+    return {
+        "identical": _rate(n, _timed(lambda: diff_runs(store, run_id, same))),
+        "late_divergence": _rate(n, _timed(lambda: diff_runs(store, run_id, late))),
+    }
+
+
+def bench_replay(store: Store, run_id: str, n: int) -> Dict[str, Any]:
+    rep = Replayer(store)
+    return {"replay": _rate(n, _timed(lambda: rep.replay(run_id)))}
+
+
+def bench_export(store: Store, run_id: str, n: int, workdir: str) -> Dict[str, Any]:
+    path = os.path.join(workdir, "bench.areplay")
+    out = {"export": _rate(n, _timed(lambda: export_areplay(store, run_id, path)))}
+    out["export"]["bytes"] = os.path.getsize(path)
+    out["import"] = _rate(n, _timed(lambda: import_areplay(store, path)))
+    return out
+
+
+def _naive_recursive(obj: Any) -> Any:
+    # what full coverage looks like with the shallow helpers: a key pass and a value
+    # pass per level, copying everything
+    if isinstance(obj, dict):
+        return {k: _naive_recursive(v) for k, v in redact_dict(obj).items()}
+    if isinstance(obj, list):
+        return [_naive_recursive(v) for v in obj]
+    if isinstance(obj, str):
+        return redact_text(obj)
+    return obj
+
+
+def _per_step_us(fn: Callable[[Dict[str, Any]], Any], payloads: List[Dict[str, Any]]) -> float:
+    t0 = time.perf_counter()
+    for p in payloads:
+        fn(p)
+    return (time.perf_counter() - t0) / len(payloads) * 1e6
+
+
+def bench_redaction(n: int = 10_000) -> Dict[str, float]:
+    """Per-step redaction cost (µs): shallow, naive full-coverage and compiled redactors."""
+    payloads = [_payload(i) for i in range(n)]
+    compiled = CompiledRedactor()
+    return {
+        "steps": n,
+        "shallow_us": _per_step_us(redact_dict, payloads),
+        "naive_recursive_us": _per_step_us(_naive_recursive, payloads),
+        "compiled_us": _per_step_us(compiled, payloads),
+    }
+
+
+def _serialize_twice(p: Dict[str, Any]) -> Any:
+    # payloads dumped for storage, then serialized again (canonically) for the fingerprint
+    texts = [json.dumps(p[f]) for f in ("input", "output", "error")]
+    return texts, step_fingerprint(p["kind"], p["name"], p["input"], p["output"], p["error"])
+
+
+def _serialize_once(p: Dict[str, Any]) -> Any:
+    inp, out = canonical.canonical(p["input"]), canonical.canonical(p["output"])
+    err = None if p["error"] is None else canonical.canonical(p["error"])
+    return inp, out, err, fingerprint_canonical(p["kind"], p["name"], inp, out, err)
+
+
+def bench_codec(n: int = 10_000) -> Dict[str, Any]:
+    """Per-step serialization cost (µs) on the write path and per-payload decode cost."""
+    steps = [synthetic_payloads(i) for i in range(n)]
+    texts = [json.dumps(p["input"]) for p in steps]
+    return {
+        "steps": n,
+        "backend": canonical.BACKEND,
+        "serialize_twice_us": _per_step_us(_serialize_twice, steps),
+        "serialize_once_us": _per_step_us(_serialize_once, steps),
+        "json_loads_us": _per_step_us(json.loads, texts),
+        "codec_loads_us": _per_step_us(canonical.loads, texts),
+    }
+
+
+def run_suite(
+    n: int,
+    only: Optional[Iterable[str]] = None,
+    workdir: Optional[str] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the benchmarks against a synthetic run of n steps and return a JSON-able report.
+    Everything is written under `workdir` (a temp dir, removed afterwards, by default).
+    """
+    selected = list(only or BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {sorted(unknown)} (choose from {BENCHMARKS})")
+    tmp = workdir or tempfile.mkdtemp(prefix="agentreplay-bench-")
+    os.makedirs(tmp, exist_ok=True)
+    results: Dict[str, Any] = {}
+    try:
+        store = SQLiteStore(os.path.join(tmp, "bench.db"))
+        store.init()
+        run_id = None
+        if set(selected) - {"record", "stores", "redaction", "codec"}:
+            t0 = time.perf_counter()
+            run_id = make_run(store, n)
+            results["setup"] = _rate(n, time.perf_counter() - t0)
+        for name in selected:
+            if progress:
+                progress(name)
+            if name == "record":
+                results[name] = bench_record(tmp, n)
+            elif name == "stores":
+                results[name] = bench_stores(tmp, n)
+            elif name == "reads":
+                results[name] = bench_reads(store, run_id, n)
+            elif name == "diff":
+                results[name] = bench_diff(store, run_id, n)
+            elif name == "replay":
+                results[name] = bench_replay(store, run_id, n)
+            elif name == "export":
+                results[name] = bench_export(store, run_id, n, tmp)
+            elif name == "redaction":
+                results[name] = bench_redaction(min(n, 100_000))
+            elif name == "codec":
+                results[name] = bench_codec(min(n, 100_000))
+        store.close()
+    finally:
+        if workdir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "steps": n,
+        "results": results,
+    }
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("agentreplayx")
+    except Exception:
+        return "unknown"
+
+
+if __name__ == "__main__":
+    arg = sys.argv[1] if len(sys.argv) > 1 else "1k"
+    n = SIZES[arg] if arg in SIZES else int(arg)
+    print(json.dumps(run_suite(n), indent=2))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional, Tuple, Union
+
+try:  # optional: pip install agentreplayx[fast]
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_canonical_encoder = json.JSONEncoder(sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def canonical(obj: Any) -> str:
+    """
+    Canonical JSON text: sorted keys, compact separators, unicode kept as-is.
+
+    This is what step fingerprints hash and what stores persist, so it is always
+    produced by the stdlib encoder: orjson formats some floats differently (1e16 vs
+    1e+16), which would make fingerprints depend on what happens to be installed.
+    Non-string keys are turned into strings first, as json.dumps would write them.
+    """
+    try:
+        return _canonical_encoder.encode(obj)
+    except TypeError:
+        # sort_keys cannot order e.g. {1: .., "b": ..}
+        return _canonical_encoder.encode(_str_keys(obj))
+
+
+def _key(k: Any) -> Any:
+    if isinstance(k, str):
+        return k
+    if k is None or isinstance(k, (bool, int, float)):
+        return json.dumps(k)
+    return k  # anything else stays unsupported, as in json.dumps
+
+
+def _str_keys(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {_key(k): _str_keys(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_str_keys(v) for v in obj]
+    return obj
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Compact UTF-8 JSON (not canonical; for spill files, exports and other transport)."""
+        try:
+            return orjson.dumps(obj, option=_OPTS)
+        except TypeError:  # e.g. ints beyond 64 bits
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    # orjson parses integers beyond 64 bits as floats. Text with fewer than 19 digits
+    # in total cannot hold one (a cheap C-level check); anything else goes to the stdlib.
+    _DIGITS = b"0123456789"
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        b = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        if len(b) - len(b.translate(None, _DIGITS)) >= 19:
+            return json.loads(b)
+        try:
+            return orjson.loads(b)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity and other stdlib-only extensions
+            return json.loads(b)
+
+else:
+
+    def dumps(obj: Any) -> bytes:
+        """Compact UTF-8 JSON (not canonical; for spill files, exports and other transport)."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def payload_canonical(step: Any, field: str) -> str:
+    """
+    Canonical JSON of step.input/output/error. Steps read from a store that persists
+    canonical text (see LazyStep.canonical) return it without decoding or re-encoding.
+    """
+    fn = getattr(step, "canonical", None)
+    if fn is not None:
+        return fn(field)
+    return canonical(getattr(step, field))
+
+
+def payload_texts(step: Any) -> Tuple[str, str, Optional[str]]:
+    """Canonical input, output and error (None without one) of a step, for writing it."""
+    fn = getattr(step, "canonical", None)
+    if fn is None:
+        err = step.error
+        return (
+            canonical(step.input or {}),
+            canonical(step.output or {}),
+            None if err is None else canonical(err),
+        )
+    err = fn("error")
+    return fn("input"), fn("output"), None if err == "null" else err
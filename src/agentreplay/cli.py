@@ -1,63 +1,489 @@
 from __future__ import annotations
 
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Optional
+
 import typer
+from .store import Store, open_store, run_cursor
+from .store_remote import DEFAULT_ADDRESS, drain_spool
+from .store_shard import ShardedStore
 from .store_sqlite import SQLiteStore
 from .replay import Replayer
-from .diff import diff_runs
+from .retention import RetentionPolicy
+from .diff import diff_batch, diff_runs, pair_runs, run_key, summarize_batch
 from .exporter import export_areplay, import_areplay
+from .metrics import parse_prometheus
 
 app = typer.Typer(no_args_is_help=True)
 
+_DB_HELP = "SQLite file, log:<dir>, remote:<address> or shards:<dir>"
+
+
+def _open_store(db: str) -> Store:
+    """--db value, see store.open_store()."""
+    store = open_store(db)
+    store.init()
+    return store
+
 
 @app.command("runs")
 def runs_cmd(
-    action: str = typer.Argument(..., help="list"),
-    db: str = typer.Option("agentreplay.db", "--db"),
+    action: str = typer.Argument(..., help="list | stats"),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
     limit: int = typer.Option(20, "--limit"),
+    project: Optional[str] = typer.Option(None, "--project"),
+    name: Optional[str] = typer.Option(None, "--name"),
+    since: Optional[datetime] = typer.Option(
+        None, "--since", help="Started at or after (ISO time)"
+    ),
+    until: Optional[datetime] = typer.Option(None, "--until", help="Started before (ISO time)"),
+    errors: Optional[bool] = typer.Option(
+        None, "--errors/--no-errors", help="Only runs with/without errors"
+    ),
+    cursor: Optional[str] = typer.Option(None, "--cursor", help="Continue from a previous page"),
 ):
-    store = SQLiteStore(db)
-    store.init()
+    store = _open_store(db)
+    if action == "stats":
+        for k, v in store.stats().items():
+            typer.echo(f"{k}: {v}")
+        return
     if action != "list":
-        raise typer.BadParameter("Only 'list' supported")
-    runs = store.list_runs(limit=limit)
+        raise typer.BadParameter("Only 'list' and 'stats' supported")
+    runs = store.list_runs(
+        limit=limit, project=project, name=name, since=since, until=until, has_error=errors,
+        cursor=cursor,
+    )
     for r in runs:
         typer.echo(f"{r.id}  {r.started_at.isoformat()}  {r.name}")
+    if len(runs) == limit:
+        typer.echo(f"next: --cursor '{run_cursor(runs[-1])}'", err=True)
 
 
-@app.command("replay")
-def replay_cmd(
-    run_id: str = typer.Argument(...),
+@app.command("shards")
+def shards_cmd(
+    action: str = typer.Argument(..., help="init"),
+    path: str = typer.Argument(..., help="Directory of the sharded layout"),
+    count: int = typer.Option(4, "--count", help="Number of shards"),
+    by: str = typer.Option("run_id", "--by", help="run_id | project"),
+    backend: str = typer.Option("sqlite", "--backend", help="sqlite | log"),
+):
+    """Create a sharded layout; use it with --db shards:<dir>."""
+    if action != "init":
+        raise typer.BadParameter("Only 'init' supported")
+    if by not in ("run_id", "project") or backend not in ("sqlite", "log"):
+        raise typer.BadParameter("--by must be run_id|project and --backend sqlite|log")
+    store = ShardedStore.create(path, shards=count, by=by, backend=backend)  # type: ignore[arg-type]
+    store.init()
+    store.close()
+    typer.echo(f"Created {count} {backend} shards in {path} (by {by}); use --db shards:{path}")
+
+
+@app.command("recompress")
+def recompress_cmd(
+    codec: str = typer.Option("zlib", "--codec", help="zlib | lzma | zstd | none"),
+    min_bytes: int = typer.Option(512, "--min-bytes", help="Payloads smaller than this stay plain"),
     db: str = typer.Option("agentreplay.db", "--db"),
-    strict: bool = typer.Option(False, "--strict", help="Fail if tool inputs differ from recorded trace"),
 ):
-    store = SQLiteStore(db)
+    """Recompress stored step payloads in place."""
+    store = SQLiteStore(db, compress_min_bytes=min_bytes)
     store.init()
+    n = store.recompress(None if codec == "none" else codec)
+    typer.echo(f"Recompressed {n} steps with codec={codec}")
+
+
+@app.command("gc")
+def gc_cmd(
+    project: Optional[str] = typer.Option(
+        None, "--project", help="Limit the policy to one project"
+    ),
+    ttl_days: Optional[float] = typer.Option(
+        None, "--ttl-days", help="Delete runs older than this"
+    ),
+    max_runs: Optional[int] = typer.Option(None, "--max-runs", help="Keep only the newest N runs"),
+    max_mb: Optional[float] = typer.Option(
+        None, "--max-mb", help="Keep the newest runs fitting in N MB"
+    ),
+    archive_dir: Optional[str] = typer.Option(
+        None, "--archive-dir", help="Export runs here before deleting"
+    ),
+    dry_run: bool = typer.Option(False, "--dry-run"),
+    convert: bool = typer.Option(
+        False, "--enable-incremental-vacuum", help="One-off VACUUM so older databases can shrink"
+    ),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+):
+    """Apply a retention policy: archive and delete expired runs, then compact."""
+    if ttl_days is None and max_runs is None and max_mb is None:
+        raise typer.BadParameter("Give at least one of --ttl-days, --max-runs, --max-mb")
+    store = _open_store(db)
+    if convert:
+        if not isinstance(store, SQLiteStore):
+            raise typer.BadParameter("--enable-incremental-vacuum only applies to SQLite databases")
+        store.enable_incremental_vacuum()
+    policy = RetentionPolicy(
+        project=project,
+        max_age=timedelta(days=ttl_days) if ttl_days is not None else None,
+        max_runs=max_runs,
+        max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None,
+    )
+    report = store.gc([policy], archive_dir=archive_dir, dry_run=dry_run)
+    for run_id in report.deleted:
+        typer.echo(f"{'would delete' if dry_run else 'deleted'} {run_id}")
+    typer.echo(
+        f"deleted={len(report.deleted)} archived={len(report.archived)}"
+        f" freed_pages={report.freed_pages}"
+    )
+
+
+@app.command("replay")
+def replay_cmd(
+    run_id: Optional[str] = typer.Argument(None),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+    strict: bool = typer.Option(
+        False, "--strict", help="Fail if tool inputs differ from recorded trace"
+    ),
+    match: str = typer.Option(
+        "sequential", "--match", help="sequential | indexed (order-tolerant)"
+    ),
+    agent: Optional[str] = typer.Option(
+        None, "--agent", help="module:function re-executed against the recorded trace"
+    ),
+    all_runs: bool = typer.Option(False, "--all", help="Replay every recorded (non-replay) run"),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Worker processes for --agent replays"),
+    limit: int = typer.Option(1000, "--limit", help="Max runs for --all"),
+):
+    store = _open_store(db)
     rep = Replayer(store)
-    report = rep.replay(run_id, strict=strict)
-    typer.echo(f"ok={report.ok} steps={report.steps_replayed}")
-    for n in report.notes:
-        typer.echo(f"- {n}")
+    if all_runs:
+        runs = (r for r in store.iter_runs() if "replay_of" not in r.meta)
+        run_ids = [r.id for r in itertools.islice(runs, limit)]
+    elif run_id:
+        run_ids = [run_id]
+    else:
+        raise typer.BadParameter("Pass a RUN_ID or --all")
+
+    if agent is None:
+        for rid in run_ids:
+            report = rep.replay(rid, strict=strict, mode=match)  # type: ignore[arg-type]
+            typer.echo(f"{rid} ok={report.ok} steps={report.steps_replayed}")
+            for n in report.notes:
+                typer.echo(f"- {n}")
+        return
+
+    # agents are usually defined in the user's project
+    sys.path.insert(0, os.getcwd())
+    t0 = time.perf_counter()
+    reports = rep.run_many(run_ids, agent, jobs=jobs, strict=strict, mode=match)  # type: ignore[arg-type]
+    wall = time.perf_counter() - t0
+    for report in reports:
+        typer.echo(
+            f"{report.run_id} ok={report.ok} steps={report.steps_replayed}"
+            f" new_run={report.new_run_id} wall={report.wall_time_s:.3f}s"
+            f" steps/s={report.steps_per_s:.0f}"
+        )
+        if not report.ok:
+            for n in report.notes:
+                typer.echo(f"- {n}")
+    ok = sum(1 for r in reports if r.ok)
+    steps = sum(r.steps_replayed for r in reports)
+    runs_per_s = len(reports) / wall if wall else 0
+    steps_per_s = steps / wall if wall else 0
+    typer.echo(
+        f"replayed={len(reports)} ok={ok} failed={len(reports) - ok} wall={wall:.3f}s"
+        f" runs/s={runs_per_s:.1f} steps/s={steps_per_s:.0f}"
+    )
+
+
+@app.command("load")
+def load_cmd(
+    run_ids: Optional[List[str]] = typer.Argument(
+        None, help="Runs to play (default: the most recent --limit)"
+    ),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+    speed: str = typer.Option(
+        "1", "--speed", help="1 = real time, 10 = ten times faster, max = no waiting"
+    ),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", help="Runs played at the same time"),
+    repeat: int = typer.Option(1, "--repeat", help="Play every run this many times"),
+    handlers: Optional[str] = typer.Option(
+        None, "--handlers", help="module:attr, a dict of tool/llm name -> stand-in callable(input)"
+    ),
+    no_latency: bool = typer.Option(False, "--no-latency", help="Mocked calls return at once"),
+    project: Optional[str] = typer.Option(None, "--project"),
+    limit: int = typer.Option(20, "--limit", help="Runs picked without RUN_IDS"),
+    as_json: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+):
+    """Re-issue recorded tool/llm calls on their recorded schedule; report throughput, latency."""
+    from .load import ALL, load_replay
+    from .replay import _load_agent
+
+    store = _open_store(db)
+    if not run_ids:
+        runs = (r for r in store.iter_runs(project=project) if "replay_of" not in r.meta)
+        run_ids = [r.id for r in itertools.islice(runs, limit)]
+    if speed.lower() in ("max", "0"):
+        scale = None
+    else:
+        try:
+            scale = float(speed)
+        except ValueError:
+            raise typer.BadParameter(f"--speed must be a number or max, got {speed!r}")
+    stand_ins = {}
+    if handlers:
+        # stand-ins are usually defined in the user's project
+        sys.path.insert(0, os.getcwd())
+        stand_ins = _load_agent(handlers)
+
+    report = load_replay(
+        store,
+        run_ids * max(1, repeat),
+        speed=scale,
+        concurrency=concurrency,
+        handlers=stand_ins,  # type: ignore[arg-type]
+        simulate_latency=not no_latency,
+    )
+    if as_json:
+        typer.echo(json.dumps(report.to_dict(), indent=2))
+        return
+    typer.echo(
+        f"runs={report.runs} calls={report.calls} errors={report.errors}"
+        f" wall={report.wall_time_s:.3f}s calls/s={report.calls_per_s:.1f}"
+    )
+    if report.lag_ms.get("count"):
+        lag = report.lag_ms
+        typer.echo(
+            f"schedule lag ms: p50={lag['p50']:.2f} p99={lag['p99']:.2f} max={lag['max']:.2f}"
+        )
+    rows = sorted(report.latency_ms.items(), key=lambda kv: (kv[0] != ALL, kv[0]))
+    for key, st in rows:
+        line = (
+            f"  {key}: n={st['count']} p50={st['p50']:.2f}ms p90={st['p90']:.2f}ms"
+            f" p99={st['p99']:.2f}ms"
+        )
+        rec = report.recorded_ms.get(key)
+        if rec:
+            line += f" (recorded p50={rec['p50']:.2f}ms p99={rec['p99']:.2f}ms)"
+        typer.echo(line)
 
 
 @app.command("diff")
 def diff_cmd(
     run_a: str = typer.Argument(...),
     run_b: str = typer.Argument(...),
-    db: str = typer.Option("agentreplay.db", "--db"),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+    align: bool = typer.Option(False, "--align", help="Align whole traces; list every change"),
 ):
-    store = SQLiteStore(db)
-    store.init()
-    typer.echo(diff_runs(store, run_a, run_b))
+    store = _open_store(db)
+    typer.echo(diff_runs(store, run_a, run_b, align=align))
+
+
+def _select_runs(store: Store, selector: str, limit: int):
+    key, sep, value = selector.partition("=")
+    if not sep:
+        raise typer.BadParameter(f"Selector must look like key=value, got {selector!r}")
+    # push indexed filters down to the store; anything else is matched here
+    filters = (
+        {"name": value} if key == "name" else {"project": value} if key == "meta.project" else {}
+    )
+    runs = (r for r in store.iter_runs(**filters) if str(run_key(r, key)) == value)
+    return list(itertools.islice(runs, limit))
+
+
+@app.command("diff-batch")
+def diff_batch_cmd(
+    baseline: str = typer.Option(..., "--baseline", help="Baseline runs, e.g. meta.version=1.2"),
+    candidate: str = typer.Option(..., "--candidate", help="Candidate runs, e.g. meta.version=1.3"),
+    pair_by: str = typer.Option("name", "--pair-by", help="name | meta.<field>"),
+    jobs: int = typer.Option(1, "--jobs", "-j"),
+    out: str = typer.Option("-", "--out", "-o", help="JSONL results file ('-' = stdout)"),
+    limit: int = typer.Option(100_000, "--limit", help="Max runs scanned per side"),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+):
+    """Diff many baseline/candidate run pairs and summarize divergence."""
+    store = _open_store(db)
+    pairs, unpaired = pair_runs(
+        _select_runs(store, baseline, limit), _select_runs(store, candidate, limit), key=pair_by
+    )
+
+    to_stdout = out == "-"
+    f = sys.stdout if to_stdout else open(out, "w", encoding="utf-8")
+
+    def streamed():
+        for r in diff_batch(store, pairs, jobs=jobs):
+            f.write(json.dumps(r) + "\n")
+            yield r
+
+    try:
+        summary = summarize_batch(streamed())
+    finally:
+        if not to_stdout:
+            f.close()
+
+    echo = partial(typer.echo, err=to_stdout)
+    echo(
+        f"pairs={summary['pairs']} unpaired={unpaired} diverged={summary['diverged']}"
+        f" rate={summary['rate']:.2%}"
+    )
+    for title, groups in (("by kind", summary["by_kind"]), ("by tool", summary["by_tool"])):
+        if groups:
+            echo(f"{title}:")
+            for k, g in groups.items():
+                echo(f"  {k}: {g['diverged']} ({g['share_of_pairs']:.2%} of pairs)")
+
+
+@app.command("search")
+def search_cmd(
+    query: Optional[str] = typer.Argument(None, help="Phrase to find in step payloads"),
+    kind: Optional[str] = typer.Option(None, "--kind"),
+    name: Optional[str] = typer.Option(None, "--name"),
+    error_type: Optional[str] = typer.Option(None, "--error", help="error['type'] of the step"),
+    run_id: Optional[str] = typer.Option(None, "--run"),
+    limit: int = typer.Option(100, "--limit"),
+    raw: bool = typer.Option(False, "--raw", help="Pass QUERY through as FTS5 query syntax"),
+    reindex: bool = typer.Option(
+        False, "--reindex", help="Build/rebuild the full-text index first"
+    ),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
+):
+    """Find steps by payload text, kind, name or error type; prints run_id and idx."""
+    store = _open_store(db)
+    if reindex and isinstance(store, SQLiteStore):
+        typer.echo(f"Indexed {store.reindex_search()} steps", err=True)
+    try:
+        hits = store.search_steps(
+            query=query, kind=kind, name=name, error_type=error_type, run_id=run_id, limit=limit,
+            raw=raw,
+        )
+    except RuntimeError as e:
+        raise typer.BadParameter(f"{e} (or run with --reindex)")
+    for rid, idx in hits:
+        typer.echo(f"{rid}  {idx}")
+
+
+@app.command("bench")
+def bench_cmd(
+    size: str = typer.Option("1k", "--size", help="1k | 100k | 1m, or a step count"),
+    only: Optional[str] = typer.Option(None, "--only", help="Comma-separated benchmark names"),
+    out: str = typer.Option("-", "--out", "-o", help="JSON results file ('-' = stdout)"),
+    workdir: Optional[str] = typer.Option(None, "--workdir", help="Keep benchmark databases here"),
+):
+    """Run the synthetic benchmark suite and emit the results as JSON."""
+    # imported here: it pulls in every store and the replay machinery
+    from .bench import SIZES, run_suite
+
+    n = SIZES[size.lower()] if size.lower() in SIZES else int(size)
+    selected = [b.strip() for b in only.split(",") if b.strip()] if only else None
+    try:
+        report = run_suite(
+            n, only=selected, workdir=workdir,
+            progress=lambda b: typer.echo(f"bench {b} ...", err=True),
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    text = json.dumps(report, indent=2)
+    if out == "-":
+        typer.echo(text)
+    else:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        typer.echo(f"Wrote {out}")
+
+
+@app.command("stats")
+def stats_cmd(
+    file: Optional[str] = typer.Option(
+        None, "--file", "-f", help="Prometheus textfile written by Metrics"
+    ),
+    url: Optional[str] = typer.Option(
+        None, "--url", help="Metrics endpoint, e.g. http://127.0.0.1:9464/metrics"
+    ),
+):
+    """Show recorder overhead metrics from a textfile or a running exporter."""
+    if (file is None) == (url is None):
+        raise typer.BadParameter("Give exactly one of --file or --url")
+    if file is not None:
+        with open(file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        from urllib.request import urlopen
+
+        with urlopen(url, timeout=10) as resp:
+            text = resp.read().decode("utf-8")
+
+    phases: dict = {}
+    kinds: dict = {}
+    other: dict = {}
+    for metric, label, value_label, value in parse_prometheus(text):
+        name = metric[len("agentreplay_"):] if metric.startswith("agentreplay_") else metric
+        if label == "phase":
+            phases.setdefault(value_label, {})[name] = value
+        elif label == "kind":
+            kinds.setdefault(value_label, {})[name] = value
+        else:
+            other[name] = value
+
+    typer.echo(f"{'phase':<14}{'calls':>10}{'total ms':>12}{'avg us':>10}{'max us':>10}")
+    for phase, v in phases.items():
+        calls = v.get("phase_calls_total", 0)
+        total = v.get("phase_seconds_total", 0.0)
+        avg = total / calls * 1e6 if calls else 0.0
+        mx = v.get("phase_max_seconds", 0.0) * 1e6
+        typer.echo(f"{phase:<14}{int(calls):>10}{total * 1e3:>12.2f}{avg:>10.1f}{mx:>10.1f}")
+    typer.echo(f"\n{'kind':<14}{'steps':>10}{'errors':>10}{'bytes':>14}")
+    for kind, v in sorted(kinds.items()):
+        typer.echo(
+            f"{kind:<14}{int(v.get('steps_total', 0)):>10}{int(v.get('step_errors_total', 0)):>10}"
+            f"{int(v.get('step_bytes_total', 0)):>14}"
+        )
+    for name, value in sorted(other.items()):
+        typer.echo(f"{name}: {value:g}")
+
+
+@app.command("serve")
+def serve_cmd(
+    db: str = typer.Option("agentreplay.db", "--db", help="SQLite file, or log:<dir>"),
+    listen: str = typer.Option(DEFAULT_ADDRESS, "--listen", help="host:port, or unix:<path>"),
+    batch_size: int = typer.Option(
+        1024, "--batch-size", help="Write requests coalesced per transaction"
+    ),
+    spool: Optional[List[str]] = typer.Option(
+        None, "--spool", help="Apply a RemoteStore spool file first"
+    ),
+):
+    """Run the ingest daemon: the single writer to --db for RemoteStore clients."""
+    from .server import IngestServer
+
+    store = _open_store(db)
+    for path in spool or []:
+        n = drain_spool(path, store)
+        os.remove(path)
+        typer.echo(f"Applied {n} spooled writes from {path}")
+    server = IngestServer(store, listen, batch_size=batch_size)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    typer.echo(f"Listening on {server.address} (workers: --db remote:{server.address})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        typer.echo(f"Stopped: {server.steps_written} steps in {server.batches} transactions")
 
 
 @app.command("export")
 def export_cmd(
     run_id: str = typer.Argument(...),
     out: str = typer.Option("run.areplay", "--out", "-o"),
-    db: str = typer.Option("agentreplay.db", "--db"),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
 ):
-    store = SQLiteStore(db)
-    store.init()
+    store = _open_store(db)
     path = export_areplay(store, run_id, out)
     typer.echo(f"Exported: {path}")
 
@@ -65,11 +491,11 @@ def export_cmd(
 @app.command("import")
 def import_cmd(
     path: str = typer.Argument(...),
-    db: str = typer.Option("agentreplay.db", "--db"),
+    db: str = typer.Option("agentreplay.db", "--db", help=_DB_HELP),
 ):
-    store = SQLiteStore(db)
-    store.init()
+    store = _open_store(db)
     new_id = import_areplay(store, path)
+    store.close()
     typer.echo(f"Imported as run_id: {new_id}")
 
 
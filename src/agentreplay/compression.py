@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import lzma
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+try:  # optional: pip install zstandard
+    import zstandard as _zstd
+except ImportError:  # pragma: no cover - depends on environment
+    _zstd = None
+
+
+@dataclass(frozen=True)
+class Codec:
+    name: str
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+_CODECS: Dict[str, Codec] = {
+    "zlib": Codec("zlib", lambda b: zlib.compress(b, 6), zlib.decompress),
+    "lzma": Codec("lzma", lzma.compress, lzma.decompress),
+}
+
+if _zstd is not None:
+    # zstandard (de)compressor objects are not thread-safe; keep one per thread
+    _zstd_local = threading.local()
+
+    def _zstd_compress(b: bytes) -> bytes:
+        c = getattr(_zstd_local, "c", None)
+        if c is None:
+            c = _zstd_local.c = _zstd.ZstdCompressor(level=3)
+        return c.compress(b)
+
+    def _zstd_decompress(b: bytes) -> bytes:
+        d = getattr(_zstd_local, "d", None)
+        if d is None:
+            d = _zstd_local.d = _zstd.ZstdDecompressor()
+        return d.decompress(b)
+
+    _CODECS["zstd"] = Codec("zstd", _zstd_compress, _zstd_decompress)
+
+
+def available_codecs() -> List[str]:
+    return sorted(_CODECS)
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return _CODECS[name]
+    except KeyError:
+        hint = " (pip install zstandard)" if name == "zstd" else ""
+        raise ValueError(
+            f"Unknown compression codec: {name}{hint}. Available: {', '.join(available_codecs())}"
+        ) from None
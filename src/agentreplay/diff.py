@@ -1,53 +1,259 @@
 from __future__ import annotations
 
-import json
-from typing import Any, List, Tuple, Optional
+import difflib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Optional
+from .canonical import payload_canonical
 from .store import Store
-from .models import Step
-
-
-def _stable(obj: Any) -> str:
-    return json.dumps(obj, sort_keys=True, ensure_ascii=False)
-
-
-def _first_divergence(a_steps: List[Step], b_steps: List[Step]) -> Optional[Tuple[int, Step, Step, str]]:
-    n = min(len(a_steps), len(b_steps))
-    for i in range(n):
-        a = a_steps[i]
-        b = b_steps[i]
-        if (a.kind, a.name) != (b.kind, b.name):
-            return (i, a, b, "kind/name changed")
-        if _stable(a.input) != _stable(b.input):
-            return (i, a, b, "input changed")
-        if _stable(a.output) != _stable(b.output):
-            return (i, a, b, "output changed")
-        if _stable(a.error) != _stable(b.error):
-            return (i, a, b, "error changed")
-    if len(a_steps) != len(b_steps):
-        # Divergence at length boundary
-        i = n
-        dummy = a_steps[-1] if a_steps else b_steps[-1]
-        return (i, dummy, dummy, f"length changed: {len(a_steps)} != {len(b_steps)}")
+from .models import Run, Step
+
+
+def _change_reason(a: Step, b: Step) -> Optional[str]:
+    if (a.kind, a.name) != (b.kind, b.name):
+        return "kind/name changed"
+    # canonical text straight from storage where the store keeps it (no decode)
+    for field in ("input", "output", "error"):
+        if payload_canonical(a, field) != payload_canonical(b, field):
+            return f"{field} changed"
     return None
 
 
-def diff_runs(store: Store, run_a: str, run_b: str) -> str:
-    a_steps = store.list_steps(run_a)
-    b_steps = store.list_steps(run_b)
+def _first_divergence(
+    a_steps: Iterable[Step], b_steps: Iterable[Step]
+) -> Optional[Tuple[int, Optional[Step], Optional[Step], str]]:
+    """
+    (index, step of A, step of B, reason) of the first difference. When one run is a
+    prefix of the other, the longer run's first extra step is returned on its side
+    and the other side is None.
+    """
+    a_it = iter(a_steps)
+    b_it = iter(b_steps)
+    i = 0
+    while True:
+        a = next(a_it, None)
+        b = next(b_it, None)
+        if a is None or b is None:
+            break
+        # equal fingerprints => identical steps, payloads never decoded
+        if a.fingerprint is None or a.fingerprint != b.fingerprint:
+            reason = _change_reason(a, b)
+            if reason is not None:
+                return (i, a, b, reason)
+        i += 1
+
+    if a is None and b is None:
+        return None
+    # Divergence at length boundary; count the tail without decoding payloads
+    len_a = i + (a is not None) + sum(1 for _ in a_it)
+    len_b = i + (b is not None) + sum(1 for _ in b_it)
+    return (i, a, b, f"length changed: {len_a} != {len_b}")
+
+
+def _describe(label: str, s: Optional[Step]) -> str:
+    if s is None:
+        return f"  {label}: (no step, run ended)"
+    return f"  {label}: kind={s.kind} name={s.name} idx={s.idx}"
 
-    div = _first_divergence(a_steps, b_steps)
+
+def _snippet(s: Optional[Step], field: str) -> str:
+    return "" if s is None else payload_canonical(s, field)[:400]
+
+
+def diff_runs(store: Store, run_a: str, run_b: str, align: bool = False) -> str:
+    if align:
+        return _format_alignment(align_runs(store, run_a, run_b))
+
+    div = _first_divergence(store.iter_steps(run_a), store.iter_steps(run_b))
     if div is None:
         return "No divergence. Runs are identical at step granularity."
 
     i, a, b, reason = div
     lines = []
     lines.append(f"DIVERGENCE at step index {i}: {reason}")
-    lines.append(f"  A: kind={a.kind} name={a.name} idx={a.idx}")
-    lines.append(f"  B: kind={b.kind} name={b.name} idx={b.idx}")
+    lines.append(_describe("A", a))
+    lines.append(_describe("B", b))
 
     # Show small payload snippets
-    lines.append("  A.input:  " + _stable(a.input)[:400])
-    lines.append("  B.input:  " + _stable(b.input)[:400])
-    lines.append("  A.output: " + _stable(a.output)[:400])
-    lines.append("  B.output: " + _stable(b.output)[:400])
+    lines.append("  A.input:  " + _snippet(a, "input"))
+    lines.append("  B.input:  " + _snippet(b, "input"))
+    lines.append("  A.output: " + _snippet(a, "output"))
+    lines.append("  B.output: " + _snippet(b, "output"))
     return "\n".join(lines)
+
+
+def _get_step(store: Store, run_id: str, idx: int) -> Step:
+    return next(iter(store.iter_steps(run_id, start_idx=idx)))
+
+
+def align_runs(store: Store, run_a: str, run_b: str) -> Dict[str, Any]:
+    """
+    Align two whole traces over their step fingerprints and report every difference.
+
+    Returns {"equal": n, "ops": [...]} where each op is an insert (step only in B),
+    delete (step only in A) or change (same kind/name, different payloads). Only the
+    payloads of changed steps are decoded, to tell what changed.
+    """
+    fa = list(store.iter_fingerprints(run_a))
+    fb = list(store.iter_fingerprints(run_b))
+    matcher = difflib.SequenceMatcher(None, [x[3] for x in fa], [x[3] for x in fb], autojunk=False)
+
+    ops: List[Dict[str, Any]] = []
+    equal = 0
+
+    def delete(i: int) -> None:
+        ops.append({"op": "delete", "a_idx": fa[i][0], "kind": fa[i][1], "name": fa[i][2]})
+
+    def insert(j: int) -> None:
+        ops.append({"op": "insert", "b_idx": fb[j][0], "kind": fb[j][1], "name": fb[j][2]})
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            equal += i2 - i1
+            continue
+        # replace blocks: same kind/name at the same offset is a change, the rest ins/del
+        for k in range(max(i2 - i1, j2 - j1)):
+            i, j = i1 + k, j1 + k
+            if i < i2 and j < j2 and fa[i][1:3] == fb[j][1:3]:
+                a, b = _get_step(store, run_a, fa[i][0]), _get_step(store, run_b, fb[j][0])
+                ops.append({
+                    "op": "change",
+                    "a_idx": fa[i][0],
+                    "b_idx": fb[j][0],
+                    "kind": fa[i][1],
+                    "name": fa[i][2],
+                    "reason": _change_reason(a, b) or "fingerprint changed",
+                })
+                continue
+            if i < i2:
+                delete(i)
+            if j < j2:
+                insert(j)
+    return {"run_a": run_a, "run_b": run_b, "equal": equal, "ops": ops}
+
+
+def _format_alignment(result: Dict[str, Any]) -> str:
+    ops = result["ops"]
+    if not ops:
+        return "No divergence. Runs are identical at step granularity."
+    counts = {k: sum(1 for o in ops if o["op"] == k) for k in ("insert", "delete", "change")}
+    lines = [
+        f"ALIGNED DIFF: {result['equal']} equal, {counts['change']} changed, "
+        f"{counts['insert']} inserted, {counts['delete']} deleted"
+    ]
+    for o in ops:
+        if o["op"] == "insert":
+            lines.append(f"  + B[{o['b_idx']}] kind={o['kind']} name={o['name']}")
+        elif o["op"] == "delete":
+            lines.append(f"  - A[{o['a_idx']}] kind={o['kind']} name={o['name']}")
+        else:
+            lines.append(
+                f"  ~ A[{o['a_idx']}] B[{o['b_idx']}] kind={o['kind']} name={o['name']}:"
+                f" {o['reason']}"
+            )
+    return "\n".join(lines)
+
+
+def diff_summary(store: Store, run_a: str, run_b: str) -> Dict[str, Any]:
+    """Machine-readable counterpart of diff_runs() (one JSON-serializable dict)."""
+    div = _first_divergence(store.iter_steps(run_a), store.iter_steps(run_b))
+    if div is None:
+        return {"run_a": run_a, "run_b": run_b, "diverged": False}
+    i, a, b, reason = div
+    # on a length change, the first step only one run has; "side" says which
+    step = a if a is not None else b
+    return {
+        "run_a": run_a,
+        "run_b": run_b,
+        "diverged": True,
+        "index": i,
+        "reason": reason,
+        "kind": step.kind,  # type: ignore[union-attr]
+        "name": step.name,  # type: ignore[union-attr]
+        "side": "both" if a is not None and b is not None else "a" if a is not None else "b",
+    }
+
+
+def run_key(run: Run, key: str) -> Any:
+    """Value of `name`, `id` or `meta.<field>` for a run (used to select and pair runs)."""
+    if key.startswith("meta."):
+        return run.meta.get(key[len("meta."):])
+    if key in ("name", "id"):
+        return getattr(run, key)
+    raise ValueError(f"Unsupported run key: {key!r} (use name, id or meta.<field>)")
+
+
+def pair_runs(
+    baseline: Iterable[Run], candidate: Iterable[Run], key: str = "name"
+) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Pair baseline and candidate runs sharing the same key value, oldest first.
+    Returns (pairs of run ids, number of runs left unpaired).
+    """
+    groups: Dict[Any, List[List[Run]]] = {}
+    for side, runs in enumerate((baseline, candidate)):
+        for r in runs:
+            groups.setdefault(run_key(r, key), [[], []])[side].append(r)
+
+    pairs: List[Tuple[str, str]] = []
+    unpaired = 0
+    for a_runs, b_runs in groups.values():
+        a_runs.sort(key=lambda r: r.started_at)
+        b_runs.sort(key=lambda r: r.started_at)
+        pairs += [(a.id, b.id) for a, b in zip(a_runs, b_runs)]
+        unpaired += abs(len(a_runs) - len(b_runs))
+    return pairs, unpaired
+
+
+def _diff_pair(store: Store, pair: Tuple[str, str]) -> Dict[str, Any]:
+    return diff_summary(store, *pair)
+
+
+def diff_batch(
+    store: Store, pairs: Sequence[Tuple[str, str]], jobs: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """
+    Diff many (run_a, run_b) pairs, yielding diff_summary() dicts in input order as they
+    complete. With jobs > 1 comparisons run in a process pool (the store must be picklable).
+    """
+    if jobs <= 1:
+        for pair in pairs:
+            yield _diff_pair(store, pair)
+        return
+    chunksize = max(1, min(64, len(pairs) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(partial(_diff_pair, store), pairs, chunksize=chunksize)
+
+
+def summarize_batch(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate diff_batch() results: overall divergence rate, by step kind and by tool name.
+    A pair counts once, under the step it first diverged at; `share_of_pairs` is that
+    count over all pairs, not a divergence rate of the kind or tool itself.
+    """
+    total = 0
+    diverged = 0
+    by_kind: Dict[str, int] = {}
+    by_tool: Dict[str, int] = {}
+    for r in results:
+        total += 1
+        if not r["diverged"]:
+            continue
+        diverged += 1
+        by_kind[r["kind"]] = by_kind.get(r["kind"], 0) + 1
+        if r["kind"] == "tool":
+            by_tool[r["name"]] = by_tool.get(r["name"], 0) + 1
+
+    def rates(counts: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+        return {
+            k: {"diverged": n, "share_of_pairs": n / total if total else 0.0}
+            for k, n in sorted(counts.items(), key=lambda kv: -kv[1])
+        }
+
+    return {
+        "pairs": total,
+        "diverged": diverged,
+        "rate": diverged / total if total else 0.0,
+        "by_kind": rates(by_kind),
+        "by_tool": rates(by_tool),
+    }
@@ -1,31 +1,46 @@
 from __future__ import annotations
 
+import io
 import json
+import uuid
 import zipfile
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator
 
 from .store import Store
+from .canonical import dumps, loads, payload_canonical
 from .models import Run, Step
 
 
-FORMAT_VERSION = "0.2"
+FORMAT_VERSION = "0.3"
+
+# v0.3 streams one JSON object per line; v0.2 stored a single pretty-printed array
+STEPS_MEMBER = "steps.jsonl"
+LEGACY_STEPS_MEMBER = "steps.json"
 
 
 def _json_bytes(obj: Any) -> bytes:
     return json.dumps(obj, ensure_ascii=False, sort_keys=True, indent=2).encode("utf-8")
 
 
+def _step_line(s: Step) -> bytes:
+    # payloads go in as canonical text, so steps from canonical stores are never decoded
+    head_obj = {
+        "id": s.id, "run_id": s.run_id, "idx": s.idx, "kind": s.kind, "name": s.name,
+        "ts": s.ts.isoformat(),
+    }
+    if s.duration_us is not None:
+        head_obj["duration_us"] = s.duration_us
+    head = dumps(head_obj)
+    parts = [head[:-1]]
+    for field in ("input", "output", "error"):
+        parts.append(f',"{field}":{payload_canonical(s, field)}'.encode("utf-8"))
+    parts.append(b"}\n")
+    return b"".join(parts)
+
+
 def export_areplay(store: Store, run_id: str, out_path: str) -> str:
     run: Run = store.get_run(run_id)
-    steps: List[Step] = store.list_steps(run_id)
-
-    manifest: Dict[str, Any] = {
-        "format": "agentreplay.areplay",
-        "version": FORMAT_VERSION,
-        "exported_at": datetime.utcnow().isoformat() + "Z",
-        "run_id": run_id,
-    }
 
     run_obj = {
         "id": run.id,
@@ -35,62 +50,77 @@ def export_areplay(store: Store, run_id: str, out_path: str) -> str:
         "meta": run.meta,
     }
 
-    steps_obj = [
-        {
-            "id": s.id,
-            "run_id": s.run_id,
-            "idx": s.idx,
-            "kind": s.kind,
-            "name": s.name,
-            "ts": s.ts.isoformat(),
-            "input": s.input,
-            "output": s.output,
-            "error": s.error,
-        }
-        for s in steps
-    ]
-
     with zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        z.writestr("manifest.json", _json_bytes(manifest))
         z.writestr("run.json", _json_bytes(run_obj))
-        z.writestr("steps.json", _json_bytes(steps_obj))
+
+        # Stream steps straight into the zip member: memory stays bounded by one step
+        count = 0
+        with z.open(STEPS_MEMBER, "w", force_zip64=True) as f:
+            for s in store.iter_steps(run_id):
+                f.write(_step_line(s))
+                count += 1
+
+        manifest: Dict[str, Any] = {
+            "format": "agentreplay.areplay",
+            "version": FORMAT_VERSION,
+            "exported_at": datetime.utcnow().isoformat() + "Z",
+            "run_id": run_id,
+            "steps": STEPS_MEMBER,
+            "step_count": count,
+        }
+        z.writestr("manifest.json", _json_bytes(manifest))
 
     return out_path
 
 
+def _iter_step_dicts(z: zipfile.ZipFile, manifest: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    if manifest.get("version") == "0.2" or LEGACY_STEPS_MEMBER in z.namelist():
+        steps_obj = json.loads(z.read(LEGACY_STEPS_MEMBER).decode("utf-8"))
+        yield from sorted(steps_obj, key=lambda x: int(x["idx"]))
+        return
+    with z.open(manifest.get("steps", STEPS_MEMBER)) as raw:
+        for line in io.TextIOWrapper(raw, encoding="utf-8"):
+            if line.strip():
+                yield loads(line)
+
+
 def import_areplay(store: Store, in_path: str) -> str:
     """
-    Imports a .areplay artifact into the store as a NEW run_id.
+    Imports a .areplay artifact (v0.2 or v0.3) into the store as a NEW run_id.
+    Steps are streamed into a single Store.add_steps() call.
     Returns the new run_id.
     """
     with zipfile.ZipFile(in_path, "r") as z:
         manifest = json.loads(z.read("manifest.json").decode("utf-8"))
         run_obj = json.loads(z.read("run.json").decode("utf-8"))
-        steps_obj = json.loads(z.read("steps.json").decode("utf-8"))
 
-    name = run_obj.get("name", "imported_run")
-    started_at = datetime.fromisoformat(run_obj["started_at"])
-    meta = run_obj.get("meta", {})
-    meta = {**meta, "imported_from": in_path, "areplay_version": manifest.get("version")}
-
-    new_run_id = store.create_run(name=name, started_at=started_at, meta=meta)
+        name = run_obj.get("name", "imported_run")
+        started_at = datetime.fromisoformat(run_obj["started_at"])
+        meta = run_obj.get("meta", {})
+        meta = {**meta, "imported_from": in_path, "areplay_version": manifest.get("version")}
+
+        new_run_id = store.create_run(name=name, started_at=started_at, meta=meta)
+
+        # Preserve idx/kind/name/payloads; step ids are fresh so re-imports don't collide
+        store.add_steps(
+            Step(
+                id=str(uuid.uuid4()),
+                run_id=new_run_id,
+                idx=int(s["idx"]),
+                kind=s["kind"],
+                name=s["name"],
+                ts=datetime.fromisoformat(s["ts"]),
+                input=s.get("input") or {},
+                output=s.get("output") or {},
+                error=s.get("error"),
+                duration_us=s.get("duration_us"),
+            )
+            for s in _iter_step_dicts(z, manifest)
+        )
 
     # end_run if ended_at exists
     ended_at = run_obj.get("ended_at")
     if ended_at:
         store.end_run(new_run_id, datetime.fromisoformat(ended_at))
 
-    # Insert steps in order; preserve idx/kind/name/payloads
-    for s in sorted(steps_obj, key=lambda x: int(x["idx"])):
-        store.add_step(
-            run_id=new_run_id,
-            idx=int(s["idx"]),
-            kind=s["kind"],
-            name=s["name"],
-            ts=datetime.fromisoformat(s["ts"]),
-            input=s.get("input") or {},
-            output=s.get("output") or {},
-            error=s.get("error"),
-        )
-
     return new_run_id
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Optional
+
+from .canonical import canonical
+
+__all__ = ["canonical", "fingerprint_canonical", "step_fingerprint"]
+
+
+def fingerprint_canonical(
+    kind: str, name: str, input: str, output: str, error: Optional[str]
+) -> str:
+    """
+    step_fingerprint() from payloads that are already canonical JSON text, so a store
+    can hash exactly the text it persists instead of serializing every payload twice.
+    """
+    err = "null" if error is None else error
+    text = f"[{canonical(kind)},{canonical(name)},{input},{output},{err}]"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def step_fingerprint(
+    kind: str,
+    name: str,
+    input: Optional[Dict[str, Any]],
+    output: Optional[Dict[str, Any]],
+    error: Optional[Dict[str, Any]],
+) -> str:
+    """
+    Content hash of a step (kind, name and payloads; not idx/ts/ids).
+    Two steps with equal fingerprints are identical for diffing purposes.
+    """
+    text = canonical([kind, name, input or {}, output or {}, error])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
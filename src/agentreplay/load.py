@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .store import Store
+
+# stand-in for a recorded tool/llm call: gets the recorded input, its result is discarded
+Handler = Callable[[Dict[str, Any]], Any]
+
+ALL = "*"
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """count, p50/p90/p99 (nearest rank) and max of `samples`."""
+    xs = sorted(samples)
+    if not xs:
+        return {"count": 0}
+
+    def rank(p: float) -> float:
+        return xs[max(0, math.ceil(p / 100 * len(xs)) - 1)]
+
+    return {"count": len(xs), "p50": rank(50), "p90": rank(90), "p99": rank(99), "max": xs[-1]}
+
+
+@dataclass(frozen=True)
+class LoadReport:
+    """
+    Latencies are in milliseconds, keyed "kind:name" plus "*" for all calls.
+    `recorded_ms` holds the same statistics for the durations in the trace (steps
+    recorded with timing only), `lag_ms` how late calls started against the scaled
+    schedule: a stand-in slower than the original pushes the rest of its run back.
+    """
+
+    runs: int
+    calls: int
+    errors: int
+    wall_time_s: float
+    speed: Optional[float]
+    concurrency: int
+    latency_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    recorded_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    lag_ms: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def calls_per_s(self) -> float:
+        return self.calls / self.wall_time_s if self.wall_time_s > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "calls": self.calls,
+            "errors": self.errors,
+            "wall_time_s": self.wall_time_s,
+            "calls_per_s": self.calls_per_s,
+            "speed": self.speed,
+            "concurrency": self.concurrency,
+            "latency_ms": self.latency_ms,
+            "recorded_ms": self.recorded_ms,
+            "lag_ms": self.lag_ms,
+        }
+
+
+class _Samples:
+    """Seconds, per "kind:name"; one per played run, then merged."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latency: Dict[str, List[float]] = {}
+        self.recorded: Dict[str, List[float]] = {}
+        self.lag: List[float] = []
+
+    def merge(self, other: "_Samples") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        for mine, theirs in ((self.latency, other.latency), (self.recorded, other.recorded)):
+            for k, v in theirs.items():
+                mine.setdefault(k, []).extend(v)
+        self.lag.extend(other.lag)
+
+
+def _stats_ms(groups: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    out = {k: percentiles([x * 1e3 for x in v]) for k, v in sorted(groups.items())}
+    if groups:
+        out[ALL] = percentiles([x * 1e3 for v in groups.values() for x in v])
+    return out
+
+
+def load_replay(
+    store: Store,
+    run_ids: Sequence[str],
+    speed: Optional[float] = 1.0,
+    concurrency: int = 8,
+    handlers: Optional[Dict[str, Handler]] = None,
+    kinds: Sequence[str] = ("tool", "llm"),
+    simulate_latency: bool = True,
+    clock: Callable[[], float] = time.perf_counter,
+    sleep: Callable[[float], None] = time.sleep,
+) -> LoadReport:
+    """
+    Re-issue the tool/llm calls of recorded runs on their original schedule, as load.
+
+    Runs start at their recorded offsets from the earliest run and each run's calls
+    at their recorded offsets, all divided by `speed` (1.0 = real time, 10.0 = ten
+    times faster, None = no waiting). Calls of one run go out one after another;
+    runs go out concurrently, at most `concurrency` at a time (a run id listed twice
+    is played twice). Calls named in `handlers` go to that stand-in; the others are
+    mocked and take their recorded duration (scaled) unless `simulate_latency` is off
+    or speed is None.
+    """
+    handlers = handlers or {}
+    runs = [store.get_run(run_id) for run_id in run_ids]
+    if not runs:
+        return LoadReport(0, 0, 0, 0.0, speed, concurrency)
+    origin = min(r.started_at for r in runs)
+
+    def wait_until(target: float) -> float:
+        # -> how late we are for `target`
+        delay = target - clock()
+        if delay > 0:
+            sleep(delay)
+        return max(0.0, clock() - target)
+
+    def play(run_id: str, t0: float) -> _Samples:
+        out = _Samples()
+        for s in list(store.iter_steps(run_id, kinds=kinds)):
+            if speed:
+                out.lag.append(wait_until(t0 + (s.ts - origin).total_seconds() / speed))
+            key = f"{s.kind}:{s.name}"
+            handler = handlers.get(s.name)
+            start = clock()
+            if handler is not None:
+                try:
+                    handler(s.input)
+                except Exception:
+                    out.errors += 1
+            elif simulate_latency and speed and s.duration_us:
+                sleep(s.duration_us / 1e6 / speed)
+            out.latency.setdefault(key, []).append(clock() - start)
+            out.calls += 1
+            if s.duration_us is not None:
+                out.recorded.setdefault(key, []).append(s.duration_us / 1e6)
+        return out
+
+    t0 = clock()
+
+    def start(run_index: int) -> _Samples:
+        run = runs[run_index]
+        if speed:
+            # waiting here holds a worker, like a client that is about to start a run would
+            wait_until(t0 + (run.started_at - origin).total_seconds() / speed)
+        return play(run.id, t0)
+
+    order = sorted(range(len(runs)), key=lambda i: runs[i].started_at)
+    samples = _Samples()
+    with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="agentreplay-load") as pool:
+        for played in pool.map(start, order):
+            samples.merge(played)
+    wall = clock() - t0
+
+    return LoadReport(
+        runs=len(runs),
+        calls=samples.calls,
+        errors=samples.errors,
+        wall_time_s=wall,
+        speed=speed,
+        concurrency=concurrency,
+        latency_ms=_stats_ms(samples.latency),
+        recorded_ms=_stats_ms(samples.recorded),
+        lag_ms=percentiles([x * 1e3 for x in samples.lag]) if speed else {},
+    )
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PHASES = ("redaction", "serialization", "write")
+
+_PREFIX = "agentreplay_"
+
+
+class Metrics:
+    """
+    Recording overhead counters, shared by a Recorder and (optionally) its Store.
+
+    Phases are timed with perf_counter_ns: "redaction" (Recorder), "serialization"
+    (stores that support Store.instrument()) and "write" (time spent in Store.add_step()/
+    add_steps(), which includes serialization). Steps, errors and payload bytes are
+    counted by step kind. Nothing is measured unless a Recorder is created with
+    metrics=...; without it the hot path is the plain, uninstrumented one.
+    """
+
+    def __init__(self, textfile: Optional[str] = None) -> None:
+        self.textfile = textfile
+        self._lock = threading.Lock()
+        # gauges sampled at snapshot time (e.g. AsyncRecorder queue depth)
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # phase -> [calls, total_ns, max_ns]
+            self._phases: Dict[str, List[int]] = {p: [0, 0, 0] for p in PHASES}
+            self._steps: Counter[str] = Counter()
+            self._errors: Counter[str] = Counter()
+            self._bytes: Counter[str] = Counter()
+            self._write_errors = 0
+
+    def observe(self, phase: str, ns: int) -> None:
+        with self._lock:
+            p = self._phases.setdefault(phase, [0, 0, 0])
+            p[0] += 1
+            p[1] += ns
+            if ns > p[2]:
+                p[2] = ns
+
+    def count_step(self, kind: str, error: bool) -> None:
+        with self._lock:
+            self._steps[kind] += 1
+            if error:
+                self._errors[kind] += 1
+
+    def count_bytes(self, kind: str, n: int) -> None:
+        with self._lock:
+            self._bytes[kind] += n
+
+    def count_write_error(self) -> None:
+        with self._lock:
+            self._write_errors += 1
+
+    def timed(self, phase: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap fn so every call is observed under `phase`."""
+        observe = self.observe
+        clock = time.perf_counter_ns
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(phase, clock() - t0)
+
+        return wrapper
+
+    def add_collector(self, fn: Callable[[], Dict[str, float]]) -> None:
+        self._collectors.append(fn)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = {
+                name: {
+                    "calls": calls,
+                    "total_s": total / 1e9,
+                    "avg_us": total / calls / 1e3 if calls else 0.0,
+                    "max_us": mx / 1e3,
+                }
+                for name, (calls, total, mx) in self._phases.items()
+            }
+            out: Dict[str, Any] = {
+                "phases": phases,
+                "steps": dict(self._steps),
+                "errors": dict(self._errors),
+                "bytes": dict(self._bytes),
+                "write_errors": self._write_errors,
+            }
+        gauges: Dict[str, float] = {}
+        for fn in self._collectors:
+            gauges.update(fn())
+        out["gauges"] = gauges
+        return out
+
+    # -- Prometheus text format --
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_: str, samples: List[Tuple[str, float]]) -> None:
+            lines.append(f"# HELP {_PREFIX}{name} {help_}")
+            lines.append(f"# TYPE {_PREFIX}{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{_PREFIX}{name}{labels} {value!r}")
+
+        phases = snap["phases"]
+        family("phase_seconds_total", "counter", "Time spent per recording phase.",
+               [(f'{{phase="{p}"}}', v["total_s"]) for p, v in phases.items()])
+        family("phase_calls_total", "counter", "Timed calls per recording phase.",
+               [(f'{{phase="{p}"}}', float(v["calls"])) for p, v in phases.items()])
+        family("phase_max_seconds", "gauge", "Slowest call per recording phase.",
+               [(f'{{phase="{p}"}}', v["max_us"] / 1e6) for p, v in phases.items()])
+        family("steps_total", "counter", "Recorded steps by kind.",
+               [(f'{{kind="{k}"}}', float(v)) for k, v in sorted(snap["steps"].items())])
+        family("step_errors_total", "counter", "Recorded steps carrying an error, by kind.",
+               [(f'{{kind="{k}"}}', float(v)) for k, v in sorted(snap["errors"].items())])
+        family("step_bytes_total", "counter", "Serialized payload bytes by kind.",
+               [(f'{{kind="{k}"}}', float(v)) for k, v in sorted(snap["bytes"].items())])
+        family("write_errors_total", "counter", "Failed store writes.",
+               [("", float(snap["write_errors"]))])
+        for name, value in sorted(snap["gauges"].items()):
+            family(name, "gauge", f"{name} (sampled).", [("", float(value))])
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Optional[str] = None) -> str:
+        """Atomically write the metrics for a node_exporter textfile collector."""
+        path = path or self.textfile
+        if not path:
+            raise ValueError("No textfile path configured")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+        return path
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve GET /metrics from a daemon thread; call .shutdown() on the result to stop."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name="agentreplay-metrics", daemon=True
+        ).start()
+        return server
+
+
+_SAMPLE_RE = re.compile(r'^(\w+)(?:\{(\w+)="([^"]*)"\})?\s+(\S+)$')
+
+
+def parse_prometheus(text: str) -> List[Tuple[str, Optional[str], Optional[str], float]]:
+    """(metric, label, label_value, value) for each sample line written by to_prometheus()."""
+    out = []
+    for line in text.splitlines():
+        m = _SAMPLE_RE.match(line.strip())
+        if m:
+            name, label, label_value, value = m.groups()
+            out.append((name, label, label_value, float(value)))
+    return out
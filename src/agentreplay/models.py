@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, Literal, List
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Literal, List
 from datetime import datetime
 
+from .canonical import canonical
+from .fingerprint import step_fingerprint
+
 StepKind = Literal["llm", "tool", "span"]
 
 
@@ -27,6 +30,10 @@ class Step:
     input: Dict[str, Any]
     output: Dict[str, Any]
     error: Optional[Dict[str, Any]]
+    # content hash (see fingerprint.step_fingerprint); filled in by stores that keep one
+    fingerprint: Optional[str] = field(default=None, compare=False)
+    # wall time of the call in microseconds, when it was timed; ts is then its start
+    duration_us: Optional[int] = field(default=None, compare=False)
 
 
 @dataclass(frozen=True)
@@ -35,3 +42,170 @@ class ReplayReport:
     ok: bool
     steps_replayed: int
     notes: List[str]
+    new_run_id: Optional[str] = None
+    wall_time_s: float = 0.0
+
+    @property
+    def steps_per_s(self) -> float:
+        return self.steps_replayed / self.wall_time_s if self.wall_time_s > 0 else 0.0
+
+
+def run_to_dict(r: Run) -> Dict[str, Any]:
+    return {
+        "id": r.id,
+        "name": r.name,
+        "started_at": r.started_at.isoformat(),
+        "ended_at": r.ended_at.isoformat() if r.ended_at else None,
+        "meta": r.meta,
+    }
+
+
+def run_from_dict(d: Dict[str, Any]) -> Run:
+    return Run(
+        id=d["id"],
+        name=d["name"],
+        started_at=datetime.fromisoformat(d["started_at"]),
+        ended_at=datetime.fromisoformat(d["ended_at"]) if d.get("ended_at") else None,
+        meta=d.get("meta") or {},
+    )
+
+
+def step_to_dict(s: Step) -> Dict[str, Any]:
+    return {
+        "id": s.id,
+        "run_id": s.run_id,
+        "idx": s.idx,
+        "kind": s.kind,
+        "name": s.name,
+        "ts": s.ts.isoformat(),
+        "input": s.input,
+        "output": s.output,
+        "error": s.error,
+        "duration_us": s.duration_us,
+    }
+
+
+def step_from_dict(d: Dict[str, Any], run_id: Optional[str] = None) -> Step:
+    return Step(
+        id=d["id"],
+        run_id=run_id or d["run_id"],
+        idx=int(d["idx"]),
+        kind=d["kind"],
+        name=d["name"],
+        ts=datetime.fromisoformat(d["ts"]),
+        input=d.get("input") or {},
+        output=d.get("output") or {},
+        error=d.get("error"),
+        duration_us=d.get("duration_us"),
+    )
+
+
+_PAYLOAD_SLOTS = {"input": ("_input", 1), "output": ("_output", 2), "error": ("_error", 4)}
+
+
+class LazyStep:
+    """
+    Compact, read-only Step returned by Store.iter_steps().
+
+    Payloads are kept in their stored (encoded) form and decoded on first access, so
+    walking a long run by kind/name/idx never pays for JSON decoding.
+    """
+
+    __slots__ = (
+        "id", "run_id", "idx", "kind", "name", "ts",
+        "_input", "_output", "_error", "_loaded", "_decode", "_fingerprint", "_to_text",
+        "duration_us",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        run_id: str,
+        idx: int,
+        kind: StepKind,
+        name: str,
+        ts: datetime,
+        raw_input: Any,
+        raw_output: Any,
+        raw_error: Any,
+        decode: Callable[[Any], Any],
+        fingerprint: Optional[str] = None,
+        to_text: Optional[Callable[[Any], str]] = None,
+        duration_us: Optional[int] = None,
+    ) -> None:
+        self.id = id
+        self.run_id = run_id
+        self.idx = idx
+        self.kind = kind
+        self.name = name
+        self.ts = ts
+        self._input = raw_input
+        self._output = raw_output
+        self._error = raw_error
+        self._loaded = 0
+        self._decode = decode
+        self._fingerprint = fingerprint
+        # set when the stored payloads are canonical JSON once turned
+        # into text: canonical() then hands that text out without decoding
+        self._to_text = to_text
+        self.duration_us = duration_us
+
+    def _payload(self, slot: str, bit: int) -> Any:
+        value = getattr(self, slot)
+        if not self._loaded & bit:
+            value = None if value is None else self._decode(value)
+            setattr(self, slot, value)
+            self._loaded |= bit
+        return value
+
+    @property
+    def input(self) -> Dict[str, Any]:
+        return self._payload("_input", 1) or {}
+
+    @property
+    def output(self) -> Dict[str, Any]:
+        return self._payload("_output", 2) or {}
+
+    @property
+    def error(self) -> Optional[Dict[str, Any]]:
+        return self._payload("_error", 4)
+
+    @property
+    def fingerprint(self) -> str:
+        # rows written before fingerprints existed are hashed (and decoded) on demand
+        if self._fingerprint is None:
+            self._fingerprint = step_fingerprint(
+                self.kind, self.name, self.input, self.output, self.error
+            )
+        return self._fingerprint
+
+    def canonical(self, field: str) -> str:
+        """Canonical JSON text of "input", "output" or "error"."""
+        slot, bit = _PAYLOAD_SLOTS[field]
+        if self._to_text is not None and not self._loaded & bit:
+            raw = getattr(self, slot)
+            if raw is None:
+                return "null" if field == "error" else "{}"
+            return self._to_text(raw)
+        return canonical(getattr(self, field))
+
+    def to_step(self) -> Step:
+        return Step(
+            id=self.id,
+            run_id=self.run_id,
+            idx=self.idx,
+            kind=self.kind,
+            name=self.name,
+            ts=self.ts,
+            input=self.input,
+            output=self.output,
+            error=self.error,
+            fingerprint=self.fingerprint,
+            duration_us=self.duration_us,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"LazyStep(run_id={self.run_id!r}, idx={self.idx}, kind={self.kind!r},"
+            f" name={self.name!r})"
+        )
@@ -1,18 +1,57 @@
 from __future__ import annotations
 
+import atexit
+import itertools
+import threading
+import time
+import uuid
+import weakref
 from contextlib import contextmanager
-from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Iterator, Set, Union
 
+from .metrics import Metrics
+from .models import Step
 from .store import Store
-from .redact import redact_dict
+from .redact import Redactor, redact_dict
+from .stream import LLMStream
 
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+# Recorders holding buffered steps; flushed on interpreter shutdown.
+_BUFFERED: "weakref.WeakSet[Recorder]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    for rec in list(_BUFFERED):
+        try:
+            rec.flush()
+            rec.store.flush()
+        except Exception:
+            pass
+
+
+def _timing(duration: Optional[float]) -> Dict[str, Any]:
+    # a call that took `duration` seconds and just returned started that long ago
+    if duration is None:
+        return {}
+    return {"started": _utcnow() - timedelta(seconds=duration), "duration_us": int(duration * 1e6)}
+
+
+@dataclass
+class StepCall:
+    """What Recorder.call() records: set `output` (and optionally `error`) in the block."""
+
+    output: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[Dict[str, Any]] = None
+
+
 @dataclass
 class RunHandle:
     id: str
@@ -20,70 +59,369 @@ class RunHandle:
     meta: Dict[str, Any]
 
 
+@dataclass(eq=False)
+class _RunState:
+    handle: RunHandle
+    counter: Iterator[int] = field(default_factory=itertools.count)
+    pending: List[Step] = field(default_factory=list)
+    last_flush: float = field(default_factory=time.monotonic)
+    span_idx: Optional[int] = None
+
+
 class Recorder:
     """
     Framework-agnostic recorder.
     You call recorder.llm(...) / recorder.tool(...) around your agent execution.
+
+    Run state (current run, step counter, last span) lives in a ContextVar, so one
+    Recorder can record many concurrent runs from threads or asyncio tasks. A run opened
+    inside another run is recorded as a child run (meta.parent_run_id).
+
+    With batch_size > 1 steps are buffered in memory and written with Store.add_steps()
+    once batch_size steps are pending or flush_interval seconds have passed (checked by
+    a background thread, so an idle run is flushed too), and always when the run ends
+    (or the interpreter exits). Steps of a failed write stay buffered for the next
+    attempt, at most max_pending per run; beyond that new steps are dropped (counted in
+    `dropped`). Failures of the background flush are counted in write_errors/last_error.
     """
 
-    def __init__(self, store: Store, project: str = "default", redaction: bool = True):
+    def __init__(
+        self,
+        store: Store,
+        project: str = "default",
+        redaction: Union[bool, Redactor] = True,
+        batch_size: int = 1,
+        flush_interval: float = 1.0,
+        metrics: Union[bool, Metrics, None] = None,
+        max_pending: int = 10_000,
+    ):
         self.store = store
         self.project = project
         self.redaction = redaction
-        self._active_run: Optional[RunHandle] = None
-        self._idx: int = 0
+        # True keeps the classic shallow key redaction; pass e.g. CompiledRedactor() for
+        # recursive key + value redaction
+        self._redact: Optional[Redactor] = (
+            redact_dict if redaction is True else (redaction or None)  # type: ignore[assignment]
+        )
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.write_errors = 0
+        self.last_error: Optional[BaseException] = None
+        self._state: ContextVar[Optional[_RunState]] = ContextVar(
+            f"agentreplay_run_{id(self):x}", default=None
+        )
+        self._runs: Set[_RunState] = set()
+        # guards _RunState.pending between recording threads and the flusher
+        self._pending_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
         self.store.init()
+        self.metrics: Optional[Metrics] = Metrics() if metrics is True else (metrics or None)
+        if self.metrics is not None:
+            self._instrument(self.metrics)
+        if self.batch_size > 1:
+            _BUFFERED.add(self)
+
+    def _instrument(self, m: Metrics) -> None:
+        # Swap in timed versions of the hot-path hooks as instance attributes; without
+        # metrics none of this exists and the plain methods run untouched.
+        if self._redact is not None:
+            self._redact = m.timed("redaction", self._redact)
+        record = self._record
+
+        def counted_record(
+            kind: str, name: str, input: Any, output: Any, error: Any, **timing: Any
+        ) -> None:
+            record(kind, name, input, output, error, **timing)
+            m.count_step(kind, error is not None)
+
+        def guarded(fn: Callable[..., Any]) -> Callable[..., Any]:
+            def wrapper(*args: Any) -> Any:
+                try:
+                    return fn(*args)
+                except Exception:
+                    m.count_write_error()
+                    raise
+
+            return wrapper
+
+        self._record = counted_record  # type: ignore[method-assign]
+        self._add_step = guarded(m.timed("write", self._add_step))  # type: ignore[method-assign]
+        self._add_steps = guarded(m.timed("write", self._add_steps))  # type: ignore[method-assign]
+        self.store.instrument(m)
+        if m.textfile:
+            end_run = self._end_run
+
+            def end_run_and_export(state: _RunState) -> None:
+                try:
+                    end_run(state)
+                finally:
+                    m.write_textfile()
+
+            self._end_run = end_run_and_export  # type: ignore[method-assign]
+
+    def stats(self) -> Dict[str, Any]:
+        """Recording overhead and step counters (see metrics.Metrics); empty without metrics."""
+        return self.metrics.snapshot() if self.metrics is not None else {}
+
+    @property
+    def active_run(self) -> Optional[RunHandle]:
+        state = self._state.get()
+        return state.handle if state is not None else None
 
     @contextmanager
     def run(self, name: str, meta: Optional[Dict[str, Any]] = None) -> Iterator[RunHandle]:
-        if self._active_run is not None:
-            raise RuntimeError("Nested runs not supported in v0.1")
-        meta = meta or {}
-        meta = {"project": self.project, **meta}
-
+        meta = self._run_meta(meta)
         run_id = self.store.create_run(name=name, started_at=_utcnow(), meta=meta)
-        self._active_run = RunHandle(id=run_id, name=name, meta=meta)
-        self._idx = 0
+        with self._activate(RunHandle(id=run_id, name=name, meta=meta)) as handle:
+            yield handle
+
+    def _run_meta(self, meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        meta = {"project": self.project, **(meta or {})}
+        parent = self._state.get()
+        if parent is not None:
+            meta["parent_run_id"] = parent.handle.id
+            if parent.span_idx is not None:
+                meta["parent_span_idx"] = parent.span_idx
+        return meta
+
+    @contextmanager
+    def _activate(self, handle: RunHandle) -> Iterator[RunHandle]:
+        state = _RunState(handle=handle)
+        token = self._state.set(state)
+        self._runs.add(state)
+        try:
+            yield handle
+        finally:
+            try:
+                self._end_run(state)
+            finally:
+                self._runs.discard(state)
+                self._state.reset(token)
+
+    def _end_run(self, state: _RunState) -> None:
         try:
-            yield self._active_run
+            self._flush_run(state)
         finally:
-            self.store.end_run(run_id, ended_at=_utcnow())
-            self._active_run = None
-            self._idx = 0
+            self.store.end_run(state.handle.id, ended_at=_utcnow())
+
+    def flush(self) -> None:
+        """Write buffered steps of the current run (or of every open run outside one)."""
+        state = self._state.get()
+        for st in [state] if state is not None else list(self._runs):
+            self._flush_run(st)
+
+    def _flush_run(self, state: _RunState) -> None:
+        with self._pending_lock:
+            state.last_flush = time.monotonic()
+            if not state.pending:
+                return
+            batch, state.pending = state.pending, []
+        try:
+            self._add_steps(batch)
+        except Exception:
+            with self._pending_lock:
+                state.pending[:0] = batch
+                overflow = len(state.pending) - self.max_pending
+                if overflow > 0:
+                    del state.pending[self.max_pending:]
+                    self.dropped += overflow
+            raise
+
+    def _flush_due(self) -> None:
+        now = time.monotonic()
+        for state in list(self._runs):
+            if state.pending and now - state.last_flush >= self.flush_interval:
+                try:
+                    self._flush_run(state)
+                except Exception as e:  # kept pending; the next write or run end retries it
+                    self.write_errors += 1
+                    self.last_error = e
 
-    def _ensure_run(self) -> RunHandle:
-        if self._active_run is None:
+    def _start_flusher(self) -> None:
+        ref = weakref.ref(self)
+        interval = self.flush_interval
+
+        def loop() -> None:
+            # holds the recorder only while flushing, so it can still be collected
+            while True:
+                time.sleep(interval / 2)
+                rec = ref()
+                if rec is None:
+                    return
+                rec._flush_due()
+                del rec
+
+        self._flusher = threading.Thread(target=loop, name="agentreplay-flusher", daemon=True)
+        self._flusher.start()
+
+    def _ensure_run(self) -> _RunState:
+        state = self._state.get()
+        if state is None:
             raise RuntimeError("No active run. Use `with recorder.run(...):`")
-        return self._active_run
+        return state
 
-    def span(self, name: str, input: Optional[Dict[str, Any]] = None, output: Optional[Dict[str, Any]] = None):
+    def span(
+        self,
+        name: str,
+        input: Optional[Dict[str, Any]] = None,
+        output: Optional[Dict[str, Any]] = None,
+    ):
         self._record(kind="span", name=name, input=input or {}, output=output or {}, error=None)
 
-    def llm(self, name: str, input: Dict[str, Any], output: Dict[str, Any], error: Optional[Dict[str, Any]] = None):
-        self._record(kind="llm", name=name, input=input, output=output, error=error)
+    def llm(
+        self,
+        name: str,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]] = None,
+        duration: Optional[float] = None,
+    ):
+        """Record an llm call; `duration` (seconds) if the caller timed it, or use call()."""
+        self._record("llm", name, input, output, error, **_timing(duration))
 
-    def tool(self, name: str, input: Dict[str, Any], output: Dict[str, Any], error: Optional[Dict[str, Any]] = None):
-        self._record(kind="tool", name=name, input=input, output=output, error=error)
+    def tool(
+        self,
+        name: str,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]] = None,
+        duration: Optional[float] = None,
+    ):
+        self._record("tool", name, input, output, error, **_timing(duration))
 
-    def _record(self, kind: str, name: str, input: Dict[str, Any], output: Dict[str, Any], error: Optional[Dict[str, Any]]):
-        run = self._ensure_run()
+    @contextmanager
+    def call(self, kind: str, name: str, input: Dict[str, Any]) -> Iterator[StepCall]:
+        """
+        Time a tool or llm call and record it with its start time and duration:
 
-        if self.redaction:
-            input = redact_dict(input)
-            output = redact_dict(output)
+            with recorder.call("tool", "search", {"q": q}) as c:
+                c.output = search(q)
+
+        If the block raises, the call is recorded with the error.
+        """
+        if kind not in ("tool", "llm"):
+            raise ValueError(f"call() records tool or llm steps, not {kind!r}")
+        c = StepCall()
+        started = _utcnow()
+        t0 = time.perf_counter_ns()
+        try:
+            yield c
+        except BaseException as e:
+            c.error = {"type": type(e).__name__, "msg": str(e)}
+            raise
+        finally:
+            duration_us = (time.perf_counter_ns() - t0) // 1000
+            self._record(
+                kind, name, input, c.output, c.error, started=started, duration_us=duration_us
+            )
+
+    @contextmanager
+    def llm_stream(
+        self, name: str, input: Dict[str, Any], max_chunks: int = 4096
+    ) -> Iterator[LLMStream]:
+        """
+        Record a streamed LLM call as one llm step (see stream.LLMStream):
+
+            with recorder.llm_stream("chat", input=req) as s:
+                for token in s.wrap(client.stream(req)):
+                    ...
+
+        If the block raises, the partial text is recorded with the error.
+        """
+        stream = LLMStream(max_chunks=max_chunks)
+        started = _utcnow()
+        error: Optional[Dict[str, Any]] = None
+        try:
+            yield stream
+        except BaseException as e:
+            error = {"type": type(e).__name__, "msg": str(e)}
+            raise
+        finally:
+            self._record(
+                kind="llm",
+                name=name,
+                input=input,
+                output=stream.to_output(),
+                error=error,
+                started=started,
+                duration_us=stream.elapsed_us(),
+            )
+
+    def _record(
+        self,
+        kind: str,
+        name: str,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]],
+        started: Optional[datetime] = None,
+        duration_us: Optional[int] = None,
+    ):
+        state = self._ensure_run()
+
+        redact = self._redact
+        if redact is not None:
+            input = redact(input)
+            output = redact(output)
             if error is not None:
-                error = redact_dict(error)
+                error = redact(error)
+
+        idx = next(state.counter)
+        if kind == "span":
+            state.span_idx = idx
+
+        self._write(
+            Step(
+                id=str(uuid.uuid4()),
+                run_id=state.handle.id,
+                idx=idx,
+                kind=kind,  # type: ignore[arg-type]
+                name=name,
+                ts=started or _utcnow(),
+                input=input or {},
+                output=output or {},
+                error=error,
+                duration_us=duration_us,
+            ),
+            state,
+        )
 
-        idx = self._idx
-        self._idx += 1
+    def _write(self, step: Step, state: _RunState) -> None:
+        if self.batch_size == 1:
+            self._add_step(step)
+            return
 
+        with self._pending_lock:
+            if self._flusher is None and self.flush_interval > 0:
+                self._start_flusher()
+            if len(state.pending) >= self.max_pending:
+                # the store has been failing for a while: do not buffer without bound
+                self.dropped += 1
+                return
+            state.pending.append(step)
+            due = (
+                len(state.pending) >= self.batch_size
+                or time.monotonic() - state.last_flush >= self.flush_interval
+            )
+        if due:
+            self._flush_run(state)
+
+    # the only places steps reach the store (wrapped by _instrument())
+
+    def _add_step(self, step: Step) -> None:
         self.store.add_step(
-            run_id=run.id,
-            idx=idx,
-            kind=kind,
-            name=name,
-            ts=_utcnow(),
-            input=input,
-            output=output,
-            error=error,
+            run_id=step.run_id,
+            idx=step.idx,
+            kind=step.kind,
+            name=step.name,
+            ts=step.ts,
+            input=step.input,
+            output=step.output,
+            error=step.error,
+            duration_us=step.duration_us,
         )
+
+    def _add_steps(self, steps: List[Step]) -> None:
+        self.store.add_steps(steps)
@@ -1,18 +1,30 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Callable
+from typing import Any, Dict, Callable, Iterable, Optional, Sequence, Tuple
 import re
 
 
-DEFAULT_SECRET_KEYS = {"api_key", "apikey", "token", "secret", "password", "authorization"}
+DEFAULT_SECRET_KEYS = frozenset(
+    {"api_key", "apikey", "token", "secret", "password", "authorization"}
+)
+
+REDACTED = "***REDACTED***"
+
+_BEARER_RE = re.compile(r"Bearer\s+[A-Za-z0-9\-\._~\+\/]+=*")
+
+# (pattern, replacement) pairs applied to every string value by CompiledRedactor
+DEFAULT_VALUE_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    (_BEARER_RE.pattern, "Bearer " + REDACTED),
+    (r"sk-[A-Za-z0-9_\-]{20,}", REDACTED),
+)
 
 
 def redact_dict(d: Dict[str, Any], extra_keys: set[str] | None = None) -> Dict[str, Any]:
-    keys = DEFAULT_SECRET_KEYS | (extra_keys or set())
+    keys = DEFAULT_SECRET_KEYS | extra_keys if extra_keys else DEFAULT_SECRET_KEYS
     out: Dict[str, Any] = {}
     for k, v in (d or {}).items():
         if k.lower() in keys:
-            out[k] = "***REDACTED***"
+            out[k] = REDACTED
         else:
             out[k] = v
     return out
@@ -20,8 +32,83 @@ def redact_dict(d: Dict[str, Any], extra_keys: set[str] | None = None) -> Dict[s
 
 def redact_text(s: str) -> str:
     # minimal: redact bearer tokens
-    s = re.sub(r"Bearer\s+[A-Za-z0-9\-\._~\+\/]+=*", "Bearer ***REDACTED***", s)
+    s = _BEARER_RE.sub("Bearer " + REDACTED, s)
     return s
 
 
 Redactor = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class CompiledRedactor:
+    """
+    Recursive, single-pass redactor, built once and reused for every step.
+
+    Secret keys are matched case-insensitively at any depth, and string values anywhere
+    in the payload are scrubbed with the value patterns (bearer tokens, sk- keys by
+    default). Only containers on the path to a change are copied; untouched sub-trees
+    are shared with the input, and a payload with nothing to redact is returned as-is.
+
+        rec = Recorder(store, redaction=CompiledRedactor(extra_keys={"session_id"}))
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[str] = DEFAULT_SECRET_KEYS,
+        extra_keys: Optional[Iterable[str]] = None,
+        patterns: Sequence[Tuple[str, str]] = DEFAULT_VALUE_PATTERNS,
+        replacement: str = REDACTED,
+    ) -> None:
+        self.keys = frozenset(k.lower() for k in (*keys, *(extra_keys or ())))
+        self.replacement = replacement
+        # kept as separate regexes: each has a literal prefix that re can scan for quickly,
+        # which a combined alternation would lose
+        self._patterns = [(re.compile(p), repl) for p, repl in patterns]
+
+    def __call__(self, d: Dict[str, Any]) -> Dict[str, Any]:
+        if not d:
+            return d or {}
+        return self._walk(d)
+
+    def _scrub(self, s: str) -> str:
+        for rx, repl in self._patterns:
+            if rx.search(s) is not None:
+                s = rx.sub(repl, s)
+        return s
+
+    def _walk(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            keys = self.keys
+            out = None
+            for k, v in obj.items():
+                t = type(v)
+                if isinstance(k, str) and k.lower() in keys:
+                    new = self.replacement
+                elif t is str:
+                    new = self._scrub(v)
+                elif t is dict or t is list or isinstance(v, (dict, list)):
+                    new = self._walk(v)
+                else:
+                    continue
+                if new is not v:
+                    if out is None:
+                        out = dict(obj)
+                    out[k] = new
+            return obj if out is None else out
+        if isinstance(obj, list):
+            items = None
+            for i, v in enumerate(obj):
+                t = type(v)
+                if t is str:
+                    new = self._scrub(v)
+                elif t is dict or t is list or isinstance(v, (dict, list)):
+                    new = self._walk(v)
+                else:
+                    continue
+                if new is not v:
+                    if items is None:
+                        items = list(obj)
+                    items[i] = new
+            return obj if items is None else items
+        if isinstance(obj, str):
+            return self._scrub(obj)
+        return obj
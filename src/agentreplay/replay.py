@@ -1,67 +1,327 @@
 from __future__ import annotations
 
-import json
-from typing import Dict, Any, List
+import hashlib
+import importlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Any, Callable, Deque, Dict, Iterator, List, Literal, Optional, Sequence, Set, Tuple, Union,
+)
 
+from .canonical import canonical, payload_canonical
 from .store import Store
-from .models import ReplayReport, Step
+from .models import ReplayReport, Run, Step
+from .recorder import Recorder
+from .stream import replay_stream
 
 
-def _stable(obj: Any) -> str:
-    return json.dumps(obj, sort_keys=True, ensure_ascii=False)
+MatchMode = Literal["sequential", "indexed"]
+
+
+def _input_hash(text: str) -> str:
+    """Hash of a tool input's canonical JSON text (see canonical.canonical())."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class ToolMocker:
-    def __init__(self, tool_steps: List[Step], strict: bool = False):
+    """
+    Serves recorded tool outputs during replay.
+
+    mode="sequential": calls must arrive in recorded order (strict also compares inputs).
+    mode="indexed":    recorded calls are indexed by (tool name, canonical input hash) into
+                       FIFO queues, so concurrent / reordered calls match in O(1). Without
+                       strict, a call with no exact match takes the oldest unused recorded
+                       call of the same tool.
+    """
+
+    def __init__(
+        self,
+        tool_steps: List[Step],
+        strict: bool = False,
+        mode: MatchMode = "sequential",
+        label: str = "tool",
+    ):
+        if mode not in ("sequential", "indexed"):
+            raise ValueError(f"Unknown match mode: {mode}")
         self.strict = strict
+        self.label = label
+        self.mode = mode
         self._tool_steps = tool_steps
         self._cursor = 0
+        self._lock = threading.Lock()
+        self._used: Set[int] = set()
+        self.unmatched: List[Tuple[str, Dict[str, Any]]] = []
+        self._by_key: Dict[Tuple[str, str], Deque[int]] = {}
+        self._by_name: Dict[str, Deque[int]] = {}
+        if mode == "indexed":
+            for i, step in enumerate(tool_steps):
+                key = (step.name, _input_hash(payload_canonical(step, "input")))
+                self._by_key.setdefault(key, deque()).append(i)
+                self._by_name.setdefault(step.name, deque()).append(i)
 
     def next_output(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
-        if self._cursor >= len(self._tool_steps):
-            raise RuntimeError("Replay tool calls exceeded recorded tool calls")
+        return self.next_step(tool_name, tool_input).output
+
+    def next_step(self, tool_name: str, tool_input: Dict[str, Any]) -> Step:
+        if self.mode == "indexed":
+            return self._indexed_step(tool_name, tool_input)
+
+        # an agent may call tools from several threads: claim the cursor atomically
+        with self._lock:
+            if self._cursor >= len(self._tool_steps):
+                raise RuntimeError(
+                    f"Replay {self.label} calls exceeded recorded {self.label} calls"
+                )
+            pos = self._cursor
+            step = self._tool_steps[pos]
+            self._cursor += 1
+
+            if step.name != tool_name:
+                raise RuntimeError(
+                    f"{self.label.capitalize()} name mismatch at {self.label}-step #{pos}: "
+                    f"recorded={step.name} current={tool_name}"
+                )
+
+            if self.strict:
+                recorded, current = payload_canonical(step, "input"), canonical(tool_input)
+                if recorded != current:
+                    raise RuntimeError(
+                        f"{self.label.capitalize()} input mismatch at {self.label}-step #{pos} "
+                        f"for {tool_name}\n"
+                        f"recorded={recorded}\ncurrent ={current}"
+                    )
 
-        step = self._tool_steps[self._cursor]
-        self._cursor += 1
+            self._used.add(pos)
+        return step
 
-        if step.name != tool_name:
-            raise RuntimeError(
-                f"Tool name mismatch at tool-step #{self._cursor-1}: recorded={step.name} current={tool_name}"
-            )
+    @staticmethod
+    def _pop_unused(q: Optional[Deque[int]], used: Set[int]) -> Optional[int]:
+        while q:
+            i = q.popleft()
+            if i not in used:
+                return i
+        return None
 
-        if self.strict:
-            if _stable(step.input) != _stable(tool_input):
+    def _indexed_step(self, tool_name: str, tool_input: Dict[str, Any]) -> Step:
+        text = canonical(tool_input)
+        key = (tool_name, _input_hash(text))
+        with self._lock:
+            i = self._pop_unused(self._by_key.get(key), self._used)
+            if i is None and not self.strict:
+                i = self._pop_unused(self._by_name.get(tool_name), self._used)
+            if i is None:
+                self.unmatched.append((tool_name, tool_input))
                 raise RuntimeError(
-                    f"Tool input mismatch at tool-step #{self._cursor-1} for {tool_name}\n"
-                    f"recorded={_stable(step.input)}\ncurrent ={_stable(tool_input)}"
+                    f"No recorded call left for {tool_name} with input {text[:200]}"
                 )
+            self._used.add(i)
+        return self._tool_steps[i]
+
+    def unused(self) -> List[Step]:
+        """Recorded tool calls that were never served."""
+        with self._lock:
+            return [s for i, s in enumerate(self._tool_steps) if i not in self._used]
+
+    def report(self) -> List[str]:
+        served = f"{len(self._used)}/{len(self._tool_steps)}"
+        notes = [f"{self.label.capitalize()} calls served: {served}"]
+        notes += [f"Unused recorded call: {s.name} (idx={s.idx})" for s in self.unused()]
+        notes += [f"Unmatched call: {name} {canonical(inp)[:200]}" for name, inp in self.unmatched]
+        return notes
+
+
+class ReplayedError(RuntimeError):
+    """Raised into the agent when the recorded call it replays had failed."""
+
+    def __init__(self, name: str, error: Dict[str, Any]):
+        super().__init__(f"{name}: {error.get('type', 'error')}: {error.get('msg', '')}")
+        self.error = error
+
+
+class ReplaySession:
+    """
+    Passed to the agent callable by Replayer.run(). The agent calls session.tool()/llm()
+    instead of the real tool/model; the recorded response is returned (or its recorded
+    error raised as ReplayedError) and the call is recorded into the new run.
+    """
+
+    def __init__(self, source: Run, recorder: Recorder, tools: ToolMocker, llms: ToolMocker):
+        self.source = source
+        self.recorder = recorder
+        self.tools = tools
+        self.llms = llms
 
+    def _serve(
+        self, mocker: ToolMocker, kind: str, name: str, input: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        step = mocker.next_step(name, input)
+        self.recorder._record(
+            kind=kind, name=name, input=input, output=step.output, error=step.error
+        )
+        if step.error is not None:
+            raise ReplayedError(name, step.error)
         return step.output
 
+    def tool(self, name: str, input: Dict[str, Any]) -> Dict[str, Any]:
+        return self._serve(self.tools, "tool", name, input)
+
+    def llm(self, name: str, input: Dict[str, Any]) -> Dict[str, Any]:
+        return self._serve(self.llms, "llm", name, input)
+
+    def llm_stream(
+        self, name: str, input: Dict[str, Any], speed: Optional[float] = None
+    ) -> Iterator[str]:
+        """
+        Replay a call recorded with Recorder.llm_stream() as an iterator of its chunks,
+        paced like the original when speed is given (1.0 = real time, 2.0 = twice as
+        fast). A recorded error is raised after the chunks streamed before it.
+        """
+        step = self.llms.next_step(name, input)
+        self.recorder._record(
+            kind="llm", name=name, input=input, output=step.output, error=step.error
+        )
+
+        def emit() -> Iterator[str]:
+            yield from replay_stream(step.output, speed=speed)
+            if step.error is not None:
+                raise ReplayedError(name, step.error)
+
+        return emit()
+
+    def span(
+        self,
+        name: str,
+        input: Optional[Dict[str, Any]] = None,
+        output: Optional[Dict[str, Any]] = None,
+    ):
+        self.recorder.span(name, input=input, output=output)
+
+
+Agent = Callable[[ReplaySession], Any]
+
+
+def _load_agent(agent: Union[str, Agent]) -> Agent:
+    """Resolve "package.module:function" references (needed across process boundaries)."""
+    if not isinstance(agent, str):
+        return agent
+    module, _, attr = agent.partition(":")
+    if not attr:
+        raise ValueError(f"Agent reference must look like 'module:function', got {agent!r}")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _replay_worker(
+    store: Store, run_id: str, agent: Union[str, Agent], strict: bool, mode: MatchMode
+) -> ReplayReport:
+    return Replayer(store).run(run_id, agent, strict=strict, mode=mode)
+
 
 class Replayer:
     def __init__(self, store: Store):
         self.store = store
 
-    def build_tool_mocker(self, run_id: str, strict: bool = False) -> ToolMocker:
-        steps = self.store.list_steps(run_id)
-        tool_steps = [s for s in steps if s.kind == "tool"]
-        return ToolMocker(tool_steps, strict=strict)
+    def build_tool_mocker(
+        self, run_id: str, strict: bool = False, mode: MatchMode = "sequential"
+    ) -> ToolMocker:
+        tool_steps = list(self.store.iter_steps(run_id, kinds=("tool",)))
+        return ToolMocker(tool_steps, strict=strict, mode=mode)
 
-    def replay(self, run_id: str, strict: bool = False) -> ReplayReport:
-        steps = self.store.list_steps(run_id)
+    def replay(
+        self, run_id: str, strict: bool = False, mode: MatchMode = "sequential"
+    ) -> ReplayReport:
         notes: List[str] = []
         ok = True
 
-        # integrity check
+        # integrity check (payloads are never decoded here)
         last_idx = -1
-        for s in steps:
+        count = 0
+        for s in self.store.iter_steps(run_id):
+            count += 1
             if s.idx != last_idx + 1:
                 ok = False
                 notes.append(f"Non-contiguous step idx at {s.idx} (prev={last_idx})")
             last_idx = s.idx
 
-        _ = self.build_tool_mocker(run_id, strict=strict)
-        notes.append(f"Tool mocker prepared (strict={strict}).")
+        # dry run: serve every recorded tool call back through the mocker, as a faithful
+        # agent would, so a trace that cannot be replayed (e.g. inputs that no longer
+        # canonicalize to what was stored) is reported here
+        tool_steps = list(self.store.iter_steps(run_id, kinds=("tool",)))
+        mocker = ToolMocker(tool_steps, strict=strict, mode=mode)
+        for s in tool_steps:
+            try:
+                mocker.next_step(s.name, s.input)
+            except RuntimeError as e:
+                ok = False
+                notes.append(f"Tool call idx={s.idx} cannot be replayed: {e}")
+        if mocker.unused():
+            ok = False
+        notes += mocker.report()
+
+        return ReplayReport(run_id=run_id, ok=ok, steps_replayed=count, notes=notes)
+
+    def run(
+        self,
+        run_id: str,
+        agent: Union[str, Agent],
+        strict: bool = False,
+        mode: MatchMode = "sequential",
+        recorder: Optional[Recorder] = None,
+    ) -> ReplayReport:
+        """
+        Re-execute `agent` against the recorded run: tool and LLM calls are answered from
+        the trace, and the new execution is recorded as a fresh run (meta.replay_of).
+        """
+        agent_fn = _load_agent(agent)
+        source = self.store.get_run(run_id)
+        tools = self.build_tool_mocker(run_id, strict=strict, mode=mode)
+        llm_steps = list(self.store.iter_steps(run_id, kinds=("llm",)))
+        llms = ToolMocker(llm_steps, strict=strict, mode=mode, label="llm")
+        rec = recorder or Recorder(self.store, project=source.meta.get("project", "default"))
+
+        notes: List[str] = []
+        ok = True
+        t0 = time.perf_counter()
+        with rec.run(f"replay:{source.name}", meta={"replay_of": run_id}) as handle:
+            session = ReplaySession(source, rec, tools, llms)
+            try:
+                agent_fn(session)
+            except Exception as e:
+                ok = False
+                notes.append(f"Agent raised {type(e).__name__}: {e}")
+        wall = time.perf_counter() - t0
+
+        unused = tools.unused() + llms.unused()
+        if unused or tools.unmatched or llms.unmatched:
+            ok = False
+        notes += tools.report() + llms.report()
+        steps = sum(1 for _ in self.store.iter_steps(handle.id))
+        return ReplayReport(
+            run_id=run_id,
+            ok=ok,
+            steps_replayed=steps,
+            notes=notes,
+            new_run_id=handle.id,
+            wall_time_s=wall,
+        )
 
-        return ReplayReport(run_id=run_id, ok=ok, steps_replayed=len(steps), notes=notes)
+    def run_many(
+        self,
+        run_ids: Sequence[str],
+        agent: Union[str, Agent],
+        jobs: int = 1,
+        strict: bool = False,
+        mode: MatchMode = "sequential",
+    ) -> List[ReplayReport]:
+        """
+        Replay several runs, across a process pool when jobs > 1. The store and the agent
+        must be picklable then (SQLiteStore is; pass the agent as "module:function").
+        """
+        if jobs <= 1:
+            return [self.run(r, agent, strict=strict, mode=mode) for r in run_ids]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(_replay_worker, self.store, r, agent, strict, mode) for r in run_ids
+            ]
+            return [f.result() for f in futures]
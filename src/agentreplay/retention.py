@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Sequence, Set
+
+from .exporter import export_areplay
+from .models import Run
+from .store import Store
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Which runs to keep for one project (project=None applies to every run).
+    A run expires when it is older than max_age, or falls outside the newest max_runs
+    runs, or outside the newest runs fitting in max_bytes of stored payload.
+    """
+
+    project: Optional[str] = None
+    max_age: Optional[timedelta] = None
+    max_runs: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+
+@dataclass
+class GCReport:
+    deleted: List[str] = field(default_factory=list)
+    archived: List[str] = field(default_factory=list)
+    freed_pages: int = 0
+    dry_run: bool = False
+
+
+def _utc(now: Optional[datetime]) -> datetime:
+    if now is None:
+        return datetime.now(timezone.utc)
+    # a naive value (e.g. datetime.now()) is local time, as datetime itself assumes
+    return now.astimezone(timezone.utc)
+
+
+def expired_runs(
+    store: Store, policy: RetentionPolicy, now: Optional[datetime] = None, page_size: int = 500
+) -> Iterator[Run]:
+    """Runs `policy` would remove, newest first. Unfinished runs are only expired by max_age."""
+    now = _utc(now)
+    cutoff = now - policy.max_age if policy.max_age is not None else None
+    kept = 0
+    kept_bytes = 0
+    for run in store.iter_runs(page_size=page_size, project=policy.project):
+        if cutoff is not None and run.started_at < cutoff:
+            yield run
+            continue
+        if run.ended_at is None:
+            continue
+        if policy.max_runs is not None and kept >= policy.max_runs:
+            yield run
+            continue
+        if policy.max_bytes is not None:
+            size = store.run_bytes(run.id)
+            if kept_bytes + size > policy.max_bytes:
+                yield run
+                continue
+            kept_bytes += size
+        kept += 1
+
+
+def collect_garbage(
+    store: Store,
+    policies: Sequence[RetentionPolicy],
+    archive_dir: Optional[str] = None,
+    dry_run: bool = False,
+    compact_every: int = 100,
+    now: Optional[datetime] = None,
+    page_size: int = 500,
+) -> GCReport:
+    """
+    Apply retention policies: optionally archive each expired run to
+    <archive_dir>/<run_id>.areplay, then delete it. Every run is its own short write
+    transaction and space is reclaimed incrementally (Store.compact) every
+    `compact_every` deletions, so live recorders are never blocked for long.
+
+    Runs are listed a page at a time and deleted as they are found; list_runs pages
+    by keyset cursor, so deleting runs already seen does not shift later pages.
+    """
+    report = GCReport(dry_run=dry_run)
+    seen: Set[str] = set()
+    now = _utc(now)
+    if archive_dir and not dry_run:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    expired = (r for p in policies for r in expired_runs(store, p, now=now, page_size=page_size))
+    for run in expired:
+        if run.id in seen:
+            continue
+        seen.add(run.id)
+        if dry_run:
+            report.deleted.append(run.id)
+            continue
+        if archive_dir:
+            report.archived.append(
+                export_areplay(store, run.id, os.path.join(archive_dir, f"{run.id}.areplay"))
+            )
+        store.delete_run(run.id)
+        report.deleted.append(run.id)
+        if len(report.deleted) % compact_every == 0:
+            report.freed_pages += store.compact()
+
+    if report.deleted and not dry_run:
+        report.freed_pages += store.compact()
+    return report
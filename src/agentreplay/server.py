@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import itertools
+import os
+import queue
+import socket
+import socketserver
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .models import Step, run_to_dict
+from .store import Store
+from .store_remote import (
+    DEFAULT_ADDRESS,
+    READ_OPS,
+    WRITE_OPS,
+    encode_frame,
+    parse_address,
+    read_frame,
+    step_from_wire,
+    step_to_wire,
+)
+
+_STOP = object()
+
+
+def _dt(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def decode_args(op: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Wire arguments of a request -> keyword arguments for execute()."""
+    if op not in WRITE_OPS and op not in READ_OPS:
+        raise ValueError(f"Unknown request: {op}")
+    args = dict(args)
+    if op == "add_steps":
+        args["steps"] = [step_from_wire(w) for w in args["steps"]]
+    for key in ("started_at", "ended_at", "since", "until"):
+        if key in args:
+            args[key] = _dt(args[key])
+    return args
+
+
+def execute(store: Store, op: str, args: Dict[str, Any]) -> Any:
+    """Run one decoded request against `store` and return its JSON-able result."""
+    if op == "ping":
+        return "pong"
+    if op == "add_steps":
+        store.add_steps(args["steps"])  # ids are known to the client
+        return None
+    if op == "get_run":
+        return run_to_dict(store.get_run(args["run_id"]))
+    if op == "list_runs":
+        return [run_to_dict(r) for r in store.list_runs(**args)]
+    if op == "iter_steps":
+        steps = store.iter_steps(args["run_id"], kinds=args["kinds"], start_idx=args["start_idx"])
+        return [step_to_wire(s) for s in itertools.islice(steps, args["limit"])]
+    if op == "iter_fingerprints":
+        return list(store.iter_fingerprints(args["run_id"]))
+    if op == "stats":
+        return store.stats()
+    return getattr(store, op)(**args)
+
+
+class _Connection:
+    """Per-client state: replies are queued and sent by a dedicated thread, so a slow
+    client never stalls the writer."""
+
+    def __init__(self, wfile: Any) -> None:
+        self.wfile = wfile
+        self.outbox: "queue.Queue[Any]" = queue.Queue()
+        self.idle = threading.Condition()
+        self.pending = 0
+        self.sender = threading.Thread(
+            target=self._send_loop, name="agentreplay-reply", daemon=True
+        )
+        self.sender.start()
+
+    def reply(self, rid: int, ok: bool, value: Any) -> None:
+        self.outbox.put((rid, ok, value))
+
+    def done(self) -> None:
+        with self.idle:
+            self.pending -= 1
+            if not self.pending:
+                self.idle.notify_all()
+
+    def wait_idle(self) -> None:
+        with self.idle:
+            while self.pending:
+                self.idle.wait()
+
+    def _send_loop(self) -> None:
+        while True:
+            items = [self.outbox.get()]
+            while True:  # everything already queued goes out in one write
+                try:
+                    items.append(self.outbox.get_nowait())
+                except queue.Empty:
+                    break
+            stop = items[-1] is _STOP
+            try:
+                self.wfile.write(b"".join(encode_frame(list(i)) for i in items if i is not _STOP))
+            except OSError:
+                return  # client went away; the handler notices on its next read
+            if stop:
+                return
+
+
+def _error(e: BaseException) -> List[str]:
+    return [type(e).__name__, str(e.args[0]) if e.args else str(e)]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Listener"
+
+    def handle(self) -> None:
+        ingest = self.server.ingest
+        conn = _Connection(self.wfile)
+        try:
+            while True:
+                msg = read_frame(self.rfile)
+                if msg is None:
+                    return
+                rid, op, args = msg
+                try:
+                    decoded = decode_args(op, args)
+                except Exception as e:
+                    conn.reply(rid, False, _error(e))
+                    continue
+                if op in WRITE_OPS:
+                    with conn.idle:
+                        conn.pending += 1
+                    ingest._queue.put((conn, rid, op, decoded))
+                    continue
+                # reads see every write this client sent before them
+                conn.wait_idle()
+                try:
+                    conn.reply(rid, True, execute(ingest.store, op, decoded))
+                except Exception as e:
+                    conn.reply(rid, False, _error(e))
+        except (OSError, ValueError):
+            return
+        finally:
+            conn.wait_idle()
+            conn.outbox.put(_STOP)
+            conn.sender.join()
+
+
+class _Listener(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # the default backlog of 5 turns a fleet of workers starting at once into spooling
+    request_queue_size = 128
+    ingest: "IngestServer"
+
+    def __init__(self, family: int, addr: Any) -> None:
+        self.address_family = family
+        super().__init__(addr, _Handler)
+
+
+class IngestServer:
+    """
+    The `agentreplay serve` daemon: the single writer to a Store, for many recording
+    processes that connect with RemoteStore over a Unix socket or localhost TCP.
+
+    Each connection is handled on its own thread, but every write (create_run,
+    add_steps, end_run, ...) goes through one queue drained by one writer thread.
+    Consecutive add_steps requests, from any number of clients, are coalesced into a
+    single Store.add_steps() transaction of up to `batch_size` requests; if that
+    fails, the requests are retried one by one so only the bad one is rejected.
+    Reads run on the connection's thread once that client's earlier writes are
+    applied. Replies travel back over the connection they came in on.
+
+    Step writes are idempotent: steps whose (run_id, idx) is already stored are
+    skipped, so batches a client re-sends after a lost connection (or replays from
+    its spool) are not written twice, even on stores without transactions.
+    """
+
+    def __init__(
+        self, store: Store, address: str = DEFAULT_ADDRESS, batch_size: int = 1024
+    ) -> None:
+        self.store = store
+        self.batch_size = batch_size
+        self.batches = 0
+        self.steps_written = 0
+        self.write_errors = 0
+        self.duplicates_skipped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.remove(addr)  # stale socket from a previous daemon
+        self._server = _Listener(family, addr)
+        self._server.ingest = self
+        self._unix_path = addr if family == socket.AF_UNIX else None
+        self._writer = threading.Thread(
+            target=self._write_loop, name="agentreplay-ingest", daemon=True
+        )
+        self._writer.start()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        if self._unix_path is not None:
+            return f"unix:{self._unix_path}"
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "IngestServer":
+        """Serve from a background thread (tests, embedding); returns self."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="agentreplay-serve", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop accepting requests, apply every queued write, then close the store."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+        self._queue.put(_STOP)
+        self._writer.join()
+        if self._unix_path is not None and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+        self.store.close()
+
+    # -- writer thread --
+
+    def _write_loop(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            group: List[Tuple[Any, ...]] = []
+            for item in items:
+                if item is _STOP:
+                    self._apply_steps(group)
+                    return
+                if item[2] == "add_steps":
+                    group.append(item)
+                    continue
+                self._apply_steps(group)
+                group = []
+                self._apply(item)
+            self._apply_steps(group)
+
+    def _fresh(self, steps: List[Step]) -> List[Step]:
+        # one indexed range read per run: a batch appended past the run's end (the
+        # usual case) finds nothing there
+        ranges: Dict[str, List[int]] = {}
+        for s in steps:
+            lo_hi = ranges.setdefault(s.run_id, [s.idx, s.idx])
+            lo_hi[0] = min(lo_hi[0], s.idx)
+            lo_hi[1] = max(lo_hi[1], s.idx)
+        taken: Set[Tuple[str, int]] = set()
+        for run_id, (lo, hi) in ranges.items():
+            stored = self.store.iter_steps(run_id, start_idx=lo)
+            in_range = itertools.takewhile(lambda s: s.idx <= hi, stored)
+            taken.update((run_id, s.idx) for s in in_range)
+        fresh = []
+        for s in steps:
+            key = (s.run_id, s.idx)
+            if key in taken:
+                self.duplicates_skipped += 1
+                continue
+            taken.add(key)
+            fresh.append(s)
+        return fresh
+
+    def _apply(self, item: Tuple[Any, ...]) -> None:
+        conn, rid, op, args = item
+        try:
+            if op == "add_steps":
+                args = {**args, "steps": self._fresh(args["steps"])}
+            result = execute(self.store, op, args)
+        except Exception as e:
+            self.write_errors += 1
+            conn.reply(rid, False, _error(e))
+        else:
+            if op == "add_steps":
+                self.batches += 1
+                self.steps_written += len(args["steps"])
+            conn.reply(rid, True, result)
+        conn.done()
+
+    def _apply_steps(self, group: List[Tuple[Any, ...]]) -> None:
+        if len(group) < 2:
+            for item in group:
+                self._apply(item)
+            return
+        try:
+            steps = self._fresh([s for item in group for s in item[3]["steps"]])
+            self.store.add_steps(steps)
+        except Exception:
+            for item in group:
+                self._apply(item)
+            return
+        self.batches += 1
+        self.steps_written += len(steps)
+        for conn, rid, _, _ in group:
+            conn.reply(rid, True, None)
+            conn.done()
@@ -1,17 +1,120 @@
 from __future__ import annotations
 
+import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+from .fingerprint import step_fingerprint
 from .models import Run, Step
 
+if TYPE_CHECKING:
+    from .metrics import Metrics
+    from .retention import GCReport, RetentionPolicy
+
+
+def _utc_iso(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def run_cursor(run: Run) -> str:
+    """Opaque keyset-pagination cursor pointing just after `run` in list_runs() order."""
+    return f"{_utc_iso(run.started_at)}|{run.id}"
+
+
+def parse_run_cursor(cursor: str) -> Tuple[str, str]:
+    started_at, sep, run_id = cursor.rpartition("|")
+    if not sep:
+        raise ValueError(f"Invalid run cursor: {cursor!r}")
+    return started_at, run_id
+
+
+def run_matches(
+    run: Run,
+    project: Optional[str] = None,
+    name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> bool:
+    """In-memory version of the list_runs() filters (except has_error), for simple backends."""
+    if project is not None and run.meta.get("project") != project:
+        return False
+    if name is not None and run.name != name:
+        return False
+    started = _utc_iso(run.started_at)
+    if since is not None and started < _utc_iso(since):
+        return False
+    if until is not None and started >= _utc_iso(until):
+        return False
+    if cursor is not None and (started, run.id) >= parse_run_cursor(cursor):
+        return False
+    return True
+
+
+def open_store(spec: str) -> "Store":
+    """
+    Store for a --db style spec (not yet init()-ed): a SQLite file, log:<dir> for a
+    LogStore, remote:<address> for an `agentreplay serve` daemon or shards:<dir>
+    for a ShardedStore layout.
+    """
+    if spec.startswith("log:"):
+        from .store_log import LogStore
+
+        return LogStore(spec[len("log:"):])
+    if spec.startswith("remote:"):
+        from .store_remote import RemoteStore
+
+        return RemoteStore(spec[len("remote:"):])
+    if spec.startswith("shards:"):
+        from .store_shard import ShardedStore
+
+        return ShardedStore.open(spec[len("shards:"):])
+    from .store_sqlite import SQLiteStore
+
+    return SQLiteStore(spec)
+
 
 class Store(ABC):
     @abstractmethod
     def init(self) -> None: ...
 
+    def close(self) -> None:
+        """Release any connections/handles held by the store."""
+
+    def flush(self) -> None:
+        """Wait until every write accepted so far is applied (stores that write asynchronously)."""
+
+    def instrument(self, metrics: "Metrics") -> None:
+        """Report serialization time and payload bytes to `metrics` (optional)."""
+
+    def __enter__(self) -> "Store":
+        self.init()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # Attributes named in _RUNTIME (locks, connections, caches) are left out when a store
+    # is pickled, e.g. for ProcessPoolExecutor workers; _reset_runtime() rebuilds them.
+    _RUNTIME: Tuple[str, ...] = ()
+
+    def _reset_runtime(self) -> None:
+        pass
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k not in self._RUNTIME}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._reset_runtime()
+
     @abstractmethod
-    def create_run(self, name: str, started_at: datetime, meta: Dict[str, Any]) -> str: ...
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        """Create a run and return its id (`run_id` if given, e.g. one chosen by a client)."""
 
     @abstractmethod
     def end_run(self, run_id: str, ended_at: datetime) -> None: ...
@@ -27,13 +130,150 @@ class Store(ABC):
         input: Dict[str, Any],
         output: Dict[str, Any],
         error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
     ) -> str: ...
 
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        """
+        Bulk insert of already-built steps (ids included).
+        Backends should override this to write the whole batch in one transaction;
+        the default falls back to one add_step() per step.
+        """
+        return [
+            self.add_step(
+                run_id=s.run_id,
+                idx=s.idx,
+                kind=s.kind,
+                name=s.name,
+                ts=s.ts,
+                input=s.input,
+                output=s.output,
+                error=s.error,
+                duration_us=s.duration_us,
+            )
+            for s in steps
+        ]
+
+    def delete_run(self, run_id: str) -> None:
+        """Delete a run and all of its steps."""
+        raise NotImplementedError(f"{type(self).__name__} does not support deleting runs")
+
+    def run_bytes(self, run_id: str) -> int:
+        """Approximate stored payload size of a run (used by max_bytes retention)."""
+        return sum(
+            len(json.dumps([s.input, s.output, s.error], ensure_ascii=False))
+            for s in self.iter_steps(run_id)
+        )
+
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        """Reclaim space freed by deletions, in small steps. Returns pages freed."""
+        return 0
+
+    def gc(
+        self,
+        policies: Sequence["RetentionPolicy"],
+        archive_dir: Optional[str] = None,
+        dry_run: bool = False,
+        now: Optional[datetime] = None,
+    ) -> "GCReport":
+        """Delete (and optionally archive) runs expired by retention policies as of `now`."""
+        from .retention import collect_garbage
+
+        return collect_garbage(self, policies, archive_dir=archive_dir, dry_run=dry_run, now=now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Storage statistics (counts, bytes) for `agentreplay runs stats`."""
+        raise NotImplementedError(f"{type(self).__name__} does not report stats")
+
+    def search_steps(
+        self,
+        query: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        error_type: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> List[Tuple[str, int]]:
+        """
+        Find steps by payload text and/or kind, name, error type (error["type"]).
+        Returns (run_id, idx) pairs. The default implementation scans every run (newest
+        first) with a case-insensitive substring match; indexed backends should override it.
+        `raw` passes the query through in the backend's own query syntax where it has one.
+        """
+        needle = query.lower() if query else None
+        hits: List[Tuple[str, int]] = []
+        runs = [run_id] if run_id else (r.id for r in self.iter_runs())
+        for rid in runs:
+            for s in self.iter_steps(rid, kinds=[kind] if kind else None):
+                if name is not None and s.name != name:
+                    continue
+                if error_type is not None and (s.error or {}).get("type") != error_type:
+                    continue
+                if needle is not None:
+                    text = json.dumps([s.input, s.output, s.error], ensure_ascii=False)
+                    if needle not in text.lower():
+                        continue
+                hits.append((rid, s.idx))
+                if len(hits) >= limit:
+                    return hits
+        return hits
+
     @abstractmethod
     def get_run(self, run_id: str) -> Run: ...
 
     @abstractmethod
-    def list_runs(self, limit: int = 50) -> List[Run]: ...
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        """
+        Runs newest first (started_at, then id, descending), filtered by meta.project,
+        name, started_at window [since, until) and whether any step has an error.
+        Pass run_cursor(last run of a page) as `cursor` to get the next page.
+        """
+
+    def iter_runs(self, page_size: int = 500, **filters: Any) -> Iterator[Run]:
+        """Every run matching list_runs() filters, fetched page by page."""
+        cursor: Optional[str] = None
+        while True:
+            page = self.list_runs(limit=page_size, cursor=cursor, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            cursor = run_cursor(page[-1])
 
     @abstractmethod
     def list_steps(self, run_id: str) -> List[Step]: ...
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[Step]:
+        """
+        Stream a run's steps in idx order, optionally filtered by kind and starting idx.
+        Backends should override this to page through storage and decode payloads lazily.
+        """
+        for s in self.list_steps(run_id):
+            if kinds is not None and s.kind not in kinds:
+                continue
+            if start_idx is not None and s.idx < start_idx:
+                continue
+            yield s
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        """
+        Stream (idx, kind, name, fingerprint) for a run in idx order.
+        Backends that persist fingerprints should override this to skip payloads entirely.
+        """
+        for s in self.iter_steps(run_id):
+            fp = s.fingerprint or step_fingerprint(s.kind, s.name, s.input, s.output, s.error)
+            yield s.idx, s.kind, s.name, fp
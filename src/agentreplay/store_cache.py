@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .fingerprint import step_fingerprint
+from .metrics import Metrics
+from .models import LazyStep, Run, Step
+from .store import Store
+
+_STEP_OVERHEAD = sys.getsizeof(object()) * 12  # Step instance + fixed fields, roughly
+
+
+def _deep_size(obj: Any) -> int:
+    """Approximate memory footprint of a decoded JSON value."""
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            for k, v in o.items():
+                size += sys.getsizeof(k)
+                stack.append(v)
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+    return size
+
+
+def _steps_size(steps: List[Step]) -> int:
+    return sys.getsizeof(steps) + sum(
+        _STEP_OVERHEAD + _deep_size(s.input) + _deep_size(s.output) + _deep_size(s.error)
+        for s in steps
+    )
+
+
+def _text_size(s: Step) -> int:
+    if isinstance(s, LazyStep):
+        return _STEP_OVERHEAD + sum(len(s.canonical(f)) for f in ("input", "output", "error"))
+    return _STEP_OVERHEAD + _deep_size(s.input) + _deep_size(s.output) + _deep_size(s.error)
+
+
+class CachingStore(Store):
+    """
+    Read-through cache around another Store for read-heavy jobs (diff, replay, CI).
+
+    get_run() results and whole decoded step lists are kept in an LRU bounded by
+    approximate memory size, `max_bytes`. list_steps() fills the cache, and so does
+    a complete iter_steps() pass over a run that fits; otherwise iter_steps() streams
+    from the inner store, so runs too big to cache are never built up in memory.
+    Writes through the wrapper invalidate the run's
+    entries; writes made directly to the inner store are not seen. Cached payloads
+    are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, inner: Store, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.inner = inner
+        self.max_bytes = max_bytes
+        self._reset_runtime()
+
+    def _reset_runtime(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        # bumped by invalidate(): a read that raced with a write must not be cached
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    _RUNTIME = ("_lock", "_entries", "_bytes", "_versions", "_epoch", "hits", "misses", "evictions")
+
+    # -- cache --
+
+    def _get(self, key: Tuple[str, str]) -> Tuple[Any, Tuple[int, int]]:
+        """(cached value or None, version to pass to _put() after a miss)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, (self._epoch, self._versions.get(key[1], 0))
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], (0, 0)
+
+    def _put(self, key: Tuple[str, str], value: Any, size: int, version: Tuple[int, int]) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != (self._epoch, self._versions.get(key[1], 0)):
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, run_id: Optional[str] = None) -> None:
+        """Drop cached entries for one run, or everything."""
+        with self._lock:
+            if run_id is None:
+                self._epoch += 1
+                self._versions.clear()
+            else:
+                self._versions[run_id] = self._versions.get(run_id, 0) + 1
+            keys = list(self._entries) if run_id is None else [("run", run_id), ("steps", run_id)]
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[1]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # -- cached reads --
+
+    def get_run(self, run_id: str) -> Run:
+        run, version = self._get(("run", run_id))
+        if run is None:
+            run = self.inner.get_run(run_id)
+            self._put(("run", run_id), run, _STEP_OVERHEAD + _deep_size(run.meta), version)
+        return run
+
+    def _steps(self, run_id: str) -> List[Step]:
+        steps, version = self._get(("steps", run_id))
+        if steps is None:
+            steps = self.inner.list_steps(run_id)
+            self._put(("steps", run_id), steps, _steps_size(steps), version)
+        return steps
+
+    def list_steps(self, run_id: str) -> List[Step]:
+        return list(self._steps(run_id))
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[Step]:
+        steps, version = self._get(("steps", run_id))
+        if steps is not None:
+            for s in steps:
+                if kinds is not None and s.kind not in kinds:
+                    continue
+                if start_idx is not None and s.idx < start_idx:
+                    continue
+                yield s
+            return
+        if start_idx is not None:
+            # point reads (e.g. one step per change in an aligned diff) use the inner index
+            yield from self.inner.iter_steps(run_id, kinds=kinds, start_idx=start_idx)
+            return
+
+        # read the whole run once, keeping it for the cache until it is clearly too big;
+        # stored text is a lower bound for the decoded size and costs no decoding to measure
+        kept: Optional[List[Step]] = []
+        text = 0
+        for s in self.inner.iter_steps(run_id):
+            if kept is not None:
+                text += _text_size(s)
+                if text > self.max_bytes:
+                    kept = None
+                    if kinds is not None:
+                        # no longer worth reading the other kinds
+                        yield from self.inner.iter_steps(run_id, kinds=kinds, start_idx=s.idx)
+                        return
+                else:
+                    kept.append(s)
+            if kinds is None or s.kind in kinds:
+                yield s
+        if kept is not None:
+            full = [s.to_step() if isinstance(s, LazyStep) else s for s in kept]
+            self._put(("steps", run_id), full, _steps_size(full), version)
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        # only served from the cache when the steps are already there: the inner store
+        # can usually produce fingerprints without decoding payloads
+        with self._lock:
+            entry = self._entries.get(("steps", run_id))
+        if entry is None:
+            yield from self.inner.iter_fingerprints(run_id)
+            return
+        for s in entry[0]:
+            fp = s.fingerprint or step_fingerprint(s.kind, s.name, s.input, s.output, s.error)
+            yield s.idx, s.kind, s.name, fp
+
+    # -- writes (invalidating) --
+
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        return self.inner.create_run(name, started_at, meta, run_id)
+
+    def end_run(self, run_id: str, ended_at: datetime) -> None:
+        try:
+            self.inner.end_run(run_id, ended_at)
+        finally:
+            self.invalidate(run_id)
+
+    def add_step(
+        self,
+        run_id: str,
+        idx: int,
+        kind: str,
+        name: str,
+        ts: datetime,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
+    ) -> str:
+        try:
+            return self.inner.add_step(
+                run_id, idx, kind, name, ts, input, output, error, duration_us
+            )
+        finally:
+            self.invalidate(run_id)
+
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        touched = set()
+
+        def tracked() -> Iterator[Step]:
+            for s in steps:
+                touched.add(s.run_id)
+                yield s
+
+        try:
+            return self.inner.add_steps(tracked())
+        finally:
+            for run_id in touched:
+                self.invalidate(run_id)
+
+    def delete_run(self, run_id: str) -> None:
+        try:
+            self.inner.delete_run(run_id)
+        finally:
+            self.invalidate(run_id)
+
+    # -- pass-through --
+
+    def init(self) -> None:
+        self.inner.init()
+
+    def close(self) -> None:
+        self.invalidate()
+        self.inner.close()
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+    def instrument(self, metrics: Metrics) -> None:
+        self.inner.instrument(metrics)
+
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        return self.inner.list_runs(limit, project, name, since, until, has_error, cursor)
+
+    def run_bytes(self, run_id: str) -> int:
+        return self.inner.run_bytes(run_id)
+
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        return self.inner.compact(max_pages)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def search_steps(
+        self,
+        query: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        error_type: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> List[Tuple[str, int]]:
+        return self.inner.search_steps(query, kind, name, error_type, run_id, limit, raw)
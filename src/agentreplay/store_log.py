@@ -0,0 +1,664 @@
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import (
+    Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Set, TextIO, Tuple,
+)
+
+from .canonical import dumps, loads, payload_texts
+from .fingerprint import fingerprint_canonical
+from .metrics import Metrics
+from .models import LazyStep, Run, Step
+from .store import Store, run_matches
+
+# record = _REC(payload length, crc32(payload)) + payload
+# payload = _LENS(header, input, output, error lengths) + header + input + output + error
+# header = JSON [id, run_id, idx, kind, name, ts, fingerprint, duration_us]
+# an error length of 0 means None
+_REC = struct.Struct("<II")
+_LENS = struct.Struct("<IIII")
+_PRE = _REC.size + _LENS.size
+
+# index locations pack (segment number, byte offset) into one int
+_OFFSET_BITS = 40
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+_PAGE = 4096
+_WRITE_CHUNK = 4 * 1024 * 1024
+
+
+def _to_iso(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def _utf8(raw: bytes) -> str:
+    return raw.decode("utf-8")
+
+
+def _seg_name(seg: int) -> str:
+    return f"seg-{seg:06d}.log"
+
+
+class _RunIndex:
+    """(idx -> location) for one run, as two parallel arrays kept sorted by idx."""
+
+    __slots__ = ("idxs", "locs", "sorted")
+
+    def __init__(self) -> None:
+        self.idxs = array("q")
+        self.locs = array("q")
+        self.sorted = True
+
+    def add(self, idx: int, loc: int) -> None:
+        if self.idxs and idx < self.idxs[-1]:
+            self.sorted = False
+        self.idxs.append(idx)
+        self.locs.append(loc)
+
+    def snapshot(self) -> Tuple[array, array]:
+        if not self.sorted:
+            order = sorted(range(len(self.idxs)), key=self.idxs.__getitem__)
+            self.idxs = array("q", (self.idxs[i] for i in order))
+            self.locs = array("q", (self.locs[i] for i in order))
+            self.sorted = True
+        return array("q", self.idxs), array("q", self.locs)
+
+
+class LogStore(Store):
+    """
+    Append-only Store for write-heavy workloads: steps are appended to segment files
+    as length-prefixed, checksummed records and located through an in-memory
+    (run_id, idx) -> (segment, offset) index; reads go through mmap.
+
+    Layout of the `path` directory:
+      runs.jsonl        run create/end/delete events
+      seg-NNNNNN.log    step records; the highest-numbered segment is the active one
+      seg-NNNNNN.idx    index snapshot of a sealed segment (skips rescanning it on open)
+
+    The active segment is sealed once it grows past `segment_bytes`. Deleting runs
+    leaves garbage in sealed segments; compact() rewrites mostly-dead segments with
+    just their live records (a synced temp file renamed over the old one, so a crash
+    leaves either version whole). Readers pin the maps of the segments they read, so
+    a compaction does not pull a file from under them. One LogStore instance should
+    own a directory for writing; other processes may read it.
+    """
+
+    def __init__(
+        self,
+        path: str = "agentreplay.log",
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = False,
+        compact_ratio: float = 0.5,
+    ) -> None:
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self._reset_runtime()
+
+    def _reset_runtime(self) -> None:
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._runs: Dict[str, Run] = {}
+        self._run_keys: List[Tuple[str, str]] = []  # (started_at iso, id), ascending
+        self._has_error: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._runs_dirty = False  # runs.jsonl has end/delete events to fold
+        self._index: Dict[str, _RunIndex] = {}
+        self._live: Dict[int, int] = {}  # segment -> live record bytes
+        self._sizes: Dict[int, int] = {}  # segment -> indexed end offset
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._active = 1
+        self._writer: Optional[BinaryIO] = None
+        self._runs_file: Optional[TextIO] = None
+        self._metrics: Optional[Metrics] = None
+
+    _RUNTIME = (
+        "_lock", "_loaded", "_runs", "_run_keys", "_has_error", "_deleted", "_runs_dirty",
+        "_index", "_live", "_sizes", "_maps", "_active", "_writer", "_runs_file", "_metrics",
+    )
+
+    # -- open / close --
+
+    def init(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            self._load_runs()
+            files = os.listdir(self.path)
+            for f in files:
+                if f.startswith("seg-") and f.endswith(".log.tmp"):
+                    os.remove(os.path.join(self.path, f))  # an interrupted compaction
+            segs = sorted(
+                int(f[4:10]) for f in files if f.startswith("seg-") and f.endswith(".log")
+            )
+            for seg in segs:
+                if seg == segs[-1] or not self._load_sidecar(seg):
+                    self._scan(seg)
+            self._active = segs[-1] if segs else 1
+            self._loaded = True
+
+    def _ready(self) -> None:
+        if not self._loaded:
+            self.init()
+
+    def close(self) -> None:
+        with self._lock:
+            for f in (self._writer, self._runs_file):
+                if f is not None:
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                    f.close()
+            self._writer = None
+            self._runs_file = None
+            self._maps.clear()
+
+    def instrument(self, metrics: Metrics) -> None:
+        self._metrics = metrics
+
+    # -- runs --
+
+    def _load_runs(self) -> None:
+        path = os.path.join(self.path, "runs.jsonl")
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:  # torn last line
+                    break
+                op = ev["op"]
+                if op == "run":
+                    self._put_run(Run(
+                        id=ev["id"],
+                        name=ev["name"],
+                        started_at=datetime.fromisoformat(ev["started_at"]),
+                        ended_at=None,
+                        meta=ev["meta"],
+                    ))
+                elif op == "end" and ev["id"] in self._runs:
+                    r = self._runs[ev["id"]]
+                    ended = datetime.fromisoformat(ev["ended_at"])
+                    self._runs[r.id] = Run(r.id, r.name, r.started_at, ended, r.meta)
+                elif op == "delete":
+                    self._drop_run(ev["id"])
+                    self._runs_dirty = True
+
+    def _put_run(self, run: Run) -> None:
+        self._runs[run.id] = run
+        bisect.insort(self._run_keys, (_to_iso(run.started_at), run.id))
+
+    def _drop_run(self, run_id: str) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            key = (_to_iso(run.started_at), run_id)
+            i = bisect.bisect_left(self._run_keys, key)
+            if i < len(self._run_keys) and self._run_keys[i] == key:
+                del self._run_keys[i]
+        self._has_error.discard(run_id)
+        self._deleted.add(run_id)
+
+    def _log_run_event(self, ev: Dict[str, Any]) -> None:
+        if self._runs_file is None:
+            self._runs_file = open(os.path.join(self.path, "runs.jsonl"), "a", encoding="utf-8")
+        self._runs_file.write(json.dumps(ev) + "\n")
+        self._runs_file.flush()
+        if self.fsync:
+            os.fsync(self._runs_file.fileno())
+
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        self._ready()
+        run_id = run_id or str(uuid.uuid4())
+        with self._lock:
+            started = _to_iso(started_at)
+            self._log_run_event(
+                {"op": "run", "id": run_id, "name": name, "started_at": started, "meta": meta}
+            )
+            self._put_run(Run(run_id, name, datetime.fromisoformat(started), None, meta))
+        return run_id
+
+    def end_run(self, run_id: str, ended_at: datetime) -> None:
+        self._ready()
+        with self._lock:
+            self._log_run_event({"op": "end", "id": run_id, "ended_at": _to_iso(ended_at)})
+            r = self._runs.get(run_id)
+            if r is not None:
+                ended = datetime.fromisoformat(_to_iso(ended_at))
+                self._runs[run_id] = Run(r.id, r.name, r.started_at, ended, r.meta)
+
+    def get_run(self, run_id: str) -> Run:
+        self._ready()
+        try:
+            return self._runs[run_id]
+        except KeyError:
+            raise KeyError(f"Run not found: {run_id}") from None
+
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        self._ready()
+        with self._lock:
+            keys = list(self._run_keys)
+        out: List[Run] = []
+        for _, run_id in reversed(keys):
+            run = self._runs.get(run_id)
+            if run is None or not run_matches(run, project, name, since, until, cursor):
+                continue
+            if has_error is not None and (run_id in self._has_error) != has_error:
+                continue
+            out.append(run)
+            if len(out) >= limit:
+                break
+        return out
+
+    def delete_run(self, run_id: str) -> None:
+        self._ready()
+        with self._lock:
+            self._log_run_event({"op": "delete", "id": run_id})
+            self._runs_dirty = True
+            ri = self._index.pop(run_id, None)
+            if ri is not None:
+                for loc in ri.locs:
+                    seg = loc >> _OFFSET_BITS
+                    self._live[seg] -= self._record_len(loc)
+            self._drop_run(run_id)
+
+    # -- segments --
+
+    def _seg_path(self, seg: int) -> str:
+        return os.path.join(self.path, _seg_name(seg))
+
+    def _map(self, seg: int, end: int) -> mmap.mmap:
+        m = self._maps.get(seg)
+        if m is None or len(m) < end:
+            # the active segment grows: remap (old maps stay valid for their readers)
+            with open(self._seg_path(seg), "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[seg] = m
+        return m
+
+    def _record_len(self, loc: int) -> int:
+        seg, off = loc >> _OFFSET_BITS, loc & _OFFSET_MASK
+        n, _ = _REC.unpack_from(self._map(seg, off + _REC.size), off)
+        return _REC.size + n
+
+    def _index_add(self, run_id: str, idx: int, seg: int, off: int, size: int, error: bool) -> None:
+        ri = self._index.get(run_id)
+        if ri is None:
+            ri = self._index[run_id] = _RunIndex()
+        ri.add(idx, (seg << _OFFSET_BITS) | off)
+        self._live[seg] = self._live.get(seg, 0) + size
+        if error:
+            self._has_error.add(run_id)
+
+    def _scan(self, seg: int) -> None:
+        """Index a segment by walking its records; stops at the first torn/corrupt record."""
+        path = self._seg_path(seg)
+        size = os.path.getsize(path)
+        self._live.setdefault(seg, 0)
+        pos = 0
+        if size:
+            with open(path, "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while pos + _PRE <= size:
+                    n, crc = _REC.unpack_from(m, pos)
+                    end = pos + _REC.size + n
+                    if end > size or zlib.crc32(m[pos + _REC.size:end]) != crc:
+                        break
+                    hl = _LENS.unpack_from(m, pos + _REC.size)[0]
+                    header = loads(m[pos + _PRE:pos + _PRE + hl])
+                    el = _LENS.unpack_from(m, pos + _REC.size)[3]
+                    if header[1] not in self._deleted:
+                        self._index_add(header[1], header[2], seg, pos, end - pos, el != 0)
+                    pos = end
+            finally:
+                m.close()
+        self._sizes[seg] = pos
+
+    def _load_sidecar(self, seg: int) -> bool:
+        path = os.path.join(self.path, f"seg-{seg:06d}.idx")
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("size") != os.path.getsize(self._seg_path(seg)):
+            return False
+        self._live.setdefault(seg, 0)
+        for run_id, idx, off, size, error in data["entries"]:
+            if run_id not in self._deleted:
+                self._index_add(run_id, idx, seg, off, size, bool(error))
+        self._sizes[seg] = data["size"]
+        return True
+
+    def _write_sidecar(self, seg: int) -> None:
+        entries = []
+        for run_id, ri in self._index.items():
+            for idx, loc in zip(ri.idxs, ri.locs):
+                if loc >> _OFFSET_BITS == seg:
+                    off = loc & _OFFSET_MASK
+                    m = self._map(seg, off + _PRE)
+                    n = _REC.unpack_from(m, off)[0]
+                    el = _LENS.unpack_from(m, off + _REC.size)[3]
+                    entries.append([run_id, idx, off, _REC.size + n, 1 if el else 0])
+        path = os.path.join(self.path, f"seg-{seg:06d}.idx")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"size": self._sizes.get(seg, 0), "entries": entries}, f)
+        os.replace(path + ".tmp", path)
+
+    def _open_writer(self) -> BinaryIO:
+        if self._writer is None:
+            path = self._seg_path(self._active)
+            f = open(path, "ab")
+            # drop a torn tail left by a crash before appending after it
+            end = self._sizes.get(self._active, 0)
+            if f.tell() != end:
+                f.truncate(end)
+                f.seek(end)
+            self._sizes[self._active] = end
+            self._live.setdefault(self._active, 0)
+            self._writer = f
+        return self._writer
+
+    def _rotate(self) -> None:
+        w = self._open_writer()
+        w.flush()
+        if self.fsync:
+            os.fsync(w.fileno())
+        w.close()
+        self._writer = None
+        sealed = self._active
+        self._write_sidecar(sealed)
+        self._active = sealed + 1
+
+    def _append(self, records: Iterable[Tuple[bytes, str, int, bool]]) -> None:
+        """Append encoded records (record, run_id, idx, has_error) in large writes."""
+        with self._lock:
+            w = self._open_writer()
+            buf = bytearray()
+            pending: List[Tuple[str, int, int, int, bool]] = []
+
+            def flush() -> None:
+                w.write(buf)
+                w.flush()
+                if self.fsync:
+                    os.fsync(w.fileno())
+                seg = self._active
+                for run_id, idx, off, size, error in pending:
+                    self._index_add(run_id, idx, seg, off, size, error)
+                self._sizes[seg] += len(buf)
+                buf.clear()
+                pending.clear()
+
+            for rec, run_id, idx, error in records:
+                pending.append((run_id, idx, self._sizes[self._active] + len(buf), len(rec), error))
+                buf += rec
+                end = self._sizes[self._active] + len(buf)
+                if len(buf) >= _WRITE_CHUNK or end >= self.segment_bytes:
+                    flush()
+                    if self._sizes[self._active] >= self.segment_bytes:
+                        self._rotate()
+                        w = self._open_writer()
+            if buf:
+                flush()
+            if self._sizes[self._active] >= self.segment_bytes:
+                self._rotate()
+
+    # -- steps --
+
+    def _encode(self, s: Step) -> Tuple[bytes, str, int, bool]:
+        # payloads are stored as canonical JSON, serialized once and hashed as-is
+        inp, out, err = payload_texts(s)
+        fp = s.fingerprint or fingerprint_canonical(s.kind, s.name, inp, out, err)
+        header = dumps([s.id, s.run_id, s.idx, s.kind, s.name, _to_iso(s.ts), fp, s.duration_us])
+        ib, ob = inp.encode("utf-8"), out.encode("utf-8")
+        eb = b"" if err is None else err.encode("utf-8")
+        payload = b"".join((_LENS.pack(len(header), len(ib), len(ob), len(eb)), header, ib, ob, eb))
+        rec = _REC.pack(len(payload), zlib.crc32(payload)) + payload
+        return rec, s.run_id, s.idx, s.error is not None
+
+    def _records(self, steps: Iterable[Step]) -> Iterator[Tuple[bytes, str, int, bool]]:
+        m = self._metrics
+        if m is None:
+            for s in steps:
+                yield self._encode(s)
+            return
+        clock = time.perf_counter_ns
+        for s in steps:
+            t0 = clock()
+            rec = self._encode(s)
+            m.observe("serialization", clock() - t0)
+            m.count_bytes(s.kind, len(rec[0]))
+            yield rec
+
+    def add_step(
+        self,
+        run_id: str,
+        idx: int,
+        kind: str,
+        name: str,
+        ts: datetime,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
+    ) -> str:
+        step = Step(
+            id=str(uuid.uuid4()),
+            run_id=run_id,
+            idx=idx,
+            kind=kind,  # type: ignore[arg-type]
+            name=name,
+            ts=ts,
+            input=input,
+            output=output,
+            error=error,
+            duration_us=duration_us,
+        )
+        self.add_steps([step])
+        return step.id
+
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        self._ready()
+        ids: List[str] = []
+
+        def tracked() -> Iterator[Step]:
+            for s in steps:
+                ids.append(s.id)
+                yield s
+
+        self._append(self._records(tracked()))
+        return ids
+
+    def _locations(self, run_id: str) -> Tuple[array, array, Dict[int, mmap.mmap]]:
+        # the maps are taken with the locations: a map stays readable after compaction
+        # replaces its file, so holding them is what keeps this snapshot valid
+        self._ready()
+        with self._lock:
+            ri = self._index.get(run_id)
+            if ri is None:
+                return array("q"), array("q"), {}
+            idxs, locs = ri.snapshot()
+            segs = {loc >> _OFFSET_BITS for loc in locs}
+            maps = {seg: self._map(seg, self._sizes[seg]) for seg in segs}
+            return idxs, locs, maps
+
+    @staticmethod
+    def _read(
+        maps: Dict[int, mmap.mmap], loc: int
+    ) -> Tuple[mmap.mmap, int, Tuple[int, int, int, int]]:
+        m, off = maps[loc >> _OFFSET_BITS], loc & _OFFSET_MASK
+        return m, off + _PRE, _LENS.unpack_from(m, off + _REC.size)
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[LazyStep]:
+        idxs, locs, maps = self._locations(run_id)
+        first = bisect.bisect_left(idxs, start_idx) if start_idx is not None else 0
+        for i in range(first, len(idxs)):
+            m, p, (hl, il, ol, el) = self._read(maps, locs[i])
+            header = loads(m[p:p + hl])
+            if kinds is not None and header[3] not in kinds:
+                continue
+            p += hl
+            yield LazyStep(
+                id=header[0],
+                run_id=header[1],
+                idx=header[2],
+                kind=header[3],
+                name=header[4],
+                ts=datetime.fromisoformat(header[5]),
+                raw_input=m[p:p + il],
+                raw_output=m[p + il:p + il + ol],
+                raw_error=m[p + il + ol:p + il + ol + el] if el else None,
+                decode=loads,
+                fingerprint=header[6],
+                to_text=_utf8,
+                duration_us=header[7] if len(header) > 7 else None,
+            )
+
+    def list_steps(self, run_id: str) -> List[Step]:
+        return [s.to_step() for s in self.iter_steps(run_id)]
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        _, locs, maps = self._locations(run_id)
+        for loc in locs:
+            m, p, (hl, _, _, _) = self._read(maps, loc)
+            header = loads(m[p:p + hl])
+            yield header[2], header[3], header[4], header[6]
+
+    def run_bytes(self, run_id: str) -> int:
+        _, locs, maps = self._locations(run_id)
+        return sum(
+            _REC.size + _REC.unpack_from(maps[loc >> _OFFSET_BITS], loc & _OFFSET_MASK)[0]
+            for loc in locs
+        )
+
+    # -- maintenance --
+
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        """
+        Rewrite sealed segments whose live fraction is below compact_ratio with only
+        their live records (segments left empty are removed). Also rewrites runs.jsonl
+        without deleted runs. Returns 4 KiB pages freed.
+        """
+        self._ready()
+        freed = 0
+        with self._lock:
+            for seg in sorted(self._sizes):
+                if seg == self._active or (max_pages is not None and freed >= max_pages * _PAGE):
+                    continue
+                size = os.path.getsize(self._seg_path(seg))
+                if size and self._live.get(seg, 0) >= self.compact_ratio * size:
+                    continue
+                freed += size - self._live.get(seg, 0)
+                self._relocate(seg)
+            if self._runs_dirty:
+                self._rewrite_runs()
+        return freed // _PAGE
+
+    def _relocate(self, seg: int) -> None:
+        moves: List[Tuple[int, _RunIndex, int]] = []
+        for ri in self._index.values():
+            for i, loc in enumerate(ri.locs):
+                if loc >> _OFFSET_BITS == seg:
+                    moves.append((loc & _OFFSET_MASK, ri, i))
+        moves.sort(key=lambda t: t[0])
+        path = self._seg_path(seg)
+        sidecar = os.path.join(self.path, f"seg-{seg:06d}.idx")
+        new_locs: List[int] = []
+        if moves:
+            old = self._map(seg, self._sizes[seg])
+            pos = 0
+            with open(path + ".tmp", "wb") as f:
+                for off, _, _ in moves:
+                    n = _REC.unpack_from(old, off)[0]
+                    f.write(old[off:off + _REC.size + n])
+                    new_locs.append(pos)
+                    pos += _REC.size + n
+                f.flush()
+                # synced before the rename, or a crash could leave the new name on a torn file
+                os.fsync(f.fileno())
+        # a stale sidecar must not outlive its segment; without one the file is rescanned
+        try:
+            os.remove(sidecar)
+        except FileNotFoundError:
+            pass
+        self._maps.pop(seg, None)  # readers holding the old map keep reading the old file
+        if not moves:
+            os.remove(path)
+            self._live.pop(seg, None)
+            self._sizes.pop(seg, None)
+            return
+        os.replace(path + ".tmp", path)
+        for (_, ri, i), new_off in zip(moves, new_locs):
+            ri.locs[i] = (seg << _OFFSET_BITS) | new_off
+        self._sizes[seg] = self._live[seg] = pos
+        self._write_sidecar(seg)
+
+    def _rewrite_runs(self) -> None:
+        if self._runs_file is not None:
+            self._runs_file.close()
+            self._runs_file = None
+        path = os.path.join(self.path, "runs.jsonl")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for _, run_id in self._run_keys:
+                r = self._runs[run_id]
+                f.write(json.dumps({
+                    "op": "run", "id": r.id, "name": r.name,
+                    "started_at": _to_iso(r.started_at), "meta": r.meta,
+                }) + "\n")
+                if r.ended_at is not None:
+                    end = {"op": "end", "id": r.id, "ended_at": _to_iso(r.ended_at)}
+                    f.write(json.dumps(end) + "\n")
+            # tombstones stay: uncompacted segments may still hold records of deleted runs
+            for run_id in sorted(self._deleted):
+                f.write(json.dumps({"op": "delete", "id": run_id}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._runs_dirty = False
+
+    def stats(self) -> Dict[str, Any]:
+        self._ready()
+        with self._lock:
+            steps = sum(len(ri.idxs) for ri in self._index.values())
+            paths = [self._seg_path(s) for s in self._sizes]
+            files = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+            live = sum(self._live.values())
+            return {
+                "runs": len(self._runs),
+                "steps": steps,
+                "payload_bytes": live,
+                "segments": len(self._sizes),
+                "segment_bytes": files,
+                "garbage_bytes": files - live,
+            }
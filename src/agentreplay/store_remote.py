@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import atexit
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime
+from typing import (
+    Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple,
+)
+
+from .canonical import dumps, loads, payload_texts
+from .fingerprint import fingerprint_canonical
+from .models import LazyStep, Run, Step, run_from_dict
+from .store import Store
+
+DEFAULT_ADDRESS = "127.0.0.1:7465"
+
+# requests the daemon applies on its single writer thread; everything else is a read
+WRITE_OPS = frozenset({"create_run", "end_run", "add_steps", "delete_run", "compact"})
+# writes that may be spooled and applied later; delete_run/compact fail instead, so
+# callers such as collect_garbage() never count work that did not happen
+SPOOL_OPS = frozenset({"create_run", "end_run", "add_steps"})
+READ_OPS = frozenset(
+    {
+        "get_run", "list_runs", "iter_steps", "iter_fingerprints", "search_steps", "run_bytes",
+        "stats", "ping",
+    }
+)
+
+_FRAME = struct.Struct("!I")
+
+
+class RemoteError(RuntimeError):
+    """An exception raised by the daemon's store that has no local equivalent."""
+
+
+_OPEN: "weakref.WeakSet[RemoteStore]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    for store in list(_OPEN):
+        try:
+            store.flush()
+        except Exception:
+            pass
+
+
+_ERRORS = {e.__name__: e for e in (KeyError, ValueError, NotImplementedError, RuntimeError)}
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """(socket family, address) for "host:port" or "unix:<path>"."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Invalid address {address!r}: expected host:port or unix:<path>")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def encode_frame(obj: Any) -> bytes:
+    """Length-prefixed JSON message."""
+    body = dumps(obj)
+    return _FRAME.pack(len(body)) + body
+
+
+def _read_exact(f: BinaryIO, n: int) -> Optional[bytes]:
+    buf = f.read(n)
+    while buf is not None and 0 < len(buf) < n:
+        more = f.read(n - len(buf))
+        if not more:
+            return None
+        buf += more
+    return buf if buf and len(buf) == n else None
+
+
+def read_frame(f: BinaryIO) -> Any:
+    """The next message, or None at EOF."""
+    head = _read_exact(f, _FRAME.size)
+    if head is None:
+        return None
+    body = _read_exact(f, _FRAME.unpack(head)[0])
+    if body is None:
+        return None
+    return loads(body)
+
+
+def step_to_wire(s: Step) -> List[Any]:
+    """
+    A step as sent in either direction. Payloads travel as canonical JSON text with
+    the fingerprint, so clients serialize and the daemon's writer stores the text
+    as-is, and steps read back are only decoded if their payloads are used.
+    """
+    inp, out, err = payload_texts(s)
+    fp = s.fingerprint or fingerprint_canonical(s.kind, s.name, inp, out, err)
+    return [
+        s.id, s.run_id, s.idx, s.kind, s.name, s.ts.isoformat(), inp, out, err, fp, s.duration_us
+    ]
+
+
+def step_from_wire(w: List[Any]) -> LazyStep:
+    # spools written before durations were recorded hold 10-element steps
+    id, run_id, idx, kind, name, ts, inp, out, err, fp = w[:10]
+    return LazyStep(
+        id, run_id, idx, kind, name, datetime.fromisoformat(ts), inp, out, err, loads, fp, str,
+        duration_us=w[10] if len(w) > 10 else None,
+    )
+
+
+def drain_spool(path: str, store: Store) -> int:
+    """Apply the writes a RemoteStore spooled to `path` directly to `store`. Returns ops applied."""
+    from .server import decode_args, execute
+
+    n = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                op, args = loads(line)
+                execute(store, op, decode_args(op, args))
+                n += 1
+    return n
+
+
+class _Pending:
+    __slots__ = ("op", "args", "event", "result", "error")
+
+    def __init__(self, op: str, args: Dict[str, Any]) -> None:
+        self.op = op
+        self.args = args
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RemoteStore(Store):
+    """
+    Store client for an `agentreplay serve` daemon, which owns the real store and is
+    its only writer (no SQLite lock contention between worker processes).
+
+    Writes are pipelined: create_run()/add_steps()/end_run() send the request and
+    return without waiting for the reply (run and step ids are chosen client-side),
+    with at most `max_inflight` writes unacknowledged. Failed writes are counted in
+    `write_errors`/`last_error`. Reads wait for their reply, which the daemon sends
+    only after this client's earlier writes are applied.
+
+    While the daemon is unreachable, writes are appended to a local spool file
+    (JSON lines) and replayed, in order, on the next successful connection; reads
+    raise ConnectionError. Writes in flight when a connection drops are spooled
+    too, so delivery is at-least-once. flush() waits for every write to be acked.
+    """
+
+    # steps per add_steps request
+    chunk_size = 1000
+    # steps per iter_steps() round-trip
+    page_size = 500
+
+    def __init__(
+        self,
+        address: str = DEFAULT_ADDRESS,
+        spool_path: Optional[str] = None,
+        timeout: float = 30.0,
+        retry_interval: float = 1.0,
+        max_inflight: int = 1024,
+    ) -> None:
+        parse_address(address)
+        self.address = address
+        self.spool_path = spool_path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.max_inflight = max_inflight
+        self._reset_runtime()
+
+    def _reset_runtime(self) -> None:
+        self._lock = threading.Lock()
+        self._acked = threading.Condition(self._lock)
+        self._sock: Optional[socket.socket] = None
+        self._inflight: Dict[int, _Pending] = {}
+        self._writes = 0
+        self._next_id = 0
+        self._retry_at = 0.0
+        self.write_errors = 0
+        self.spooled = 0
+        self.last_error: Optional[BaseException] = None
+
+    _RUNTIME = (
+        "_lock", "_acked", "_sock", "_inflight", "_writes", "_next_id", "_retry_at",
+        "write_errors", "spooled", "last_error",
+    )
+
+    @property
+    def spool_file(self) -> str:
+        # per process by default, so pickled copies in worker processes don't share one
+        return self.spool_path or os.path.join(
+            tempfile.gettempdir(), f"agentreplay-{os.getpid()}.spool.jsonl"
+        )
+
+    # -- connection (call with self._lock held) --
+
+    def _connected(self) -> Optional[socket.socket]:
+        if self._sock is not None:
+            return self._sock
+        if time.monotonic() < self._retry_at:
+            return None
+        family, addr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(addr)
+            sock.settimeout(None)
+            if family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            sock.close()
+            self._retry_at = time.monotonic() + self.retry_interval
+            return None
+        self._sock = sock
+        _OPEN.add(self)
+        threading.Thread(
+            target=self._reader, args=(sock,), name="agentreplay-remote", daemon=True
+        ).start()
+        self._replay_spool()
+        return self._sock
+
+    def _replay_spool(self) -> None:
+        path = self.spool_file
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as f:
+            lines = f.readlines()
+            f.seek(0)
+            f.truncate()
+        for line in lines:
+            if line.strip() and self._sock is not None:
+                op, args = loads(line)
+                self._send(op, args)
+            elif line.strip():  # connection lost again mid-replay
+                self._spool(*loads(line))
+
+    def _send(self, op: str, args: Dict[str, Any]) -> _Pending:
+        self._next_id += 1
+        rid = self._next_id
+        p = _Pending(op, args)
+        self._inflight[rid] = p
+        if op in WRITE_OPS:
+            self._writes += 1
+        try:
+            self._sock.sendall(encode_frame([rid, op, args]))  # type: ignore[union-attr]
+        except OSError as e:
+            self._disconnected(self._sock, e)
+        return p
+
+    def _spool(self, op: str, args: Dict[str, Any]) -> None:
+        with open(self.spool_file, "ab") as f:
+            f.write(dumps([op, args]) + b"\n")
+        self.spooled += 1
+
+    def _disconnected(self, sock: Optional[socket.socket], error: BaseException) -> None:
+        if sock is None or self._sock is not sock:
+            return
+        self._sock = None
+        self._retry_at = time.monotonic() + self.retry_interval
+        try:
+            sock.close()
+        except OSError:
+            pass
+        pending = list(self._inflight.values())
+        self._inflight.clear()
+        self._writes = 0
+        for p in pending:
+            if p.op in SPOOL_OPS:
+                self._spool(p.op, p.args)
+            else:
+                p.error = ConnectionError(
+                    f"Lost connection to agentreplay daemon at {self.address}: {error}"
+                )
+            p.event.set()
+        self._acked.notify_all()
+
+    def _reader(self, sock: socket.socket) -> None:
+        f = sock.makefile("rb")
+        try:
+            while True:
+                msg = read_frame(f)
+                if msg is None:
+                    raise ConnectionError("connection closed by daemon")
+                rid, ok, value = msg
+                with self._lock:
+                    p = self._inflight.pop(rid, None)
+                    if p is None:
+                        continue
+                    if not ok:
+                        p.error = _ERRORS.get(value[0], RemoteError)(value[1])
+                    else:
+                        p.result = value
+                    if p.op in WRITE_OPS:
+                        self._writes -= 1
+                        if p.error is not None:
+                            self.write_errors += 1
+                            self.last_error = p.error
+                        self._acked.notify_all()
+                    p.event.set()
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self._disconnected(sock, e)
+        finally:
+            f.close()
+
+    # -- requests --
+
+    def _await_acks(self, until: Callable[[], bool]) -> None:
+        # a daemon that stops acknowledging (while acks make progress, the clock restarts)
+        # is treated as gone: unacked writes are spooled and the socket dropped
+        deadline = time.monotonic() + self.timeout
+        writes = self._writes
+        while not until() and self._sock is not None:
+            if self._writes != writes:
+                deadline, writes = time.monotonic() + self.timeout, self._writes
+            left = deadline - time.monotonic()
+            if left <= 0:
+                error = TimeoutError(f"no acknowledgement within {self.timeout}s")
+                self._disconnected(self._sock, error)
+                return
+            self._acked.wait(left)
+
+    def _write(self, op: str, args: Dict[str, Any]) -> None:
+        with self._lock:
+            self._await_acks(lambda: self._writes < self.max_inflight)
+            if self._connected() is None:
+                self._spool(op, args)
+            else:
+                self._send(op, args)
+
+    def _call(self, op: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        with self._lock:
+            if self._connected() is None:
+                raise ConnectionError(f"agentreplay daemon not reachable at {self.address}")
+            p = self._send(op, args or {})
+        if not p.event.wait(self.timeout):
+            raise TimeoutError(f"No reply to {op} from agentreplay daemon at {self.address}")
+        if p.error is not None:
+            raise p.error
+        return p.result
+
+    def flush(self) -> None:
+        """Wait until every write sent so far is acknowledged (or spooled)."""
+        with self._lock:
+            self._await_acks(lambda: not self._writes)
+
+    def ping(self) -> bool:
+        try:
+            return self._call("ping") == "pong"
+        except (ConnectionError, TimeoutError):
+            return False
+
+    # -- Store --
+
+    def init(self) -> None:
+        with self._lock:
+            self._connected()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        run_id = run_id or str(uuid.uuid4())
+        self._write(
+            "create_run",
+            {
+                "name": name, "started_at": started_at.isoformat(), "meta": meta or {},
+                "run_id": run_id,
+            },
+        )
+        return run_id
+
+    def end_run(self, run_id: str, ended_at: datetime) -> None:
+        self._write("end_run", {"run_id": run_id, "ended_at": ended_at.isoformat()})
+
+    def add_step(
+        self,
+        run_id: str,
+        idx: int,
+        kind: str,
+        name: str,
+        ts: datetime,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
+    ) -> str:
+        step = Step(
+            str(uuid.uuid4()), run_id, idx, kind, name,  # type: ignore[arg-type]
+            ts, input, output, error, duration_us=duration_us,
+        )
+        self.add_steps([step])
+        return step.id
+
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        ids: List[str] = []
+        chunk: List[Dict[str, Any]] = []
+        for s in steps:
+            ids.append(s.id)
+            chunk.append(step_to_wire(s))
+            if len(chunk) >= self.chunk_size:
+                self._write("add_steps", {"steps": chunk})
+                chunk = []
+        if chunk:
+            self._write("add_steps", {"steps": chunk})
+        return ids
+
+    def delete_run(self, run_id: str) -> None:
+        self._call("delete_run", {"run_id": run_id})
+
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        return self._call("compact", {"max_pages": max_pages}) or 0
+
+    def get_run(self, run_id: str) -> Run:
+        return run_from_dict(self._call("get_run", {"run_id": run_id}))
+
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        args = {
+            "limit": limit,
+            "project": project,
+            "name": name,
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "has_error": has_error,
+            "cursor": cursor,
+        }
+        return [run_from_dict(d) for d in self._call("list_runs", args)]
+
+    def list_steps(self, run_id: str) -> List[Step]:
+        return list(self.iter_steps(run_id))
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[Step]:
+        kinds = list(kinds) if kinds is not None else None
+        while True:
+            args = {
+                "run_id": run_id, "kinds": kinds, "start_idx": start_idx, "limit": self.page_size
+            }
+            page = self._call("iter_steps", args)
+            for d in page:
+                yield step_from_wire(d)
+            if len(page) < self.page_size:
+                return
+            start_idx = page[-1][2] + 1
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        for idx, kind, name, fp in self._call("iter_fingerprints", {"run_id": run_id}):
+            yield idx, kind, name, fp
+
+    def search_steps(
+        self,
+        query: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        error_type: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> List[Tuple[str, int]]:
+        args = {
+            "query": query, "kind": kind, "name": name, "error_type": error_type,
+            "run_id": run_id, "limit": limit, "raw": raw,
+        }
+        return [(rid, idx) for rid, idx in self._call("search_steps", args)]
+
+    def run_bytes(self, run_id: str) -> int:
+        return self._call("run_bytes", {"run_id": run_id})
+
+    def stats(self) -> Dict[str, Any]:
+        return self._call("stats")
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import os
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, TypeVar,
+)
+
+from .metrics import Metrics
+from .models import Run, Step
+from .store import Store, _utc_iso, open_store
+
+ShardBy = Literal["run_id", "project"]
+
+MANIFEST = "shards.json"
+
+T = TypeVar("T")
+
+
+def _slot(key: str, n: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % n
+
+
+def _order(run: Run) -> Tuple[str, str]:
+    # list_runs() order: started_at, then id
+    return _utc_iso(run.started_at), run.id
+
+
+class ShardedStore(Store):
+    """
+    Spreads runs over several stores; every run lives entirely in one shard.
+
+    The owning shard is always crc32(run_id) % len(shards), so run-scoped calls
+    (add_step, list_steps, diff, export, ...) go straight to one shard without a
+    lookup table. With by="project", create_run() draws run ids that hash to the
+    project's shard, keeping a project's runs together. Cross-shard reads (list_runs,
+    search_steps, stats) query every shard in parallel; list_runs k-way merges the
+    per-shard pages, so ordering and cursors behave as on a single store. The shard
+    list, its order and `by` must not change once runs are written.
+    """
+
+    def __init__(
+        self, shards: Sequence[Store], by: ShardBy = "run_id", max_workers: Optional[int] = None
+    ) -> None:
+        if not shards:
+            raise ValueError("ShardedStore needs at least one shard")
+        if by not in ("run_id", "project"):
+            raise ValueError(f"Unknown sharding key: {by}")
+        self.shards = list(shards)
+        self.by = by
+        self.max_workers = max_workers or len(self.shards)
+        self._reset_runtime()
+
+    def _reset_runtime(self) -> None:
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    _RUNTIME = ("_pool",)
+
+    # -- layouts on disk --
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        shards: int = 4,
+        by: ShardBy = "run_id",
+        backend: Literal["sqlite", "log"] = "sqlite",
+    ) -> "ShardedStore":
+        """Write a layout of `shards` new stores under directory `path` and open it."""
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            raise FileExistsError(f"A sharded layout already exists in {path}")
+        os.makedirs(path, exist_ok=True)
+        pattern = "shard-{:03d}.db" if backend == "sqlite" else "log:shard-{:03d}"
+        specs = [pattern.format(i) for i in range(shards)]
+        with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"by": by, "shards": specs}, f, indent=2)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "ShardedStore":
+        """
+        Open the layout in `path` (what `--db shards:<dir>` does). Its shards.json lists
+        the shards as --db specs; relative paths are resolved against `path`.
+        """
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        def resolve(spec: str) -> str:
+            if spec.startswith("remote:"):
+                return spec
+            prefix = "log:" if spec.startswith("log:") else ""
+            return prefix + os.path.join(path, spec[len(prefix):])
+
+        stores = [open_store(resolve(s)) for s in manifest["shards"]]
+        return cls(stores, by=manifest.get("by", "run_id"))
+
+    # -- routing --
+
+    def shard_for(self, run_id: str) -> Store:
+        return self.shards[_slot(run_id, len(self.shards))]
+
+    def _new_run_id(self, meta: Dict[str, Any]) -> str:
+        if self.by != "project" or len(self.shards) == 1:
+            return str(uuid.uuid4())
+        target = _slot(str(meta.get("project", "default")), len(self.shards))
+        while True:  # about len(shards) draws
+            run_id = str(uuid.uuid4())
+            if _slot(run_id, len(self.shards)) == target:
+                return run_id
+
+    def _all(self, fn: Callable[[Store], T], shards: Optional[List[Store]] = None) -> List[T]:
+        shards = self.shards if shards is None else shards
+        if len(shards) == 1:
+            return [fn(shards[0])]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="agentreplay-shard"
+            )
+        return list(self._pool.map(fn, shards))
+
+    # -- lifecycle --
+
+    def init(self) -> None:
+        self._all(lambda s: s.init())
+
+    def close(self) -> None:
+        self._all(lambda s: s.close())
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def flush(self) -> None:
+        self._all(lambda s: s.flush())
+
+    def instrument(self, metrics: Metrics) -> None:
+        for s in self.shards:
+            s.instrument(metrics)
+
+    # -- writes (routed) --
+
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        run_id = run_id or self._new_run_id(meta or {})
+        return self.shard_for(run_id).create_run(name, started_at, meta, run_id)
+
+    def end_run(self, run_id: str, ended_at: datetime) -> None:
+        self.shard_for(run_id).end_run(run_id, ended_at)
+
+    def add_step(
+        self,
+        run_id: str,
+        idx: int,
+        kind: str,
+        name: str,
+        ts: datetime,
+        input: Dict[str, Any],
+        output: Dict[str, Any],
+        error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
+    ) -> str:
+        return self.shard_for(run_id).add_step(
+            run_id, idx, kind, name, ts, input, output, error, duration_us
+        )
+
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        # consecutive steps of the same shard (typically: all of them) stream into one call
+        n = len(self.shards)
+        ids: List[str] = []
+        for slot, group in itertools.groupby(steps, key=lambda s: _slot(s.run_id, n)):
+            ids.extend(self.shards[slot].add_steps(group))
+        return ids
+
+    def delete_run(self, run_id: str) -> None:
+        self.shard_for(run_id).delete_run(run_id)
+
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        return sum(self._all(lambda s: s.compact(max_pages)))
+
+    # -- run-scoped reads (routed) --
+
+    def get_run(self, run_id: str) -> Run:
+        owner = self.shard_for(run_id)
+        try:
+            return owner.get_run(run_id)
+        except KeyError:
+            pass
+
+        # e.g. a run copied into the wrong shard by hand: ask the others
+        def lookup(s: Store) -> Optional[Run]:
+            try:
+                return s.get_run(run_id)
+            except KeyError:
+                return None
+
+        for run in self._all(lookup, [s for s in self.shards if s is not owner]):
+            if run is not None:
+                return run
+        raise KeyError(f"Run not found: {run_id}")
+
+    def list_steps(self, run_id: str) -> List[Step]:
+        return self.shard_for(run_id).list_steps(run_id)
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[Step]:
+        return self.shard_for(run_id).iter_steps(run_id, kinds=kinds, start_idx=start_idx)
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        return self.shard_for(run_id).iter_fingerprints(run_id)
+
+    def run_bytes(self, run_id: str) -> int:
+        return self.shard_for(run_id).run_bytes(run_id)
+
+    # -- federated reads --
+
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        pages = self._all(
+            lambda s: s.list_runs(limit, project, name, since, until, has_error, cursor)
+        )
+        return list(itertools.islice(heapq.merge(*pages, key=_order, reverse=True), limit))
+
+    def search_steps(
+        self,
+        query: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        error_type: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> List[Tuple[str, int]]:
+        shards = [self.shard_for(run_id)] if run_id else self.shards
+        hits = self._all(
+            lambda s: s.search_steps(query, kind, name, error_type, run_id, limit, raw), shards
+        )
+        return list(itertools.islice(itertools.chain.from_iterable(hits), limit))
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"shards": len(self.shards)}
+        for stats in self._all(lambda s: s.stats()):
+            for k, v in stats.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out[k] = out.get(k, 0) + v
+        return out
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import sqlite3
+import threading
+import time
 import uuid
+import weakref
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
-from .models import Run, Step
-from .store import Store
+from .compression import Codec, get_codec
+from .canonical import loads, payload_texts
+from .fingerprint import fingerprint_canonical
+from .metrics import Metrics
+from .models import LazyStep, Run, Step
+from .store import Store, parse_run_cursor
 
 
 def _utcnow() -> datetime:
@@ -25,15 +34,200 @@ def _from_iso(s: str) -> datetime:
     return datetime.fromisoformat(s)
 
 
+_INSERT_STEP = """
+INSERT INTO steps(
+  id, run_id, idx, kind, name, ts, input_json, output_json, error_json, codec, fingerprint,
+  error_type, duration_us, canonical
+) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,1)
+"""
+
+
+# A deduplicated payload column holds this prefix + the sha256 of the payload text.
+# JSON text can never start with "b", so plain and referenced payloads can't collide.
+_BLOB_PREFIX = "blob:"
+
+_UPSERT_BLOB = """
+INSERT INTO blobs(hash, data, size, refs, codec) VALUES(?,?,?,?,?)
+ON CONFLICT(hash) DO UPDATE SET refs = refs + excluded.refs
+"""
+
+
+_INSERT_FTS = """
+INSERT INTO steps_fts(rowid, body) VALUES((SELECT rowid FROM steps WHERE id=?), ?)
+"""
+
+
+def _search_text(obj: Any, out: List[str]) -> None:
+    # keys and scalar leaves, unescaped, so FTS sees real words (JSON text escapes unicode)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            out.append(str(k))
+            _search_text(v, out)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _search_text(v, out)
+    elif obj is not None:
+        out.append(str(obj))
+
+
+class _Batch:
+    """Side rows (dedup blobs, search index) gathered while encoding one write transaction."""
+
+    __slots__ = ("blobs", "fts", "error_runs")
+
+    def __init__(self) -> None:
+        self.blobs: Dict[str, List[Any]] = {}
+        self.fts: List[Tuple[str, str]] = []
+        self.error_runs: Set[str] = set()
+
+
+def _ensure_column(c: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    # table_xinfo also lists generated columns
+    cols = {r[1] for r in c.execute(f"PRAGMA table_xinfo({table})")}
+    if column in cols:
+        return False
+    c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def _row_to_run(r: sqlite3.Row) -> Run:
+    return Run(
+        id=r["id"],
+        name=r["name"],
+        started_at=_from_iso(r["started_at"]),
+        ended_at=_from_iso(r["ended_at"]) if r["ended_at"] else None,
+        meta=json.loads(r["meta_json"] or "{}"),
+    )
+
+
+class _ThreadConn:
+    # held in a threading.local: when the thread ends, this goes away and its
+    # finalizer closes the connection
+    __slots__ = ("conn", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int) -> None:
+        self.conn = conn
+        self.generation = generation
+
+
+def _release(conns: Dict[int, sqlite3.Connection], key: int, conn: sqlite3.Connection) -> None:
+    # may run from the garbage collector while _lock is held: dict.pop is atomic on its own
+    conns.pop(key, None)
+    conn.close()
+
+
 class SQLiteStore(Store):
-    def __init__(self, path: str = "agentreplay.db") -> None:
+    """
+    SQLite-backed store.
+
+    Connections are long-lived and per-thread: each thread lazily opens one connection
+    (WAL journal, tuned pragmas, statement cache) and reuses it for every call until
+    close(). In WAL mode readers (CLI listings, diffs) don't block live writers.
+
+    With dedup=True, payloads of at least dedup_min_bytes are stored once in a
+    content-addressed, reference-counted `blobs` table and steps refer to them by hash.
+    Reads resolve references transparently, whatever the dedup setting.
+
+    With compression="zlib" | "lzma" | "zstd", payloads of at least compress_min_bytes are
+    stored compressed (as BLOBs); smaller ones stay plain JSON text. Each row records its
+    codec, so databases written with other settings (or none) stay readable, and
+    recompress() migrates existing rows in place.
+
+    With search=True an FTS5 index over payload text is created; once a database has
+    it, every writer keeps it in sync (stores opened earlier notice it through the
+    schema version on their next write or search). search_steps() combines it with
+    the indexed kind/name/error_type columns.
+    """
+
+    # rows fetched per round-trip by iter_steps()
+    page_size = 500
+
+    def __init__(
+        self,
+        path: str = "agentreplay.db",
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 16 * 1024,
+        mmap_size: int = 256 * 1024 * 1024,
+        busy_timeout: float = 30.0,
+        dedup: bool = False,
+        dedup_min_bytes: int = 1024,
+        compression: Optional[str] = None,
+        compress_min_bytes: int = 512,
+        search: bool = False,
+    ) -> None:
         self.path = path
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.dedup = dedup
+        self.dedup_min_bytes = dedup_min_bytes
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.search = search
+        self._fts = search
+        self._blob_cache_size = 256
+        self._reset_runtime()
 
-    def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path)
+    def _reset_runtime(self) -> None:
+        self._codec = get_codec(self.compression) if self.compression else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # live connections only: each is closed when its thread's _ThreadConn goes away
+        self._conns: Dict[int, sqlite3.Connection] = {}
+        self._generation = 0
+        self._blob_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._decoders: Dict[Optional[str], Callable[[Any], Any]] = {}
+        self._texters: Dict[Optional[str], Callable[[Any], str]] = {}
+        # metrics are process-local: instrument() again after unpickling
+        self._schema_version: Optional[int] = None
+        self.__dict__.pop("_step_row", None)
+
+    # Picklable (e.g. for process pools): only configuration crosses the boundary and
+    # the receiving process opens its own connections.
+    _RUNTIME = (
+        "_codec", "_local", "_lock", "_conns", "_generation", "_blob_cache", "_decoders",
+        "_texters", "_step_row", "_schema_version",
+    )
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=256,
+        )
         conn.row_factory = sqlite3.Row
+        # must precede the first write to take effect, so it only applies to brand-new
+        # databases; see enable_incremental_vacuum() for existing ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
         return conn
 
+    def _conn(self) -> sqlite3.Connection:
+        held = getattr(self._local, "held", None)
+        if held is None or held.generation != self._generation:
+            conn = self._open()
+            with self._lock:
+                held = _ThreadConn(conn, self._generation)
+                self._conns[id(held)] = conn
+                weakref.finalize(held, _release, self._conns, id(held), conn)
+            # dropping the previous one (if stale) releases it right away
+            self._local.held = held
+        return held.conn
+
+    def close(self) -> None:
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+            self._generation += 1
+        for conn in conns:
+            conn.close()
+
     def init(self) -> None:
         with self._conn() as c:
             c.execute(
@@ -64,9 +258,251 @@ class SQLiteStore(Store):
                 """
             )
             c.execute("CREATE INDEX IF NOT EXISTS idx_steps_run ON steps(run_id, idx);")
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                  hash TEXT PRIMARY KEY,
+                  data TEXT NOT NULL,
+                  size INTEGER NOT NULL,
+                  refs INTEGER NOT NULL,
+                  codec TEXT NULL
+                );
+                """
+            )
+            # columns added after v0.1; older databases are migrated in place
+            _ensure_column(c, "steps", "codec", "TEXT NULL")
+            _ensure_column(c, "blobs", "codec", "TEXT NULL")
+            _ensure_column(c, "steps", "fingerprint", "TEXT NULL")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_steps_fp ON steps(fingerprint);")
+            _ensure_column(c, "steps", "error_type", "TEXT NULL")
+            # 1 = payload text is canonical() output (rows written before are not)
+            _ensure_column(c, "steps", "canonical", "INTEGER NOT NULL DEFAULT 0")
+            _ensure_column(c, "steps", "duration_us", "INTEGER NULL")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_steps_kind ON steps(kind, name, error_type);")
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_steps_error ON steps(error_type)"
+                " WHERE error_type IS NOT NULL;"
+            )
+            _ensure_column(
+                c, "runs", "project",
+                "TEXT GENERATED ALWAYS AS (json_extract(meta_json, '$.project')) VIRTUAL",
+            )
+            if _ensure_column(c, "runs", "has_error", "INTEGER NOT NULL DEFAULT 0"):
+                c.execute(
+                    "UPDATE runs SET has_error=1 WHERE id IN"
+                    " (SELECT DISTINCT run_id FROM steps WHERE error_json IS NOT NULL)"
+                )
+            c.execute("CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at, id);")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_runs_name ON runs(name, started_at, id);")
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_runs_project ON runs(project, started_at, id);"
+            )
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_runs_errors ON runs(started_at, id)"
+                " WHERE has_error=1;"
+            )
+            if self.search:
+                c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS steps_fts USING fts5(body);")
+            self._fts = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='steps_fts'"
+            ).fetchone() is not None
+
+    def _check_fts(self) -> None:
+        # another process may have created the index since init(); PRAGMA schema_version
+        # is a header read, so this stays cheap until the schema actually changes
+        if self._fts:
+            return
+        c = self._conn()
+        version = c.execute("PRAGMA schema_version").fetchone()[0]
+        if version != self._schema_version:
+            self._schema_version = version
+            self._fts = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='steps_fts'"
+            ).fetchone() is not None
+
+    # -- payload encoding --
+
+    def _pack(self, text: str, codec: Optional[Codec]) -> Any:
+        if codec is None or len(text) < self.compress_min_bytes:
+            return text
+        return codec.compress(text.encode("utf-8"))
+
+    def _encode(self, text: str, batch: _Batch) -> Any:
+        if not self.dedup or len(text) < self.dedup_min_bytes:
+            return self._pack(text, self._codec)
+        h = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        entry = batch.blobs.get(h)
+        if entry is None:
+            batch.blobs[h] = [text, 1]
+        else:
+            entry[1] += 1
+        return _BLOB_PREFIX + h
+
+    def _step_row(self, s: Step, batch: _Batch) -> Tuple[Any, ...]:
+        if self._fts:
+            words: List[str] = [s.name]
+            for payload in (s.input, s.output, s.error):
+                _search_text(payload, words)
+            batch.fts.append((s.id, " ".join(words)))
+        error_type = None
+        if s.error is not None:
+            batch.error_runs.add(s.run_id)
+            error_type = s.error.get("type") if isinstance(s.error, dict) else None
+        # each payload is serialized once (or not at all when the step already carries
+        # canonical text); the fingerprint hashes the same text
+        inp, out, err = payload_texts(s)
+        return (
+            s.id,
+            s.run_id,
+            s.idx,
+            s.kind,
+            s.name,
+            _to_iso(s.ts),
+            self._encode(inp, batch),
+            self._encode(out, batch),
+            None if err is None else self._encode(err, batch),
+            self.compression,
+            s.fingerprint or fingerprint_canonical(s.kind, s.name, inp, out, err),
+            None if error_type is None else str(error_type),
+            s.duration_us,
+        )
 
-    def create_run(self, name: str, started_at: datetime, meta: Dict[str, Any]) -> str:
-        run_id = str(uuid.uuid4())
+    def instrument(self, metrics: Metrics) -> None:
+        plain = SQLiteStore._step_row.__get__(self)
+        observe, count_bytes, clock = metrics.observe, metrics.count_bytes, time.perf_counter_ns
+
+        def timed_step_row(s: Step, batch: _Batch) -> Tuple[Any, ...]:
+            t0 = clock()
+            row = plain(s, batch)
+            observe("serialization", clock() - t0)
+            count_bytes(s.kind, sum(len(v) for v in row[6:9] if v is not None))
+            return row
+
+        self._step_row = timed_step_row  # type: ignore[method-assign]
+
+    def _finish_batch(self, c: sqlite3.Connection, batch: _Batch) -> None:
+        if batch.blobs:
+            c.executemany(
+                _UPSERT_BLOB,
+                [
+                    (h, self._pack(t, self._codec), len(t), n, self.compression)
+                    for h, (t, n) in batch.blobs.items()
+                ],
+            )
+        if batch.fts:
+            c.executemany(_INSERT_FTS, batch.fts)
+        if batch.error_runs:
+            c.executemany(
+                "UPDATE runs SET has_error=1 WHERE id=? AND has_error=0",
+                [(r,) for r in batch.error_runs],
+            )
+
+    @staticmethod
+    def _unpack(value: Any, codec: Optional[str]) -> str:
+        if isinstance(value, bytes):
+            if codec is None:
+                raise ValueError("Compressed payload without a codec marker")
+            return get_codec(codec).decompress(value).decode("utf-8")
+        return value
+
+    def _blob_text(self, h: str) -> str:
+        with self._lock:
+            text = self._blob_cache.get(h)
+            if text is not None:
+                self._blob_cache.move_to_end(h)
+                return text
+        row = self._conn().execute("SELECT data, codec FROM blobs WHERE hash=?", (h,)).fetchone()
+        if row is None:
+            raise KeyError(f"Payload blob not found: {h}")
+        text = self._unpack(row[0], row[1])
+        with self._lock:
+            self._blob_cache[h] = text
+            if len(self._blob_cache) > self._blob_cache_size:
+                self._blob_cache.popitem(last=False)
+        return text
+
+    def _text(self, raw: Any, codec: Optional[str]) -> str:
+        if isinstance(raw, str) and raw.startswith(_BLOB_PREFIX):
+            return self._blob_text(raw[len(_BLOB_PREFIX):])
+        return self._unpack(raw, codec)
+
+    def _decoder(self, codec: Optional[str]) -> Callable[[Any], Any]:
+        # one bound decoder per codec, shared by every LazyStep of that codec
+        dec = self._decoders.get(codec)
+        if dec is None:
+            def dec(raw: Any) -> Any:
+                return loads(self._text(raw, codec))
+
+            self._decoders[codec] = dec
+        return dec
+
+    def _texter(self, codec: Optional[str]) -> Callable[[Any], str]:
+        fn = self._texters.get(codec)
+        if fn is None:
+            def fn(raw: Any) -> str:
+                return self._text(raw, codec)
+
+            self._texters[codec] = fn
+        return fn
+
+    def recompress(self, codec: Optional[str], batch_size: int = 1000) -> int:
+        """
+        Rewrite stored payloads (steps and blobs) with `codec` (None = plain JSON text),
+        honouring compress_min_bytes. Runs in short transactions so live writers can
+        interleave. Returns the number of step rows rewritten.
+        """
+        target = get_codec(codec) if codec else None
+        c = self._conn()
+        rewritten = 0
+        last_rowid = 0
+        while True:
+            rows = c.execute(
+                "SELECT rowid, input_json, output_json, error_json, codec FROM steps"
+                " WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for rowid, *values, row_codec in rows:
+                packed = [
+                    v if v is None or (isinstance(v, str) and v.startswith(_BLOB_PREFIX))
+                    else self._pack(self._unpack(v, row_codec), target)
+                    for v in values
+                ]
+                updates.append((*packed, codec, rowid))
+            with c:
+                c.executemany(
+                    "UPDATE steps SET input_json=?, output_json=?, error_json=?, codec=?"
+                    " WHERE rowid=?",
+                    updates,
+                )
+            rewritten += len(rows)
+            last_rowid = rows[-1][0]
+
+        last_rowid = 0
+        while True:
+            blob_rows = c.execute(
+                "SELECT rowid, data, codec FROM blobs WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
+            ).fetchall()
+            if not blob_rows:
+                break
+            with c:
+                c.executemany(
+                    "UPDATE blobs SET data=?, codec=? WHERE rowid=?",
+                    [
+                        (self._pack(self._unpack(data, old), target), codec, rowid)
+                        for rowid, data, old in blob_rows
+                    ],
+                )
+            last_rowid = blob_rows[-1][0]
+        return rewritten
+
+    def create_run(
+        self, name: str, started_at: datetime, meta: Dict[str, Any], run_id: Optional[str] = None
+    ) -> str:
+        run_id = run_id or str(uuid.uuid4())
         with self._conn() as c:
             c.execute(
                 "INSERT INTO runs(id, name, started_at, ended_at, meta_json) VALUES(?,?,?,?,?)",
@@ -88,74 +524,302 @@ class SQLiteStore(Store):
         input: Dict[str, Any],
         output: Dict[str, Any],
         error: Optional[Dict[str, Any]],
+        duration_us: Optional[int] = None,
     ) -> str:
-        step_id = str(uuid.uuid4())
+        step = Step(
+            id=str(uuid.uuid4()),
+            run_id=run_id,
+            idx=idx,
+            kind=kind,  # type: ignore[arg-type]
+            name=name,
+            ts=ts,
+            input=input,
+            output=output,
+            error=error,
+            duration_us=duration_us,
+        )
+        self._check_fts()
+        batch = _Batch()
+        row = self._step_row(step, batch)
         with self._conn() as c:
-            c.execute(
-                """
-                INSERT INTO steps(
-                  id, run_id, idx, kind, name, ts, input_json, output_json, error_json
-                ) VALUES(?,?,?,?,?,?,?,?,?)
-                """,
-                (
-                    step_id,
-                    run_id,
-                    idx,
-                    kind,
-                    name,
-                    _to_iso(ts),
-                    json.dumps(input or {}),
-                    json.dumps(output or {}),
-                    None if error is None else json.dumps(error),
-                ),
+            c.execute(_INSERT_STEP, row)
+            self._finish_batch(c, batch)
+        return step.id
+
+    def add_steps(self, steps: Iterable[Step]) -> List[str]:
+        ids: List[str] = []
+        self._check_fts()
+        batch = _Batch()
+
+        def rows():
+            for s in steps:
+                ids.append(s.id)
+                yield self._step_row(s, batch)
+
+        # executemany over a generator: one transaction, one commit, bounded memory
+        with self._conn() as c:
+            c.executemany(_INSERT_STEP, rows())
+            self._finish_batch(c, batch)
+        return ids
+
+    def delete_run(self, run_id: str) -> None:
+        self._check_fts()
+        with self._conn() as c:
+            refs: Dict[str, int] = {}
+            for row in c.execute(
+                "SELECT input_json, output_json, error_json FROM steps WHERE run_id=?", (run_id,)
+            ):
+                for value in row:
+                    if isinstance(value, str) and value.startswith(_BLOB_PREFIX):
+                        h = value[len(_BLOB_PREFIX):]
+                        refs[h] = refs.get(h, 0) + 1
+            c.executemany(
+                "UPDATE blobs SET refs = refs - ? WHERE hash=?", [(n, h) for h, n in refs.items()]
             )
-        return step_id
+            c.executemany("DELETE FROM blobs WHERE hash=? AND refs <= 0", [(h,) for h in refs])
+            if self._fts:
+                c.execute(
+                    "DELETE FROM steps_fts WHERE rowid IN (SELECT rowid FROM steps WHERE run_id=?)",
+                    (run_id,),
+                )
+            c.execute("DELETE FROM steps WHERE run_id=?", (run_id,))
+            c.execute("DELETE FROM runs WHERE id=?", (run_id,))
+
+    def run_bytes(self, run_id: str) -> int:
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(LENGTH(input_json) + LENGTH(output_json)"
+            " + COALESCE(LENGTH(error_json), 0)), 0) FROM steps WHERE run_id=?",
+            (run_id,),
+        ).fetchone()
+        return int(row[0])
+
+    def compact(self, max_pages: Optional[int] = None, chunk: int = 256) -> int:
+        """
+        Return free pages to the filesystem with PRAGMA incremental_vacuum, `chunk` pages
+        per statement so each write lock is short. No-op unless auto_vacuum=INCREMENTAL.
+        """
+        c = self._conn()
+        if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        freed = 0
+        while max_pages is None or freed < max_pages:
+            free = c.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                break
+            n = min(chunk, free) if max_pages is None else min(chunk, free, max_pages - freed)
+            c.execute(f"PRAGMA incremental_vacuum({int(n)})").fetchall()
+            step = free - c.execute("PRAGMA freelist_count").fetchone()[0]
+            if step <= 0:
+                break
+            freed += step
+        return freed
+
+    def enable_incremental_vacuum(self) -> None:
+        """One-off conversion of an existing database (a full VACUUM, holding the write lock)."""
+        c = self._conn()
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        c.execute("VACUUM")
+
+    def stats(self) -> Dict[str, Any]:
+        c = self._conn()
+        runs = c.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        steps, payload_bytes = c.execute(
+            """
+            SELECT COUNT(*),
+                   COALESCE(SUM(LENGTH(input_json) + LENGTH(output_json)
+                                + COALESCE(LENGTH(error_json), 0)), 0)
+            FROM steps
+            """
+        ).fetchone()
+        blobs, blob_bytes, blob_refs, saved = c.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refs), 0),"
+            " COALESCE(SUM(size * (refs - 1)), 0) FROM blobs"
+        ).fetchone()
+        return {
+            "runs": runs,
+            "steps": steps,
+            "payload_bytes": payload_bytes,
+            "blobs": blobs,
+            "blob_bytes": blob_bytes,
+            "blob_refs": blob_refs,
+            "dedup_saved_bytes": saved,
+        }
 
     def get_run(self, run_id: str) -> Run:
         with self._conn() as c:
             row = c.execute("SELECT * FROM runs WHERE id=?", (run_id,)).fetchone()
             if not row:
                 raise KeyError(f"Run not found: {run_id}")
-            return Run(
-                id=row["id"],
-                name=row["name"],
-                started_at=_from_iso(row["started_at"]),
-                ended_at=_from_iso(row["ended_at"]) if row["ended_at"] else None,
-                meta=json.loads(row["meta_json"] or "{}"),
-            )
+            return _row_to_run(row)
 
-    def list_runs(self, limit: int = 50) -> List[Run]:
-        with self._conn() as c:
-            rows = c.execute(
-                "SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (int(limit),)
-            ).fetchall()
-            return [
-                Run(
-                    id=r["id"],
-                    name=r["name"],
-                    started_at=_from_iso(r["started_at"]),
-                    ended_at=_from_iso(r["ended_at"]) if r["ended_at"] else None,
-                    meta=json.loads(r["meta_json"] or "{}"),
-                )
-                for r in rows
-            ]
+    def list_runs(
+        self,
+        limit: int = 50,
+        project: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_error: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Run]:
+        where: List[str] = []
+        args: List[Any] = []
+        if project is not None:
+            where.append("project=?")
+            args.append(project)
+        if name is not None:
+            where.append("name=?")
+            args.append(name)
+        if since is not None:
+            where.append("started_at>=?")
+            args.append(_to_iso(since))
+        if until is not None:
+            where.append("started_at<?")
+            args.append(_to_iso(until))
+        if has_error is not None:
+            # literal, so the planner can use the partial idx_runs_errors index
+            where.append("has_error=1" if has_error else "has_error=0")
+        if cursor is not None:
+            where.append("(started_at, id) < (?, ?)")
+            args.extend(parse_run_cursor(cursor))
+        sql = "SELECT id, name, started_at, ended_at, meta_json FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY started_at DESC, id DESC LIMIT ?"
+        args.append(int(limit))
+        return [_row_to_run(r) for r in self._conn().execute(sql, args)]
 
     def list_steps(self, run_id: str) -> List[Step]:
-        with self._conn() as c:
+        return [s.to_step() for s in self.iter_steps(run_id)]
+
+    def iter_steps(
+        self,
+        run_id: str,
+        kinds: Optional[Sequence[str]] = None,
+        start_idx: Optional[int] = None,
+    ) -> Iterator[LazyStep]:
+        sql = (
+            "SELECT id, run_id, idx, kind, name, ts, input_json, output_json, error_json, codec,"
+            " fingerprint, canonical, duration_us FROM steps WHERE run_id=? AND idx>=?"
+        )
+        kind_args: Tuple[str, ...] = ()
+        if kinds is not None:
+            kind_args = tuple(kinds)
+            if not kind_args:
+                return
+            sql += " AND kind IN (" + ",".join("?" * len(kind_args)) + ")"
+        sql += " ORDER BY idx ASC LIMIT ?"
+
+        # Keyset pagination on idx: no cursor is held open between pages, so callers can
+        # write to the store while iterating.
+        next_idx = start_idx if start_idx is not None else -1
+        while True:
+            args = (run_id, next_idx, *kind_args, self.page_size)
+            rows = self._conn().execute(sql, args).fetchall()
+            for r in rows:
+                yield LazyStep(
+                    id=r[0],
+                    run_id=r[1],
+                    idx=int(r[2]),
+                    kind=r[3],
+                    name=r[4],
+                    ts=_from_iso(r[5]),
+                    raw_input=r[6] or None,
+                    raw_output=r[7] or None,
+                    raw_error=r[8] or None,
+                    decode=self._decoder(r[9]),
+                    fingerprint=r[10],
+                    to_text=self._texter(r[9]) if r[11] else None,
+                    duration_us=r[12],
+                )
+            if len(rows) < self.page_size:
+                return
+            next_idx = int(rows[-1][2]) + 1
+
+    def iter_fingerprints(self, run_id: str) -> Iterator[Tuple[int, str, str, str]]:
+        sql = (
+            "SELECT idx, kind, name, fingerprint FROM steps"
+            " WHERE run_id=? AND idx>? ORDER BY idx ASC LIMIT ?"
+        )
+        last_idx = -1
+        while True:
+            rows = self._conn().execute(sql, (run_id, last_idx, self.page_size)).fetchall()
+            for idx, kind, name, fp in rows:
+                if fp is None:  # legacy row: hash its payloads once
+                    fp = next(self.iter_steps(run_id, start_idx=idx)).fingerprint
+                yield int(idx), kind, name, fp
+            if len(rows) < self.page_size:
+                return
+            last_idx = int(rows[-1][0])
+
+    def search_steps(
+        self,
+        query: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        error_type: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> List[Tuple[str, int]]:
+        where: List[str] = []
+        args: List[Any] = []
+        if query:
+            self._check_fts()
+            if not self._fts:
+                raise RuntimeError(
+                    "Full-text search is not enabled; open the store with search=True"
+                )
+            where.append("s.rowid IN (SELECT rowid FROM steps_fts WHERE steps_fts MATCH ?)")
+            # plain text is one quoted phrase, so "foo-bar", "a AND" or a stray quote
+            # are searched for rather than parsed as FTS5 syntax
+            args.append(query if raw else '"' + query.replace('"', '""') + '"')
+        filters = (("kind", kind), ("name", name), ("error_type", error_type), ("run_id", run_id))
+        for col, value in filters:
+            if value is not None:
+                where.append(f"s.{col}=?")
+                args.append(value)
+        sql = "SELECT s.run_id, s.idx FROM steps s"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY s.rowid DESC LIMIT ?"
+        args.append(int(limit))
+        return [(r[0], int(r[1])) for r in self._conn().execute(sql, args)]
+
+    def reindex_search(self, batch_size: int = 1000) -> int:
+        """
+        (Re)build the full-text index, and the error_type column, from stored steps.
+        Returns the number of steps indexed.
+        """
+        c = self._conn()
+        with c:
+            c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS steps_fts USING fts5(body);")
+            c.execute("DELETE FROM steps_fts")
+        self._fts = True
+        n = 0
+        last_rowid = 0
+        while True:
             rows = c.execute(
-                "SELECT * FROM steps WHERE run_id=? ORDER BY idx ASC", (run_id,)
+                "SELECT rowid, name, input_json, output_json, error_json, codec FROM steps"
+                " WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
             ).fetchall()
-            return [
-                Step(
-                    id=r["id"],
-                    run_id=r["run_id"],
-                    idx=int(r["idx"]),
-                    kind=r["kind"],
-                    name=r["name"],
-                    ts=_from_iso(r["ts"]),
-                    input=json.loads(r["input_json"] or "{}"),
-                    output=json.loads(r["output_json"] or "{}"),
-                    error=json.loads(r["error_json"]) if r["error_json"] else None,
-                )
-                for r in rows
-            ]
+            if not rows:
+                return n
+            fts = []
+            error_types = []
+            for rowid, name, *payloads, codec in rows:
+                words: List[str] = [name]
+                decoded = [
+                    None if raw is None else loads(self._text(raw, codec)) for raw in payloads
+                ]
+                for payload in decoded:
+                    _search_text(payload, words)
+                fts.append((rowid, " ".join(words)))
+                if isinstance(decoded[2], dict) and decoded[2].get("type") is not None:
+                    error_types.append((str(decoded[2]["type"]), rowid))
+            with c:
+                c.executemany("INSERT INTO steps_fts(rowid, body) VALUES(?, ?)", fts)
+                c.executemany("UPDATE steps SET error_type=? WHERE rowid=?", error_types)
+            n += len(rows)
+            last_rowid = rows[-1][0]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import io
+import time
+from array import array
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Tuple,
+)
+
+# key of the chunk layout inside a streamed llm step's output
+STREAM_KEY = "stream"
+
+
+class LLMStream:
+    """
+    Collects a streamed LLM response into a single step's output:
+
+        {"text": <full text>, ...extra, "stream": {"chunks": n, "ttft_us": t,
+         "lens": [chars per chunk], "gaps_us": [µs since the previous chunk]}}
+
+    The text is kept once; per-chunk bookkeeping is two integer arrays. Past
+    `max_chunks` entries, adjacent entries are merged pairwise (and later chunks
+    are grouped at the same resolution), so long generations cost a bounded amount
+    beyond the text itself. Set fields such as usage or finish_reason on `extra`.
+    """
+
+    def __init__(
+        self, max_chunks: int = 4096, clock: Callable[[], int] = time.perf_counter_ns
+    ) -> None:
+        self.max_chunks = max(2, max_chunks)
+        self.extra: Dict[str, Any] = {}
+        self._clock = clock
+        self._text = io.StringIO()
+        self._lens = array("Q")
+        self._gaps = array("Q")
+        self._group = 1  # raw chunks per entry
+        self._pending = [0, 0, 0]  # chars, ns, raw chunks of the entry being filled
+        self._chunks = 0
+        self._ttft_ns: Optional[int] = None
+        self._started = self._last = clock()
+
+    def add(self, chunk: str) -> None:
+        now = self._clock()
+        if self._ttft_ns is None:
+            self._ttft_ns = now - self._started
+        self._text.write(chunk)
+        self._chunks += 1
+        p = self._pending
+        p[0] += len(chunk)
+        p[1] += now - self._last
+        p[2] += 1
+        self._last = now
+        if p[2] == self._group:
+            self._push()
+
+    def wrap(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Pass chunks through to the caller while recording them."""
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    async def awrap(self, chunks: AsyncIterable[str]) -> AsyncIterator[str]:
+        async for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    def _push(self) -> None:
+        chars, ns, _ = self._pending
+        self._lens.append(chars)
+        self._gaps.append(ns // 1000)
+        self._pending = [0, 0, 0]
+        if len(self._lens) > self.max_chunks:
+            lens, gaps = self._lens, self._gaps
+            # a merged entry is emitted when its later half arrived: gaps add up
+            self._lens = array("Q", (sum(lens[i:i + 2]) for i in range(0, len(lens), 2)))
+            self._gaps = array("Q", (sum(gaps[i:i + 2]) for i in range(0, len(gaps), 2)))
+            self._group *= 2
+
+    def elapsed_us(self) -> int:
+        """Time since the stream was opened."""
+        return (self._clock() - self._started) // 1000
+
+    @property
+    def text(self) -> str:
+        return self._text.getvalue()
+
+    def to_output(self) -> Dict[str, Any]:
+        if self._pending[2]:
+            self._push()
+        return {
+            "text": self.text,
+            **self.extra,
+            STREAM_KEY: {
+                "chunks": self._chunks,
+                "ttft_us": None if self._ttft_ns is None else self._ttft_ns // 1000,
+                "lens": self._lens.tolist(),
+                "gaps_us": self._gaps.tolist(),
+            },
+        }
+
+
+def iter_stream_chunks(output: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """
+    (chunk, seconds since the previous chunk) from a step recorded with LLMStream.
+    Chunk boundaries refer to the text as recorded; if redaction changed its length,
+    the last chunk takes whatever is left. Outputs without chunk data yield the text once.
+    """
+    text = output.get("text") or ""
+    layout = output.get(STREAM_KEY)
+    if not layout or not layout.get("lens"):
+        if text:
+            yield text, 0.0
+        return
+    pos = 0
+    lens, gaps = layout["lens"], layout["gaps_us"]
+    last = len(lens) - 1
+    for i, n in enumerate(lens):
+        end = len(text) if i == last else pos + n
+        yield text[pos:end], gaps[i] / 1e6
+        pos = end
+
+
+def replay_stream(
+    output: Dict[str, Any],
+    speed: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[str]:
+    """
+    Re-emit a recorded stream's chunks: as fast as possible (speed=None), with the
+    original pacing (1.0) or scaled (2.0 = twice as fast).
+    """
+    for chunk, gap in iter_stream_chunks(output):
+        if speed and gap > 0:
+            sleep(gap / speed)
+        yield chunk
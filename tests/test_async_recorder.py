@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+import time
+
+from agentreplay import AsyncRecorder, SQLiteStore
+
+
+class GatedStore(SQLiteStore):
+    """Writer blocks until the gate opens, so the queue fills up."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.gate = threading.Event()
+
+    def add_steps(self, steps):
+        self.gate.wait()
+        return super().add_steps(steps)
+
+
+def test_arun_writes_steps_in_background(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = AsyncRecorder(store)
+
+    async def agent():
+        async with rec.arun("async") as r:
+            rec.llm("planner", input={"a": 1}, output={"b": 2})
+            rec.tool("t", input={"q": 1}, output={"ok": True})
+        await rec.aclose()
+        return r
+
+    r = asyncio.run(agent())
+    assert [s.name for s in store.list_steps(r.id)] == ["planner", "t"]
+    assert store.get_run(r.id).ended_at is not None
+
+
+def test_backpressure_policies(tmp_path):
+    store = GatedStore(str(tmp_path / "t.db"))
+    spill = AsyncRecorder(store, max_queue=2, backpressure="spill", batch_size=1)
+    with spill.run("spill") as r:
+        for i in range(20):
+            spill.tool("t", input={"i": i}, output={})
+        assert spill.spilled > 0
+        store.gate.set()
+    spill.close()
+    assert [s.idx for s in store.list_steps(r.id)] == list(range(20))
+
+    store.gate.clear()
+    drop = AsyncRecorder(store, max_queue=2, backpressure="drop_spans", batch_size=1)
+    with drop.run("drop") as r:
+        for i in range(10):
+            drop.span("s", input={"i": i})
+        store.gate.set()
+        drop.tool("t", input={}, output={})
+    drop.close()
+    assert drop.dropped > 0
+    assert store.list_steps(r.id)[-1].name == "t"
+
+
+def test_spilling_keeps_one_buffered_handle_and_drains_by_swapping(tmp_path):
+    store = GatedStore(str(tmp_path / "t.db"))
+    rec = AsyncRecorder(store, max_queue=2, backpressure="spill", batch_size=1)
+    with rec.run("spill") as r:
+        handles = set()
+        for i in range(30):
+            rec.tool("t", input={"i": i}, output={})
+            if rec._spill_file is not None:
+                handles.add(id(rec._spill_file))
+        assert rec.spilled > 0 and len(handles) == 1
+        store.gate.set()
+        rec.flush()
+        assert rec._spill_file is None and rec._spill_pending == 0
+        store.gate.clear()
+        for i in range(30, 40):
+            rec.tool("t", input={"i": i}, output={})
+        store.gate.set()
+    rec.close()
+    assert [s.idx for s in store.list_steps(r.id)] == list(range(40))
+    assert not os.path.exists(rec.spill_path) and not os.path.exists(rec.spill_path + ".draining")
+
+
+def test_ending_a_run_does_not_block_when_the_queue_is_full(tmp_path):
+    store = GatedStore(str(tmp_path / "t.db"))
+    for policy in ("spill", "drop_spans"):
+        store.gate.clear()
+        rec = AsyncRecorder(store, max_queue=2, backpressure=policy, batch_size=1)
+        ended = threading.Event()
+
+        def agent():
+            with rec.run(policy) as r:
+                rec.tool("t", input={}, output={})
+                while not rec._queue.empty():  # until the writer is stuck on it
+                    time.sleep(0.001)
+                rec.tool("t", input={}, output={})
+                rec.tool("t", input={}, output={})
+                assert rec._queue.full()
+            ended.set()
+            return r
+
+        r = agent()
+        assert ended.is_set()
+        store.gate.set()
+        rec.close()
+        assert store.get_run(r.id).ended_at is not None
+        assert len(store.list_steps(r.id)) == 3
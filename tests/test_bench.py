@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+from typer.testing import CliRunner
+
+from agentreplay.bench import run_suite
+from agentreplay.cli import app
+
+
+def test_bench_suite_reports_selected_benchmarks(tmp_path):
+    report = run_suite(200, only=["record", "diff", "export"], workdir=str(tmp_path))
+    assert report["steps"] == 200
+    assert set(report["results"]) == {"setup", "record", "diff", "export"}
+    assert report["results"]["diff"]["identical"]["steps"] == 200
+    assert report["results"]["export"]["import"]["steps_per_s"] > 0
+
+
+def test_bench_cli_writes_json(tmp_path):
+    out = tmp_path / "bench.json"
+    args = ["bench", "--size", "100", "--only", "replay,reads", "--out", str(out)]
+    res = CliRunner().invoke(app, args)
+    assert res.exit_code == 0, res.output
+    data = json.loads(out.read_text())
+    assert set(data["results"]) == {"setup", "replay", "reads"}
+
+
+def test_cli_imports_bench_only_for_the_bench_command():
+    code = "import sys, agentreplay.cli; assert 'agentreplay.bench' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
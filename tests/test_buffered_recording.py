@@ -0,0 +1,72 @@
+import time
+from datetime import datetime, timezone
+
+from agentreplay import Recorder, SQLiteStore
+from agentreplay.models import Step
+from agentreplay.store import Store
+
+
+class FlakyStore(SQLiteStore):
+    failing = False
+
+    def add_steps(self, steps):
+        if self.failing:
+            raise ConnectionError("store down")
+        return super().add_steps(steps)
+
+
+def test_buffered_steps_flush_on_batch_and_run_exit(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store, batch_size=3, flush_interval=60)
+
+    with rec.run("buffered") as r:
+        for i in range(4):
+            rec.tool("t", input={"i": i}, output={"ok": True})
+        # first batch written, one step still pending
+        assert len(store.list_steps(r.id)) == 3
+
+    steps = store.list_steps(r.id)
+    assert [s.idx for s in steps] == [0, 1, 2, 3]
+    assert steps[3].input == {"i": 3}
+
+
+def test_flush_interval_is_honoured_while_the_run_is_idle(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store, batch_size=100, flush_interval=0.05)
+
+    with rec.run("idle") as r:
+        rec.tool("t", input={"i": 0}, output={})
+        # e.g. a long LLM call: no further step is recorded meanwhile
+        deadline = time.monotonic() + 5
+        while not store.list_steps(r.id) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [s.idx for s in store.list_steps(r.id)] == [0]
+        rec.tool("t", input={"i": 1}, output={})
+    assert [s.idx for s in store.list_steps(r.id)] == [0, 1]
+
+
+def test_background_flush_failures_are_counted_and_the_buffer_is_capped(tmp_path):
+    store = FlakyStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store, batch_size=100, flush_interval=60, max_pending=3)
+
+    with rec.run("flaky") as r:
+        for i in range(5):
+            rec.tool("t", input={"i": i}, output={})
+        assert rec.dropped == 2
+
+        store.failing = True
+        rec.flush_interval = 0
+        rec._flush_due()
+        assert rec.write_errors == 1 and isinstance(rec.last_error, ConnectionError)
+        store.failing = False
+    assert [s.input["i"] for s in store.list_steps(r.id)] == [0, 1, 2]
+
+
+def test_default_add_steps_keeps_durations(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    now = datetime.now(timezone.utc)
+    run_id = store.create_run("r", started_at=now, meta={})
+    step = Step("s0", run_id, 0, "tool", "t", now, {}, {}, None, duration_us=1500)
+    Store.add_steps(store, [step])
+    assert store.list_steps(run_id)[0].duration_us == 1500
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+from agentreplay import Replayer, SQLiteStore, diff_runs
+from agentreplay.store_cache import CachingStore
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _run(store, n, pad=10):
+    run_id = store.create_run("r", started_at=NOW, meta={})
+    for i in range(n):
+        store.add_step(run_id, i, "tool", "t", NOW, {"i": i, "pad": "x" * pad}, {"ok": True}, None)
+    return run_id
+
+
+def test_hits_misses_and_write_invalidation(tmp_path):
+    store = CachingStore(SQLiteStore(str(tmp_path / "t.db")))
+    store.init()
+    a, b = _run(store, 3), _run(store, 3)
+
+    diff_runs(store, a, b)
+    Replayer(store).replay(a)
+    store.get_run(a)
+    store.get_run(a)
+    stats = store.cache_stats()
+    assert stats["misses"] == 3  # steps of a, steps of b, run a
+    assert stats["hits"] >= 2
+
+    store.add_step(a, 3, "tool", "t", NOW, {}, {}, None)
+    assert len(store.list_steps(a)) == 4
+    store.end_run(a, NOW)
+    assert store.get_run(a).ended_at == NOW
+
+
+def test_lru_is_bounded_by_memory(tmp_path):
+    inner = SQLiteStore(str(tmp_path / "t.db"))
+    inner.init()
+    runs = [_run(inner, 20, pad=2000) for _ in range(4)]
+    store = CachingStore(inner, max_bytes=100_000)
+
+    for run_id in runs:
+        store.list_steps(run_id)
+    stats = store.cache_stats()
+    assert stats["bytes"] <= 100_000
+    assert stats["evictions"] >= 2
+    assert store.cache_stats()["entries"] < 4
+
+    store.list_steps(runs[-1])
+    assert store.cache_stats()["hits"] == 1
+
+
+def test_runs_too_big_to_cache_are_streamed(tmp_path):
+    inner = SQLiteStore(str(tmp_path / "t.db"))
+    inner.init()
+    big, small = _run(inner, 50, pad=2000), _run(inner, 3)
+    store = CachingStore(inner, max_bytes=20_000)
+    inner.list_steps = None  # must not be used to serve iter_steps()
+
+    assert [s.idx for s in store.iter_steps(big)] == list(range(50))
+    assert [s.idx for s in store.iter_steps(big, start_idx=40)] == list(range(40, 50))
+    assert next(iter(store.iter_steps(big, kinds=("tool",)))).idx == 0
+    assert store.cache_stats()["entries"] == 0
+
+    # a complete pass over a run that fits fills the cache
+    assert len(list(store.iter_steps(small, kinds=("tool",)))) == 3
+    assert [s.idx for s in store.iter_steps(small, start_idx=1)] == [1, 2]
+    assert store.cache_stats()["entries"] == 1 and store.cache_stats()["hits"] == 1
+
+
+def test_small_steps_count_their_object_overhead(tmp_path):
+    inner = SQLiteStore(str(tmp_path / "t.db"))
+    inner.init()
+    run_id = _run(inner, 200, pad=0)  # ~6 KB of stored text
+    store = CachingStore(inner, max_bytes=20_000)
+    calls = []
+    iter_steps = inner.iter_steps
+    inner.iter_steps = lambda *a, **kw: calls.append(kw) or iter_steps(*a, **kw)
+
+    assert len(list(store.iter_steps(run_id, kinds=("tool",)))) == 200
+    assert calls[-1].get("start_idx", 0) > 0  # gave up buffering the run part-way
+    assert store.cache_stats()["entries"] == 0
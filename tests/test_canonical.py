@@ -0,0 +1,61 @@
+import json
+
+from agentreplay import Recorder, SQLiteStore
+from agentreplay.canonical import canonical, dumps, loads, payload_canonical
+from agentreplay.fingerprint import fingerprint_canonical, step_fingerprint
+from agentreplay.models import Step
+from datetime import datetime, timezone
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PAYLOAD = {"b": [1.5e16, 1e-7, "ü", None], "a": {"z": True, "y": 2**70}}
+
+
+def test_canonical_text_and_fingerprint_from_it():
+    expected = json.dumps(PAYLOAD, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    assert canonical(PAYLOAD) == expected
+    assert loads(dumps(PAYLOAD)) == PAYLOAD
+    assert loads(b'{"x": NaN}')["x"] != 0
+    assert fingerprint_canonical("tool", "t", canonical(PAYLOAD), "{}", None) == step_fingerprint(
+        "tool", "t", PAYLOAD, {}, None
+    )
+
+
+def test_non_string_keys_are_canonicalized_like_json_dumps(tmp_path):
+    mixed = {1: "a", "b": 2, 2.5: {None: 1, True: [{3: 4}]}}
+    assert canonical(mixed) == '{"1":"a","2.5":{"null":1,"true":[{"3":4}]},"b":2}'
+    roundtripped = loads(canonical(mixed))
+    assert step_fingerprint("tool", "t", mixed, {}, None) == step_fingerprint(
+        "tool", "t", roundtripped, {}, None
+    )
+
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store, redaction=False)
+    with rec.run("r") as run:
+        rec.tool("t", input=mixed, output={})
+    assert store.list_steps(run.id)[0].input["1"] == "a"
+
+
+def test_stored_canonical_text_is_reused_without_decoding(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"), compression="zlib", compress_min_bytes=16)
+    store.init()
+    run_id = store.create_run("r", started_at=NOW, meta={})
+    store.add_steps([Step("s0", run_id, 0, "tool", "t", NOW, PAYLOAD, {"ok": 1}, None)])
+    # a row written before canonical storage (non-canonical text, flag unset)
+    with store._conn() as c:
+        c.execute(
+            "INSERT INTO steps(id, run_id, idx, kind, name, ts, input_json, output_json)"
+            " VALUES(?,?,?,?,?,?,?,?)",
+            (
+                "s1", run_id, 1, "tool", "t", NOW.isoformat(),
+                json.dumps(PAYLOAD), json.dumps({"ok": 1}),
+            ),
+        )
+
+    fresh, legacy = store.iter_steps(run_id)
+    assert payload_canonical(fresh, "input") == canonical(PAYLOAD)
+    assert payload_canonical(fresh, "error") == "null"
+    assert fresh._loaded == 0
+    assert payload_canonical(legacy, "input") == canonical(PAYLOAD)
+    assert fresh.fingerprint == step_fingerprint(
+        "tool", "t", legacy.input, legacy.output, legacy.error
+    )
@@ -0,0 +1,47 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from agentreplay import Recorder, SQLiteStore
+
+
+def test_one_recorder_many_threads(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store, batch_size=4)
+
+    def work(n):
+        with rec.run(f"w{n}") as r:
+            for i in range(10):
+                rec.tool("t", input={"n": n, "i": i}, output={})
+        return r.id, n
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(work, range(32)))
+
+    for run_id, n in results:
+        steps = store.list_steps(run_id)
+        assert [s.idx for s in steps] == list(range(10))
+        assert all(s.input["n"] == n for s in steps)
+
+
+def test_tasks_and_nested_runs(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+
+    async def task(n):
+        with rec.run(f"task{n}") as r:
+            rec.span("plan")
+            await asyncio.sleep(0)
+            with rec.run("child") as child:
+                rec.llm("sub", input={"n": n}, output={})
+            rec.tool("t", input={"n": n}, output={})
+        return r, child
+
+    async def main():
+        return await asyncio.gather(*(task(n) for n in range(10)))
+
+    for r, child in asyncio.run(main()):
+        assert [s.name for s in store.list_steps(r.id)] == ["plan", "t"]
+        meta = store.get_run(child.id).meta
+        assert meta["parent_run_id"] == r.id
+        assert meta["parent_span_idx"] == 0
+    assert rec.active_run is None
@@ -1,4 +1,5 @@
 from agentreplay import Recorder, SQLiteStore, diff_runs
+from agentreplay.diff import align_runs, diff_batch, diff_summary, pair_runs, summarize_batch
 
 def test_diff_detects_change(tmp_path):
     db = tmp_path / "t.db"
@@ -15,3 +16,83 @@ def test_diff_detects_change(tmp_path):
     out = diff_runs(store, ra.id, rb.id)
     assert "DIVERGENCE" in out
     assert "output changed" in out
+
+
+def test_diff_detects_length_change(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("a") as ra:
+        rec.tool("t", input={"x": 1}, output={"y": 2})
+        rec.tool("t", input={"x": 2}, output={"y": 3})
+    with rec.run("b") as rb:
+        rec.tool("t", input={"x": 1}, output={"y": 2})
+
+    out = diff_runs(store, ra.id, rb.id)
+    assert "DIVERGENCE at step index 1: length changed: 2 != 1" in out
+    assert "B: (no step, run ended)" in out
+    assert "No divergence" in diff_runs(store, ra.id, ra.id)
+
+
+def test_length_divergence_is_attributed_to_the_first_extra_step(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("a") as ra:
+        rec.llm("chat", input={}, output={"text": "hi"})
+    with rec.run("b") as rb:
+        rec.llm("chat", input={}, output={"text": "hi"})
+        rec.tool("search", input={"q": 1}, output={})
+
+    summary = diff_summary(store, ra.id, rb.id)
+    where = (summary["index"], summary["kind"], summary["name"], summary["side"])
+    assert where == (1, "tool", "search", "b")
+    assert diff_summary(store, rb.id, ra.id)["side"] == "a"
+    batch = summarize_batch([summary])
+    assert batch["by_kind"] == {"tool": {"diverged": 1, "share_of_pairs": 1.0}}
+    assert batch["by_tool"] == {"search": {"diverged": 1, "share_of_pairs": 1.0}}
+
+
+def test_diff_batch_pairs_and_summarizes(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    runs = {}
+    for version, y in (("base", 2), ("cand", 3)):
+        for task in ("t1", "t2"):
+            with rec.run(task, meta={"version": version}) as r:
+                rec.llm("planner", input={}, output={"text": "go"})
+                rec.tool("search", input={"task": task}, output={"y": y if task == "t1" else 0})
+            runs[(version, task)] = r.id
+
+    base = [store.get_run(runs[("base", t)]) for t in ("t1", "t2")]
+    cand = [store.get_run(runs[("cand", t)]) for t in ("t1", "t2")]
+    pairs, unpaired = pair_runs(base, cand, key="name")
+    assert unpaired == 0
+    assert sorted(pairs) == sorted([(runs[("base", t)], runs[("cand", t)]) for t in ("t1", "t2")])
+
+    results = list(diff_batch(store, pairs, jobs=2))
+    summary = summarize_batch(results)
+    assert summary["pairs"] == 2
+    assert summary["diverged"] == 1
+    assert summary["by_tool"] == {"search": {"diverged": 1, "share_of_pairs": 0.5}}
+    empty = summarize_batch([])
+    assert empty == {"pairs": 0, "diverged": 0, "rate": 0.0, "by_kind": {}, "by_tool": {}}
+
+
+def test_aligned_diff_reports_insertions_and_changes(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("a") as ra:
+        rec.llm("planner", input={}, output={"text": "go"})
+        rec.tool("search", input={"q": 1}, output={"hits": 1})
+        rec.llm("final", input={}, output={"text": "done"})
+    with rec.run("b") as rb:
+        rec.llm("planner", input={}, output={"text": "go"})
+        rec.tool("retry", input={}, output={})
+        rec.tool("search", input={"q": 1}, output={"hits": 1})
+        rec.llm("final", input={}, output={"text": "DONE"})
+
+    result = align_runs(store, ra.id, rb.id)
+    assert result["equal"] == 2
+    ops = [(o["op"], o["name"]) for o in result["ops"]]
+    assert ops == [("insert", "retry"), ("change", "final")]
+    assert result["ops"][1]["reason"] == "output changed"
+    assert "1 changed, 1 inserted, 0 deleted" in diff_runs(store, ra.id, rb.id, align=True)
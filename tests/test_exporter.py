@@ -0,0 +1,47 @@
+import json
+import zipfile
+
+from agentreplay import Recorder, SQLiteStore, export_areplay, import_areplay
+
+
+def test_export_import_roundtrip(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("exported", meta={"k": "v"}) as r:
+        rec.llm("planner", input={"a": 1}, output={"b": "ü"})
+        rec.tool("t", input={"q": 1}, output={}, error={"type": "Boom"})
+
+    path = export_areplay(store, r.id, str(tmp_path / "run.areplay"))
+    with zipfile.ZipFile(path) as z:
+        manifest = json.loads(z.read("manifest.json"))
+        assert manifest["version"] == "0.3"
+        assert manifest["step_count"] == 2
+        assert len(z.read("steps.jsonl").splitlines()) == 2
+
+    new_id = import_areplay(store, path)
+    old, new = store.list_steps(r.id), store.list_steps(new_id)
+    assert [(s.idx, s.kind, s.name, s.input, s.output, s.error) for s in new] == [
+        (s.idx, s.kind, s.name, s.input, s.output, s.error) for s in old
+    ]
+    assert store.get_run(new_id).meta["k"] == "v"
+
+
+def test_import_v02_artifact(tmp_path):
+    path = tmp_path / "old.areplay"
+    step = {
+        "id": "s0", "run_id": "r0", "idx": 0, "kind": "tool", "name": "t",
+        "ts": "2024-01-01T00:00:00+00:00", "input": {"x": 1}, "output": {"y": 2}, "error": None,
+    }
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("manifest.json", json.dumps({"format": "agentreplay.areplay", "version": "0.2"}))
+        z.writestr("run.json", json.dumps({
+            "id": "r0", "name": "old", "started_at": "2024-01-01T00:00:00+00:00",
+            "ended_at": None, "meta": {},
+        }))
+        z.writestr("steps.json", json.dumps([step], indent=2))
+
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    new_id = import_areplay(store, str(path))
+    assert store.get_run(new_id).meta["areplay_version"] == "0.2"
+    assert store.list_steps(new_id)[0].output == {"y": 2}
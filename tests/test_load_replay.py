@@ -0,0 +1,104 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from typer.testing import CliRunner
+
+from agentreplay import LogStore, Recorder, SQLiteStore, export_areplay, import_areplay, load_replay
+from agentreplay.cli import app
+from agentreplay.load import percentiles
+from agentreplay.models import Step
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "log"])
+def test_call_durations_are_recorded_and_persisted(tmp_path, kind):
+    if kind == "sqlite":
+        store = SQLiteStore(str(tmp_path / "t.db"))
+    else:
+        store = LogStore(str(tmp_path / "log"))
+    store.init()
+    rec = Recorder(store)
+    with rec.run("r") as run:
+        before = datetime.now(timezone.utc)
+        with rec.call("tool", "search", {"q": 1}) as c:
+            time.sleep(0.02)
+            c.output = {"hits": 3}
+        with pytest.raises(TimeoutError):
+            with rec.call("llm", "chat", {"q": 2}):
+                raise TimeoutError("slow")
+        rec.tool("fetch", input={}, output={}, duration=0.5)
+        rec.tool("untimed", input={}, output={})
+
+    search, chat, fetch, untimed = store.list_steps(run.id)
+    assert search.output == {"hits": 3} and 20_000 <= search.duration_us < 1_000_000
+    assert before <= search.ts  # ts is when the call started
+    assert chat.error == {"type": "TimeoutError", "msg": "slow"} and chat.duration_us is not None
+    assert fetch.duration_us == 500_000 and untimed.duration_us is None
+
+    imported = import_areplay(store, export_areplay(store, run.id, str(tmp_path / "r.areplay")))
+    recorded = [s.duration_us for s in (search, chat, fetch, untimed)]
+    assert [s.duration_us for s in store.list_steps(imported)] == recorded
+
+
+def _trace(store, runs=3, calls=4, gap_ms=100, duration_ms=50):
+    ids = []
+    for r in range(runs):
+        started = BASE + timedelta(milliseconds=10 * r)
+        run_id = store.create_run(f"r{r}", started_at=started, meta={})
+        store.add_steps(
+            Step(
+                f"{r}-{i}", run_id, i, "tool", "search" if i % 2 else "fetch",
+                started + timedelta(milliseconds=gap_ms * i), {"i": i}, {"ok": True}, None,
+                duration_us=duration_ms * 1000,
+            )
+            for i in range(calls)
+        )
+        ids.append(run_id)
+    return ids
+
+
+def test_load_replay_scales_the_recorded_schedule(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    ids = _trace(store)
+
+    # 3 runs of 4 calls spanning ~350ms, at 10x: ~35ms
+    report = load_replay(store, ids, speed=10.0, concurrency=3)
+    assert (report.runs, report.calls, report.errors) == (3, 12, 0)
+    assert 0.03 <= report.wall_time_s < 1.0
+    assert report.latency_ms["*"]["p50"] >= 4.0  # mocked calls take 50ms / 10
+    assert report.recorded_ms["tool:search"] == {
+        "count": 6, "p50": 50.0, "p90": 50.0, "p99": 50.0, "max": 50.0
+    }
+    assert report.lag_ms["count"] == 12
+
+
+def test_load_replay_at_max_speed_drives_stand_ins(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    ids = _trace(store, gap_ms=10_000)
+    seen = []
+
+    def search(inp):
+        seen.append(inp["i"])
+        if inp["i"] == 3:
+            raise ConnectionError("down")
+
+    report = load_replay(store, ids * 2, speed=None, concurrency=4, handlers={"search": search})
+    assert report.calls == 24 and len(seen) == 12 and report.errors == 6
+    assert report.wall_time_s < 5 and report.lag_ms == {}
+    assert set(report.latency_ms) == {"*", "tool:fetch", "tool:search"}
+
+    args = ["load", *ids, "--db", str(tmp_path / "t.db"), "--speed", "max", "--json"]
+    res = CliRunner().invoke(app, args)
+    assert res.exit_code == 0, res.output
+    assert json.loads(res.output)["calls"] == 12
+
+
+def test_percentiles_use_nearest_rank():
+    assert percentiles([]) == {"count": 0}
+    st = percentiles(range(1, 101))
+    assert (st["p50"], st["p90"], st["p99"], st["max"]) == (50, 90, 99, 100)
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timezone
+
+from agentreplay.models import Step
+from agentreplay.store_log import LogStore
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _fill(store, name, n):
+    run_id = store.create_run(name, started_at=NOW, meta={})
+    store.add_steps(
+        Step(f"{name}{i}", run_id, i, "tool", "t", NOW, {"i": i, "pad": "x" * 200}, {}, None)
+        for i in range(n)
+    )
+    return run_id
+
+
+def test_segments_rotate_and_reload_from_sidecars(tmp_path):
+    path = str(tmp_path / "log")
+    store = LogStore(path, segment_bytes=4096)
+    store.init()
+    run_id = _fill(store, "a", 100)
+    store.close()
+
+    files = os.listdir(path)
+    assert sum(f.endswith(".log") for f in files) > 3
+    assert sum(f.endswith(".idx") for f in files) == sum(f.endswith(".log") for f in files) - 1
+
+    reopened = LogStore(path, segment_bytes=4096)
+    assert [s.input["i"] for s in reopened.iter_steps(run_id, start_idx=95)] == [95, 96, 97, 98, 99]
+
+
+def test_torn_tail_is_ignored_and_truncated(tmp_path):
+    path = str(tmp_path / "log")
+    store = LogStore(path)
+    run_id = _fill(store, "a", 3)
+    store.close()
+    seg = os.path.join(path, "seg-000001.log")
+    good = os.path.getsize(seg)
+    with open(seg, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    store = LogStore(path)
+    assert len(store.list_steps(run_id)) == 3
+    store.add_step(run_id, 3, "tool", "t", NOW, {}, {}, None)
+    assert [s.idx for s in store.iter_steps(run_id)] == [0, 1, 2, 3]
+    assert os.path.getsize(seg) > good
+    store.close()
+    assert len(LogStore(path).list_steps(run_id)) == 4
+
+
+def test_compaction_reclaims_deleted_runs(tmp_path):
+    path = str(tmp_path / "log")
+    store = LogStore(path, segment_bytes=8192)
+    keep = _fill(store, "keep", 10)
+    drop = _fill(store, "drop", 100)
+    store.delete_run(drop)
+    before = store.stats()
+    assert before["garbage_bytes"] > 0
+
+    assert store.compact() > 0
+    after = store.stats()
+    assert after["segment_bytes"] < before["segment_bytes"]
+    assert after["steps"] == 10
+    assert [s.input["i"] for s in store.iter_steps(keep)] == list(range(10))
+    store.close()
+
+    reopened = LogStore(path, segment_bytes=8192)
+    assert reopened.stats()["runs"] == 1
+    assert [s.input["i"] for s in reopened.iter_steps(keep)] == list(range(10))
+    assert list(reopened.iter_steps(drop)) == []
+
+
+def test_compaction_keeps_open_readers_valid_and_survives_interruption(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    path = str(tmp_path / "log")
+    store = LogStore(path, segment_bytes=8192)
+    keep = _fill(store, "keep", 40)
+    drop = _fill(store, "drop", 100)
+    assert synced == []  # segments rotated, but fsync=False
+
+    reader = store.iter_steps(keep)
+    assert next(reader).input["i"] == 0
+    store.delete_run(drop)
+    assert store.compact() > 0 and synced
+    assert [s.input["i"] for s in reader] == list(range(1, 40))
+    store.close()
+
+    # a compaction that died before its rename leaves the old segment in place
+    with open(os.path.join(path, "seg-000002.log.tmp"), "wb") as f:
+        f.write(b"partial")
+    reopened = LogStore(path, segment_bytes=8192)
+    assert [s.input["i"] for s in reopened.iter_steps(keep)] == list(range(40))
+    assert not any(f.endswith(".tmp") for f in os.listdir(path))
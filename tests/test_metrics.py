@@ -0,0 +1,64 @@
+import urllib.request
+
+import pytest
+
+from typer.testing import CliRunner
+
+from agentreplay import Recorder, SQLiteStore
+from agentreplay.cli import app
+from agentreplay.metrics import Metrics
+
+
+def test_recorder_without_metrics_is_uninstrumented(tmp_path):
+    rec = Recorder(SQLiteStore(str(tmp_path / "t.db")))
+    assert rec.stats() == {}
+    assert "_record" not in vars(rec) and "_add_step" not in vars(rec)
+
+
+def test_recorder_metrics_textfile_and_cli(tmp_path):
+    prom = tmp_path / "agentreplay.prom"
+    m = Metrics(textfile=str(prom))
+    rec = Recorder(SQLiteStore(str(tmp_path / "t.db")), metrics=m, batch_size=2)
+    with rec.run("r"):
+        rec.llm("m", input={"q": "hi"}, output={"text": "x" * 50})
+        rec.tool("t", input={}, output={}, error={"type": "Boom"})
+        rec.tool("t", input={}, output={})
+
+    stats = rec.stats()
+    assert stats["steps"] == {"llm": 1, "tool": 2}
+    assert stats["errors"] == {"tool": 1}
+    assert stats["bytes"]["llm"] > 50
+    assert stats["phases"]["serialization"]["calls"] == 3
+    assert stats["phases"]["write"]["calls"] == 2
+
+    res = CliRunner().invoke(app, ["stats", "--file", str(prom)])
+    assert res.exit_code == 0, res.output
+    assert "serialization" in res.output and "tool" in res.output
+
+
+class BrokenStore(SQLiteStore):
+    def add_step(self, *args, **kwargs):
+        raise ConnectionError("store down")
+
+
+def test_failed_records_are_not_counted_as_steps(tmp_path):
+    rec = Recorder(BrokenStore(str(tmp_path / "t.db")), metrics=True)
+    with pytest.raises(RuntimeError):
+        rec.tool("t", input={}, output={})  # no active run
+    with rec.run("r"):
+        with pytest.raises(ConnectionError):
+            rec.tool("t", input={}, output={})
+    stats = rec.stats()
+    assert stats["steps"] == {} and stats["write_errors"] == 1
+
+
+def test_metrics_http_exporter():
+    m = Metrics()
+    m.count_step("tool", error=False)
+    server = m.serve(port=0)
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+    finally:
+        server.shutdown()
+    assert 'agentreplay_steps_total{kind="tool"} 1.0' in body
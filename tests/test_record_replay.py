@@ -1,4 +1,9 @@
-from agentreplay import Recorder, SQLiteStore, Replayer
+import threading
+
+import pytest
+
+from agentreplay import Recorder, SQLiteStore, Replayer, diff_runs
+from agentreplay.replay import ToolMocker
 
 def test_record_and_replay(tmp_path):
     db = tmp_path / "t.db"
@@ -13,3 +18,71 @@ def test_record_and_replay(tmp_path):
     report = rep.replay(r.id)
     assert report.steps_replayed == 2
     assert report.ok is True
+
+
+def test_indexed_tool_mocker_tolerates_reordering(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("parallel") as r:
+        rec.tool("search", input={"q": "a"}, output={"hits": 1})
+        rec.tool("search", input={"q": "b"}, output={"hits": 2})
+        rec.tool("fetch", input={"url": "x"}, output={"body": "x"})
+
+    mocker = Replayer(store).build_tool_mocker(r.id, strict=True, mode="indexed")
+    assert mocker.next_output("fetch", {"url": "x"}) == {"body": "x"}
+    assert mocker.next_output("search", {"q": "b"}) == {"hits": 2}
+    with pytest.raises(RuntimeError):
+        mocker.next_output("search", {"q": "zzz"})
+    assert [s.input for s in mocker.unused()] == [{"q": "a"}]
+    assert mocker.unmatched == [("search", {"q": "zzz"})]
+
+
+def toy_agent(session):
+    plan = session.llm("planner", input={"prompt": "plan"})
+    out = session.tool("add", input={"x": 2, "y": 3})
+    session.llm("finalizer", input={"plan": plan["text"], "res": out["result"]})
+
+
+def test_replay_engine_reexecutes_agent(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    run_ids = []
+    for _ in range(2):
+        with rec.run("toy") as r:
+            rec.llm("planner", input={"prompt": "plan"}, output={"text": "add"})
+            rec.tool("add", input={"x": 2, "y": 3}, output={"result": 5})
+            rec.llm("finalizer", input={"plan": "add", "res": 5}, output={"text": "5"})
+        run_ids.append(r.id)
+
+    reports = Replayer(store).run_many(run_ids, toy_agent, jobs=2)
+    for run_id, report in zip(run_ids, reports):
+        assert report.ok, report.notes
+        assert report.steps_replayed == 3
+        assert report.wall_time_s > 0
+        assert store.get_run(report.new_run_id).meta["replay_of"] == run_id
+        assert "No divergence" in diff_runs(store, run_id, report.new_run_id)
+
+
+def test_replay_serves_the_recorded_tool_calls_and_sequential_mocker_is_thread_safe(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store=store)
+    with rec.run("r") as r:
+        for i in range(3):
+            rec.tool("search", input={"i": i}, output={"n": i})
+    report = Replayer(store).replay(r.id, strict=True, mode="indexed")
+    assert report.ok and "Tool calls served: 3/3" in report.notes
+
+    steps = store.list_steps(r.id) * 200
+    mocker = ToolMocker(steps)
+    served = []
+
+    def call():
+        for _ in range(100):
+            served.append(mocker.next_step("search", {}).id)
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(served) == 600 and mocker.unused() == []
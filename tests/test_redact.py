@@ -0,0 +1,35 @@
+from agentreplay import Recorder, SQLiteStore
+from agentreplay import CompiledRedactor
+from agentreplay.redact import REDACTED
+
+
+def test_compiled_redactor_is_recursive_and_copy_on_write():
+    r = CompiledRedactor(extra_keys={"Session"})
+    clean = {"a": [1, {"b": "plain"}], "n": 2}
+    payload = {
+        "headers": {"Authorization": "x", "accept": "json"},
+        "msgs": [{"content": "token Bearer abc.def here"}, "sk-" + "z" * 24],
+        "session": "s1",
+        "clean": clean,
+    }
+    out = r(payload)
+    assert out["headers"] == {"Authorization": REDACTED, "accept": "json"}
+    assert out["msgs"][0]["content"] == f"token Bearer {REDACTED} here"
+    assert out["msgs"][1] == REDACTED
+    assert out["session"] == REDACTED
+    assert out["clean"] is clean
+    assert payload["headers"]["Authorization"] == "x"
+    assert r(clean) is clean
+
+
+def test_recorder_accepts_redactor_callable(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store, redaction=CompiledRedactor())
+    with rec.run("r") as run:
+        rec.llm("m", input={"nested": {"api_key": "k"}}, output={"ok": True})
+    assert store.list_steps(run.id)[0].input == {"nested": {"api_key": REDACTED}}
+
+    rec = Recorder(store, redaction=False)
+    with rec.run("r") as run:
+        rec.llm("m", input={"api_key": "k"}, output={})
+    assert store.list_steps(run.id)[0].input == {"api_key": "k"}
@@ -0,0 +1,177 @@
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from agentreplay import LogStore, Recorder, RemoteStore, SQLiteStore
+from agentreplay.models import Step
+from agentreplay.server import IngestServer
+from agentreplay.store_remote import drain_spool
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _free_address():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{s.getsockname()[1]}"
+
+
+def _daemon(tmp_path, address="127.0.0.1:0", **kwargs):
+    store = SQLiteStore(str(tmp_path / "d.db"))
+    store.init()
+    return IngestServer(store, address, **kwargs).start()
+
+
+def test_writes_spool_while_daemon_is_down_and_replay_on_reconnect(tmp_path):
+    address = _free_address()
+    spool = tmp_path / "w.spool.jsonl"
+    client = RemoteStore(address, spool_path=str(spool), retry_interval=0)
+    rec = Recorder(client)
+    with rec.run("offline") as run:
+        rec.tool("t", input={"i": 1}, output={"ok": True})
+        rec.llm("m", input={"q": "x"}, output={"a": "y"})
+    assert client.spooled == 4 and len(spool.read_text().splitlines()) == 4
+    with pytest.raises(ConnectionError):
+        client.get_run(run.id)
+
+    server = _daemon(tmp_path, address)
+    try:
+        # the first request reconnects and replays the spool ahead of itself
+        assert [s.name for s in client.list_steps(run.id)] == ["t", "m"]
+        assert client.get_run(run.id).ended_at is not None
+        assert spool.read_text() == ""
+    finally:
+        client.close()
+        server.close()
+
+
+def test_concurrent_clients_are_coalesced_by_the_single_writer(tmp_path):
+    server = _daemon(tmp_path, batch_size=64)
+    try:
+        def worker(w):
+            store = RemoteStore(server.address)
+            run_id = store.create_run(f"w{w}", started_at=NOW, meta={})
+            for i in range(50):
+                store.add_step(run_id, i, "tool", "t", NOW, {"w": w, "i": i}, {}, None)
+            store.close()
+
+        threads = [threading.Thread(target=worker, args=(w,)) for w in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        reader = RemoteStore(server.address)
+        assert reader.stats()["steps"] == 400
+        assert sorted(r.name for r in reader.list_runs()) == [f"w{w}" for w in range(8)]
+        assert server.steps_written == 400 and server.batches < 400
+    finally:
+        server.close()
+
+
+def test_rejected_writes_are_reported_without_failing_the_batch(tmp_path):
+    server = _daemon(tmp_path)
+    try:
+        client = RemoteStore(server.address)
+        run_id = client.create_run("r", started_at=NOW, meta={})
+        client.add_steps([Step("dup", run_id, 0, "tool", "t", NOW, {}, {}, None)])
+        client.add_steps([Step("dup", run_id, 1, "tool", "t", NOW, {}, {}, None)])
+        client.add_steps([Step("ok", run_id, 2, "tool", "t", NOW, {}, {}, None)])
+        client.flush()
+        assert client.write_errors == 1 and client.last_error is not None
+        assert [s.id for s in client.list_steps(run_id)] == ["dup", "ok"]
+    finally:
+        server.close()
+
+
+def test_destructive_calls_fail_instead_of_spooling_when_the_connection_drops(tmp_path):
+    # a "daemon" that reads one request, then hangs up without answering
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+
+    def hang_up():
+        for _ in range(2):
+            conn, _ = listener.accept()
+            conn.recv(65536)
+            conn.close()
+
+    threading.Thread(target=hang_up, daemon=True).start()
+    spool = tmp_path / "w.spool.jsonl"
+    address = f"127.0.0.1:{listener.getsockname()[1]}"
+    try:
+        client = RemoteStore(address, spool_path=str(spool), retry_interval=0)
+        with pytest.raises(ConnectionError):
+            client.delete_run("r")
+        with pytest.raises(ConnectionError):
+            client.compact()
+        assert client.spooled == 0 and not spool.exists()
+    finally:
+        listener.close()
+
+
+def test_a_daemon_that_stops_acking_times_out_into_the_spool(tmp_path):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    accepted = []
+
+    def swallow():  # reads every request, answers none
+        conn, _ = listener.accept()
+        accepted.append(conn)
+        while conn.recv(65536):
+            pass
+
+    threading.Thread(target=swallow, daemon=True).start()
+    spool = tmp_path / "w.spool.jsonl"
+    try:
+        address = f"127.0.0.1:{listener.getsockname()[1]}"
+        client = RemoteStore(address, spool_path=str(spool), timeout=0.3)
+        run_id = client.create_run("r", started_at=NOW, meta={})
+        client.add_step(run_id, 0, "tool", "t", NOW, {}, {}, None)
+        t0 = time.monotonic()
+        client.flush()
+        assert time.monotonic() - t0 < 5
+        assert client.spooled == 2 and len(spool.read_text().splitlines()) == 2
+    finally:
+        listener.close()
+
+
+def test_resent_steps_are_written_once(tmp_path):
+    for backend in ("sqlite", "log"):
+        if backend == "sqlite":
+            store = SQLiteStore(str(tmp_path / "d.db"))
+        else:
+            store = LogStore(str(tmp_path / "log"))
+        store.init()
+        server = IngestServer(store, "127.0.0.1:0").start()
+        try:
+            client = RemoteStore(server.address)
+            run_id = client.create_run("r", started_at=NOW, meta={})
+            steps = [
+                Step(f"{backend}{i}", run_id, i, "tool", "t", NOW, {"i": i}, {}, None)
+                for i in range(3)
+            ]
+            client.add_steps(steps[:2])
+            client.add_steps(steps)  # e.g. replayed from the spool after a partial send
+            client.add_steps(steps[1:])
+            client.flush()
+            assert [s.idx for s in client.list_steps(run_id)] == [0, 1, 2]
+            assert client.write_errors == 0 and server.duplicates_skipped == 4
+        finally:
+            server.close()
+
+
+def test_drain_spool_applies_leftover_writes(tmp_path):
+    spool = tmp_path / "dead.spool.jsonl"
+    client = RemoteStore(_free_address(), spool_path=str(spool), retry_interval=60)
+    run_id = client.create_run("r", started_at=NOW, meta={"project": "p"})
+    client.add_step(run_id, 0, "tool", "t", NOW, {"x": 1}, {"y": 2}, None)
+
+    store = SQLiteStore(str(tmp_path / "direct.db"))
+    store.init()
+    assert drain_spool(str(spool), store) == 2
+    assert store.get_run(run_id).meta == {"project": "p"}
+    assert store.list_steps(run_id)[0].output == {"y": 2}
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+from agentreplay import RetentionPolicy, SQLiteStore, import_areplay
+from agentreplay.retention import collect_garbage
+
+
+def _make_runs(store, project, n, start):
+    ids = []
+    for i in range(n):
+        run_id = store.create_run(
+            f"r{i}", started_at=start + timedelta(days=i), meta={"project": project}
+        )
+        store.add_step(run_id, 0, "tool", "t", start, {"blob": "x" * 5000}, {}, None)
+        store.end_run(run_id, start + timedelta(days=i))
+        ids.append(run_id)
+    return ids
+
+
+def test_gc_ttl_and_max_runs_with_archive(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    now = datetime(2024, 1, 10, tzinfo=timezone.utc)
+    a = _make_runs(store, "a", 5, now - timedelta(days=5))
+    b = _make_runs(store, "b", 3, now - timedelta(days=3))
+
+    policies = [
+        RetentionPolicy(project="a", max_age=timedelta(days=3)),
+        RetentionPolicy(project="b", max_runs=1),
+    ]
+    preview = store.gc(policies, dry_run=True, now=now)
+    assert sorted(preview.deleted) == sorted(a[:2] + b[:2])
+    assert len(store.list_runs(limit=100)) == 8
+
+    report = store.gc(policies, archive_dir=str(tmp_path / "archive"), now=now)
+    assert sorted(report.deleted) == sorted(a[:2] + b[:2])
+    assert {r.id for r in store.list_runs(limit=100)} == set(a[2:] + b[2:])
+    assert report.freed_pages > 0
+
+    restored = import_areplay(store, report.archived[0])
+    assert store.list_steps(restored)[0].input == {"blob": "x" * 5000}
+
+
+def test_gc_accepts_naive_now_and_deletes_while_paging(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    ids = _make_runs(store, "p", 30, datetime(2020, 1, 1, tzinfo=timezone.utc))
+    listed = []
+    list_runs = store.list_runs
+
+    def spy(*args, **kwargs):
+        listed.append(store.stats()["runs"])
+        return list_runs(*args, **kwargs)
+
+    store.list_runs = spy
+    report = collect_garbage(store, [RetentionPolicy(max_runs=5)], now=datetime.now(), page_size=4)
+    assert sorted(report.deleted) == sorted(ids[:25])
+    assert {r.id for r in list_runs(limit=100)} == set(ids[25:])
+    # later pages were fetched after earlier expired runs were already gone
+    assert listed[0] == 30 and listed[-1] < 30
+
+    policy = RetentionPolicy(max_age=timedelta(days=1))
+    report = collect_garbage(store, [policy], now=datetime.now())
+    assert sorted(report.deleted) == sorted(ids[25:])
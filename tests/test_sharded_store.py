@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+from typer.testing import CliRunner
+
+from agentreplay import Recorder, ShardedStore, SQLiteStore, export_areplay
+from agentreplay.cli import app
+from agentreplay.store import open_store, run_cursor
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _sharded(tmp_path, n=4, by="run_id"):
+    store = ShardedStore([SQLiteStore(str(tmp_path / f"s{i}.db")) for i in range(n)], by=by)
+    store.init()
+    return store
+
+
+def test_runs_are_spread_and_listings_merge_in_order(tmp_path):
+    store = _sharded(tmp_path)
+    ids = [
+        store.create_run(f"r{i}", started_at=BASE + timedelta(minutes=i), meta={})
+        for i in range(40)
+    ]
+    for run_id in ids[::7]:
+        store.add_step(run_id, 0, "tool", "t", BASE, {"x": 1}, {}, {"type": "E"})
+
+    assert all(s.stats()["runs"] > 0 for s in store.shards)
+    assert sum(s.stats()["runs"] for s in store.shards) == store.stats()["runs"] == 40
+    assert [r.id for r in store.iter_runs(page_size=6)] == ids[::-1]
+    page = store.list_runs(limit=5)
+    assert [r.id for r in store.list_runs(limit=5, cursor=run_cursor(page[-1]))] == ids[-6:-11:-1]
+    assert [r.id for r in store.list_runs(has_error=True)] == ids[::7][::-1]
+    assert store.get_run(ids[3]).name == "r3"
+    assert store.shard_for(ids[3]).list_steps(ids[3]) == []
+
+
+def test_project_sharding_keeps_a_project_on_one_shard(tmp_path):
+    store = _sharded(tmp_path, by="project")
+    for project in ("alpha", "beta"):
+        ids = [store.create_run("r", started_at=BASE, meta={"project": project}) for _ in range(10)]
+        assert len({id(store.shard_for(run_id)) for run_id in ids}) == 1
+        owner = store.shard_for(ids[0])
+        assert {r.id for r in owner.list_runs(project=project)} == set(ids)
+
+
+def test_cli_commands_work_against_a_sharded_layout(tmp_path):
+    layout = str(tmp_path / "layout")
+    runner = CliRunner()
+    res = runner.invoke(app, ["shards", "init", layout, "--count", "3"])
+    assert res.exit_code == 0, res.output
+
+    store = open_store(f"shards:{layout}")
+    store.init()
+    rec = Recorder(store)
+    with rec.run("a") as a:
+        rec.tool("search", input={"q": 1}, output={"hits": 1})
+    with rec.run("b") as b:
+        rec.tool("search", input={"q": 1}, output={"hits": 2})
+    artifact = export_areplay(store, a.id, str(tmp_path / "a.areplay"))
+    store.close()
+
+    db = f"shards:{layout}"
+    res = runner.invoke(app, ["runs", "list", "--db", db])
+    assert res.exit_code == 0 and a.id in res.output and b.id in res.output
+    res = runner.invoke(app, ["diff", a.id, b.id, "--db", db])
+    assert res.exit_code == 0 and "output changed" in res.output
+    res = runner.invoke(app, ["import", artifact, "--db", db])
+    assert res.exit_code == 0, res.output
+    res = runner.invoke(app, ["export", a.id, "--db", db, "--out", str(tmp_path / "again.areplay")])
+    assert res.exit_code == 0, res.output
+    assert len(ShardedStore.open(layout).list_runs()) == 3
@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from agentreplay import SQLiteStore
+from agentreplay.models import Step
+from agentreplay.store import run_cursor
+
+
+def test_connections_are_per_thread_and_wal(tmp_path):
+    with SQLiteStore(str(tmp_path / "t.db")) as store:
+        assert store._conn() is store._conn()
+        assert store._conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(store._conn()))
+        t.start()
+        t.join()
+        assert seen[0] is not store._conn()
+
+        run_id = store.create_run("r", started_at=datetime.now(timezone.utc), meta={})
+
+    # close() drops connections; the store reopens lazily on next use
+    assert store.get_run(run_id).name == "r"
+    store.close()
+
+
+def test_connections_of_finished_threads_are_closed(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    for _ in range(20):
+        threads = [threading.Thread(target=store.list_runs) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(store._conns) <= 11
+    assert len(store._conns) == 1  # this thread's
+    store.close()
+    assert store._conns == {} and store.list_runs() == []
+
+
+def test_iter_steps_pages_filters_and_decodes_lazily(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.page_size = 3
+    store.init()
+    now = datetime.now(timezone.utc)
+    run_id = store.create_run("r", started_at=now, meta={})
+    for i in range(10):
+        kind = "tool" if i % 2 else "llm"
+        store.add_step(run_id, i, kind, "n", now, {"i": i}, {"o": i}, None)
+
+    assert [s.idx for s in store.iter_steps(run_id)] == list(range(10))
+    assert [s.idx for s in store.iter_steps(run_id, kinds=["tool"], start_idx=4)] == [5, 7, 9]
+
+    step = next(store.iter_steps(run_id, start_idx=2))
+    assert step._loaded == 0
+    assert step.output == {"o": 2}
+    assert step._loaded == 2
+    assert step.error is None
+
+
+def test_dedup_blobs_are_shared_and_freed(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"), dedup=True, dedup_min_bytes=64)
+    store.init()
+    now = datetime.now(timezone.utc)
+    prompt = {"system": "You are a helpful agent. " * 20}
+
+    run_ids = [store.create_run("r", started_at=now, meta={}) for _ in range(2)]
+    store.add_step(run_ids[0], 0, "llm", "planner", now, prompt, {"text": "ok"}, None)
+    store.add_steps(
+        [Step("s1", run_ids[1], 0, "llm", "planner", now, prompt, {"text": "ok"}, None)]
+    )
+
+    assert store.list_steps(run_ids[1])[0].input == prompt
+    stats = store.stats()
+    assert stats["blobs"] == 1
+    assert stats["blob_refs"] == 2
+    assert stats["dedup_saved_bytes"] > 0
+
+    store.delete_run(run_ids[0])
+    assert store.stats()["blob_refs"] == 1
+    store.delete_run(run_ids[1])
+    assert store.stats()["blobs"] == 0
+
+
+def test_compression_roundtrip_and_migration(tmp_path):
+    path = str(tmp_path / "t.db")
+    now = datetime.now(timezone.utc)
+    big = {"text": "lorem ipsum " * 200}
+
+    plain = SQLiteStore(path)
+    plain.init()
+    run_id = plain.create_run("r", started_at=now, meta={})
+    plain.add_step(run_id, 0, "llm", "a", now, big, {"ok": True}, None)
+
+    store = SQLiteStore(path, compression="zlib", compress_min_bytes=64)
+    store.init()
+    store.add_step(run_id, 1, "llm", "b", now, big, {"ok": True}, None)
+    before = store.stats()["payload_bytes"]
+
+    assert store.recompress("lzma") == 2
+    assert store.stats()["payload_bytes"] < before
+    assert [s.input for s in plain.list_steps(run_id)] == [big, big]
+    assert [s.output for s in store.list_steps(run_id)] == [{"ok": True}, {"ok": True}]
+
+
+def test_recompress_pages_through_blobs(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"), dedup=True, dedup_min_bytes=64)
+    store.init()
+    now = datetime.now(timezone.utc)
+    run_id = store.create_run("r", started_at=now, meta={})
+    payloads = [{"text": f"{i} " + "lorem ipsum " * 50} for i in range(5)]
+    store.add_steps(
+        Step(f"s{i}", run_id, i, "llm", "a", now, p, {}, None) for i, p in enumerate(payloads)
+    )
+    assert store.stats()["blobs"] == 5
+
+    store.recompress("zlib", batch_size=2)
+    codecs = store._conn().execute("SELECT DISTINCT codec FROM blobs").fetchall()
+    assert [tuple(r) for r in codecs] == [("zlib",)]
+    assert [s.input for s in store.list_steps(run_id)] == payloads
+
+
+def test_search_steps_fts_and_error_type(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"), search=True)
+    store.init()
+    now = datetime.now(timezone.utc)
+    a = store.create_run("a", started_at=now, meta={})
+    b = store.create_run("b", started_at=now, meta={})
+    store.add_step(a, 0, "llm", "planner", now, {"prompt": "Größe der Welt"}, {"text": "ok"}, None)
+    store.add_steps([
+        Step(
+            "s1", b, 0, "tool", "fetch", now, {"url": "x"}, {}, {"type": "Timeout", "msg": "slow"}
+        ),
+        Step("s2", b, 1, "llm", "planner", now, {"prompt": "retry fetch"}, {"text": "ok"}, None),
+    ])
+
+    assert store.search_steps("Größe der") == [(a, 0)]
+    assert store.search_steps(error_type="Timeout") == [(b, 0)]
+    assert store.search_steps("fetch", kind="llm") == [(b, 1)]
+
+    store.delete_run(b)
+    assert store.search_steps("fetch") == []
+    # a plain store on the same file keeps the index in sync
+    plain = SQLiteStore(str(tmp_path / "t.db"))
+    plain.init()
+    plain.add_step(a, 1, "tool", "calc", now, {"expr": "1+1"}, {"v": 2}, None)
+    assert store.search_steps("calc") == [(a, 1)]
+
+
+def test_search_steps_quotes_plain_queries_and_finds_a_later_index(tmp_path):
+    path = str(tmp_path / "t.db")
+    early = SQLiteStore(path)
+    early.init()
+    now = datetime.now(timezone.utc)
+    run_id = early.create_run("r", started_at=now, meta={})
+
+    store = SQLiteStore(path, search=True)
+    store.init()
+    # `early` opened before the index existed but keeps it in sync and can query it
+    early.add_step(run_id, 0, "tool", "t", now, {"q": "foo-bar a AND b"}, {}, None)
+    early.add_steps([Step("s1", run_id, 1, "tool", "t", now, {"q": 'say "hi"'}, {}, None)])
+    assert early.search_steps("foo-bar") == [(run_id, 0)]
+    assert store.search_steps("a AND") == [(run_id, 0)]
+    assert store.search_steps('"hi') == [(run_id, 1)]
+    assert store.search_steps('"') == []
+    assert store.search_steps("foo OR hi", raw=True) == [(run_id, 1), (run_id, 0)]
+    with pytest.raises(sqlite3.OperationalError):
+        store.search_steps("a AND", raw=True)
+
+
+def test_list_runs_filters_and_keyset_pagination(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    store.init()
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    ids = []
+    for i in range(7):
+        project = "alpha" if i % 2 else "beta"
+        run_id = store.create_run(
+            f"n{i % 3}", started_at=base.replace(hour=i), meta={"project": project}
+        )
+        if i == 4:
+            store.add_step(run_id, 0, "tool", "t", base, {}, {}, {"type": "Boom"})
+        ids.append(run_id)
+
+    pages = []
+    cursor = None
+    while True:
+        page = store.list_runs(limit=3, cursor=cursor)
+        pages.append([r.id for r in page])
+        if len(page) < 3:
+            break
+        cursor = run_cursor(page[-1])
+    assert sum(pages, []) == ids[::-1]
+    assert [r.id for r in store.iter_runs(page_size=2)] == ids[::-1]
+
+    assert [r.id for r in store.list_runs(project="alpha")] == [ids[5], ids[3], ids[1]]
+    assert [r.id for r in store.list_runs(name="n1", project="beta")] == [ids[4]]
+    assert [r.id for r in store.list_runs(has_error=True)] == [ids[4]]
+    window = store.list_runs(since=base.replace(hour=2), until=base.replace(hour=4))
+    assert [r.id for r in window] == [ids[3], ids[2]]
@@ -0,0 +1,150 @@
+"""Behaviour every Store backend must share; each test runs against all of them."""
+import pickle
+from datetime import datetime, timezone
+
+import pytest
+
+from agentreplay import Recorder, Replayer, SQLiteStore, diff_runs, export_areplay, import_areplay
+from agentreplay.fingerprint import step_fingerprint
+from agentreplay.models import Step
+from agentreplay.store import run_cursor
+from agentreplay.store_cache import CachingStore
+from agentreplay.store_log import LogStore
+from agentreplay.server import IngestServer
+from agentreplay.store_remote import RemoteStore
+from agentreplay.store_shard import ShardedStore
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["sqlite", "log", "cached", "remote", "sharded"])
+def open_store(request, tmp_path):
+    servers = []
+
+    def factory(**kwargs):
+        if request.param == "remote":
+            if not servers:
+                inner = SQLiteStore(str(tmp_path / "t.db"), **kwargs)
+                inner.init()
+                servers.append(IngestServer(inner, "127.0.0.1:0").start())
+                request.addfinalizer(servers[0].close)
+            store = RemoteStore(servers[0].address)
+        elif request.param == "sharded":
+            store = ShardedStore(
+                [SQLiteStore(str(tmp_path / f"s{i}.db"), **kwargs) for i in range(3)]
+            )
+        elif request.param == "sqlite":
+            store = SQLiteStore(str(tmp_path / "t.db"), **kwargs)
+        elif request.param == "log":
+            store = LogStore(str(tmp_path / "log"), **kwargs)
+        else:
+            store = CachingStore(SQLiteStore(str(tmp_path / "t.db"), **kwargs), max_bytes=64 * 1024)
+        store.init()
+        return store
+
+    return factory
+
+
+def test_runs_roundtrip(open_store):
+    store = open_store()
+    run_id = store.create_run("r", started_at=BASE, meta={"project": "p", "k": [1]})
+    run = store.get_run(run_id)
+    assert (run.name, run.started_at, run.ended_at, run.meta) == (
+        "r", BASE, None, {"project": "p", "k": [1]}
+    )
+    store.end_run(run_id, BASE.replace(minute=5))
+    assert store.get_run(run_id).ended_at == BASE.replace(minute=5)
+    with pytest.raises(KeyError):
+        store.get_run("missing")
+
+
+def test_steps_roundtrip_and_iteration(open_store):
+    store = open_store()
+    run_id = store.create_run("r", started_at=BASE, meta={})
+    store.add_step(run_id, 0, "llm", "plan", BASE, {"q": "ü"}, {"a": [1, 2]}, None)
+    store.add_steps([
+        Step(
+            f"s{i}", run_id, i, "tool" if i % 2 else "llm", "t", BASE, {"i": i}, {},
+            {"type": "E"} if i == 3 else None,
+        )
+        for i in range(1, 6)
+    ])
+
+    steps = store.list_steps(run_id)
+    assert [s.idx for s in steps] == list(range(6))
+    assert steps[0].input == {"q": "ü"} and steps[0].output == {"a": [1, 2]}
+    assert steps[0].error is None
+    assert steps[3].id == "s3" and steps[3].error == {"type": "E"}
+    assert [s.idx for s in store.iter_steps(run_id, kinds=["tool"], start_idx=2)] == [3, 5]
+    assert list(store.iter_steps("missing")) == []
+
+    fps = list(store.iter_fingerprints(run_id))
+    assert [fp[:3] for fp in fps] == [(s.idx, s.kind, s.name) for s in steps]
+    assert fps[1][3] == step_fingerprint("tool", "t", {"i": 1}, {}, None)
+    assert store.search_steps(error_type="E") == [(run_id, 3)]
+    assert store.run_bytes(run_id) > 0
+
+
+def test_list_runs_filters_and_pagination(open_store):
+    store = open_store()
+    ids = []
+    for i in range(7):
+        run_id = store.create_run(
+            f"n{i % 3}",
+            started_at=BASE.replace(hour=i),
+            meta={"project": "alpha" if i % 2 else "beta"},
+        )
+        if i == 4:
+            store.add_step(run_id, 0, "tool", "t", BASE, {}, {}, {"type": "Boom"})
+        ids.append(run_id)
+
+    page = store.list_runs(limit=3)
+    assert [r.id for r in page] == ids[:3:-1]
+    assert [r.id for r in store.list_runs(limit=3, cursor=run_cursor(page[-1]))] == ids[3:0:-1]
+    assert [r.id for r in store.iter_runs(page_size=2)] == ids[::-1]
+    assert [r.id for r in store.list_runs(project="alpha")] == [ids[5], ids[3], ids[1]]
+    assert [r.id for r in store.list_runs(name="n1", project="beta")] == [ids[4]]
+    assert [r.id for r in store.list_runs(has_error=True)] == [ids[4]]
+    assert len(store.list_runs(has_error=False)) == 6
+    window = store.list_runs(since=BASE.replace(hour=2), until=BASE.replace(hour=4))
+    assert [r.id for r in window] == [ids[3], ids[2]]
+
+
+def test_delete_run_and_stats(open_store):
+    store = open_store()
+    keep, drop = (store.create_run(n, started_at=BASE, meta={}) for n in ("keep", "drop"))
+    for run_id in (keep, drop):
+        store.add_step(run_id, 0, "tool", "t", BASE, {"x": 1}, {"y": 2}, {"type": "E"})
+    store.delete_run(drop)
+
+    with pytest.raises(KeyError):
+        store.get_run(drop)
+    assert list(store.iter_steps(drop)) == []
+    assert [r.id for r in store.list_runs(has_error=True)] == [keep]
+    stats = store.stats()
+    assert (stats["runs"], stats["steps"]) == (1, 1)
+    assert stats["payload_bytes"] > 0
+
+
+def test_record_replay_diff_export_and_reopen(open_store, tmp_path):
+    store = open_store()
+    rec = Recorder(store, batch_size=2)
+    with rec.run("a") as a:
+        rec.llm("plan", input={"q": 1}, output={"t": "x"})
+        rec.tool("search", input={"q": 1}, output={"hits": 1})
+        rec.tool("search", input={"q": 2}, output={"hits": 2})
+    with rec.run("b") as b:
+        rec.llm("plan", input={"q": 1}, output={"t": "x"})
+        rec.tool("search", input={"q": 1}, output={"hits": 9})
+
+    assert Replayer(store).replay(a.id).ok
+    assert "output changed" in diff_runs(store, a.id, b.id)
+    imported = import_areplay(store, export_areplay(store, a.id, str(tmp_path / "a.areplay")))
+    assert "No divergence" in diff_runs(store, a.id, imported)
+
+    store.close()
+    reopened = open_store()
+    assert reopened.get_run(b.id).ended_at is not None
+    assert [s.output for s in reopened.list_steps(a.id)] == [{"t": "x"}, {"hits": 1}, {"hits": 2}]
+    clone = pickle.loads(pickle.dumps(reopened))
+    assert len(clone.list_steps(imported)) == 3
@@ -0,0 +1,79 @@
+import itertools
+
+import pytest
+
+from agentreplay import Recorder, Replayer, SQLiteStore
+from agentreplay.replay import ReplayedError
+from agentreplay.stream import LLMStream, iter_stream_chunks, replay_stream
+
+
+def _clock(step_ns=2_000_000):
+    ticks = itertools.count(0, step_ns)
+    return lambda: next(ticks)
+
+
+def test_stream_is_stored_as_one_step_and_replayed_chunk_by_chunk(tmp_path):
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store)
+    chunks = ["Hel", "lo", ", ", "wor", "ld"]
+    with rec.run("r") as run:
+        with rec.llm_stream("chat", input={"q": "hi"}) as s:
+            assert list(s.wrap(iter(chunks))) == chunks
+            s.extra["finish_reason"] = "stop"
+
+    (step,) = store.list_steps(run.id)
+    assert step.kind == "llm" and step.output["text"] == "Hello, world"
+    assert step.output["finish_reason"] == "stop"
+    layout = step.output["stream"]
+    assert (layout["chunks"], layout["lens"]) == (5, [3, 2, 2, 3, 2])
+    assert [c for c, _ in iter_stream_chunks(step.output)] == chunks
+
+    def agent(session):
+        return list(session.llm_stream("chat", {"q": "hi"}))
+
+    report = Replayer(store).run(run.id, agent)
+    assert report.ok, report.notes
+    assert store.list_steps(report.new_run_id)[0].output == step.output
+
+
+def test_long_streams_are_coalesced_to_bounded_arrays():
+    s = LLMStream(max_chunks=8, clock=_clock())
+    for i in range(100):
+        s.add(f"t{i:02d} ")
+    out = s.to_output()
+    layout = out["stream"]
+    assert len(layout["lens"]) <= 8 and layout["chunks"] == 100
+    assert sum(layout["lens"]) == len(out["text"]) == 400
+    # 100 gaps of 2ms, the first one being time-to-first-token
+    assert sum(layout["gaps_us"]) == 200_000 and layout["ttft_us"] == 2_000
+    assert "".join(c for c, _ in iter_stream_chunks(out)) == out["text"]
+
+
+def test_replay_pacing_and_errors(tmp_path):
+    s = LLMStream(clock=_clock(10_000_000))
+    for chunk in ("a", "b", "c"):
+        s.add(chunk)
+    slept = []
+    assert list(replay_stream(s.to_output(), speed=2.0, sleep=slept.append)) == ["a", "b", "c"]
+    assert slept == [0.005, 0.005, 0.005]
+    assert list(replay_stream(s.to_output())) == ["a", "b", "c"]
+
+    store = SQLiteStore(str(tmp_path / "t.db"))
+    rec = Recorder(store)
+    with rec.run("r") as run:
+        with pytest.raises(TimeoutError):
+            with rec.llm_stream("chat", input={}) as st:
+                st.add("partial")
+                raise TimeoutError("stream stalled")
+    (step,) = store.list_steps(run.id)
+    assert step.output["text"] == "partial"
+    assert step.error == {"type": "TimeoutError", "msg": "stream stalled"}
+
+    def agent(session):
+        got = []
+        with pytest.raises(ReplayedError):
+            for chunk in session.llm_stream("chat", {}):
+                got.append(chunk)
+        assert got == ["partial"]
+
+    assert Replayer(store).run(run.id, agent).ok